@@ -0,0 +1,417 @@
+"""Offline re-verification and bulk enrollment of saved captures.
+
+Streams a folder of captures (the fingerprint/normal BMP dumps, .raw files
+or any image PIL can read) or a frame archive, decodes and normalizes the
+frames in a process pool and sends them through Client with a bounded
+number of requests in flight. Every finished item is recorded in a SQLite
+checkpoint, so an interrupted run picks up where it stopped, and the final
+report (throughput, outcome counts, distance statistics) covers all runs
+sharing the checkpoint.
+
+    verify  each image is matched with /auth/match-finger-print
+    enroll  each user is registered with /auth/register-new-user; users
+            are the sub-folders of a folder (named by email) or the user
+            labels of an archive
+
+Memory stays flat however large the source: files are listed lazily,
+only a few decode chunks and `concurrency` uploads are in flight, and the
+statistics are computed by SQLite at the end.
+
+Run from app/:
+    python -m batch verify fingerprint/normal --api-url http://10.21.54.187
+    python -m batch verify fingerprint/archive --concurrency 8 --top-k 5
+    python -m batch enroll enroll_folders/ --images-per-user 4
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from imaging.encoder import IMAGE_X, IMAGE_Y, decode_bmp
+from metrics import LatencyHistogram, record_span
+
+IMAGE_EXTENSIONS = (".bmp", ".raw", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    distance REAL,
+    user TEXT,
+    images INTEGER NOT NULL DEFAULT 1,
+    seconds REAL,
+    error TEXT,
+    finished REAL NOT NULL
+);
+"""
+
+
+# ===== Sources =====
+def is_archive(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "archive.json"))
+
+
+def iter_files(root: str):
+    """Image files under `root`, depth first, without listing whole trees up front."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+
+
+def verify_jobs(source: str):
+    """(key, refs, user) per image: refs are file paths or archive frame ids."""
+    if is_archive(source):
+        from finger_device.archive import FrameArchive
+        with FrameArchive(source, readonly=True) as archive:
+            ids = archive.index()[0]
+        for frame_id in ids:
+            yield f"frame:{int(frame_id)}", [int(frame_id)], None
+    else:
+        for path in iter_files(source):
+            yield os.path.relpath(path, source), [path], None
+
+
+def enroll_jobs(source: str, images_per_user: int):
+    """(key, refs, email) per user, with at most `images_per_user` images each."""
+    if is_archive(source):
+        from finger_device.archive import FrameArchive
+        with FrameArchive(source, readonly=True) as archive:
+            ids, records = archive.index()
+            users = records["user"]
+            for uid in np.unique(users[users >= 0]):
+                email = archive.user_label(int(uid))
+                yield email, [int(i) for i in ids[users == uid][:images_per_user]], email
+    else:
+        with os.scandir(source) as entries:
+            folders = [e for e in entries if e.is_dir()]
+        for folder in folders:
+            refs = sorted(iter_files(folder.path))[:images_per_user]
+            if refs:
+                yield folder.name, refs, folder.name
+
+
+# ===== Decoding (runs in the worker processes) =====
+_state = {}
+
+
+def _init_worker(source: str, codec: str):
+    from imaging.codecs import available_codecs
+    _state["codec"] = available_codecs()[codec]
+    if is_archive(source):
+        from finger_device.archive import FrameArchive
+        _state["archive"] = FrameArchive(source, readonly=True)
+
+
+def normalize(arr: np.ndarray) -> np.ndarray:
+    """Fit a gray image to the sensor's 256x288 frame: centre crop, or pad with white."""
+    h, w = arr.shape
+    if (h, w) == (IMAGE_Y, IMAGE_X):
+        return arr
+    out = np.full((IMAGE_Y, IMAGE_X), 255, dtype=np.uint8)
+    sy, sx = max(0, (h - IMAGE_Y) // 2), max(0, (w - IMAGE_X) // 2)
+    dy, dx = max(0, (IMAGE_Y - h) // 2), max(0, (IMAGE_X - w) // 2)
+    ch, cw = min(h, IMAGE_Y), min(w, IMAGE_X)
+    out[dy:dy + ch, dx:dx + cw] = arr[sy:sy + ch, sx:sx + cw]
+    return out
+
+
+def load_gray(ref) -> np.ndarray:
+    """One normalized (288, 256) uint8 frame from an archive id or an image file."""
+    if isinstance(ref, int):
+        return _state["archive"].frame(ref)
+    with open(ref, "rb") as f:
+        blob = f.read()
+    if ref.lower().endswith(".raw"):
+        arr = np.frombuffer(blob, dtype=np.uint8)
+        if arr.size != IMAGE_X * IMAGE_Y:
+            raise ValueError(f"Raw frames must be {IMAGE_X * IMAGE_Y} bytes, got {arr.size}")
+        return arr.reshape(IMAGE_Y, IMAGE_X)
+    if blob[:2] == b"BM" and int.from_bytes(blob[28:30], "little") == 8:
+        # Sensor and encode_bmp output: 8-bit palette, rows padded to 4 bytes
+        return normalize(decode_bmp(blob))
+    try:
+        from PIL import Image
+    except ImportError:  # optional dependency
+        raise ValueError(f"Cannot decode {os.path.basename(ref)} without Pillow")
+    import io
+    with Image.open(io.BytesIO(blob)) as img:
+        return normalize(np.asarray(img.convert("L")))
+
+
+def decode_chunk(jobs: list) -> list:
+    """Decode, normalize and encode a chunk of jobs; errors are returned, not raised."""
+    codec = _state["codec"]
+    out = []
+    for key, refs, user in jobs:
+        t0 = time.perf_counter()
+        try:
+            payloads = [codec.encode(load_gray(ref)) for ref in refs]
+            out.append((key, payloads, user, None, time.perf_counter() - t0))
+        except (OSError, ValueError) as e:
+            out.append((key, None, user, f"{type(e).__name__}: {e}", time.perf_counter() - t0))
+    return out
+
+
+# ===== Checkpoint =====
+class Checkpoint:
+    """Finished items in SQLite; rows are written in batches from the upload threads.
+
+    A crash loses at most the unwritten batch, whose items are simply sent
+    again on resume (matching is read-only and registrations carry an
+    Idempotency-Key).
+    """
+
+    BATCH = 256
+    COMMIT_INTERVAL = 2.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_commit = time.monotonic()
+
+    def done(self, key: str) -> bool:
+        """True if `key` finished in an earlier run (items that hit a server error are retried)."""
+        with self._lock:
+            row = self._db.execute("SELECT status FROM results WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] != "error"
+
+    def record(self, key: str, mode: str, status: str, distance: float = None, user: str = None,
+               images: int = 1, seconds: float = None, error: str = None):
+        with self._lock:
+            self._pending.append((key, mode, status, distance, user, images, seconds, error, time.time()))
+            if len(self._pending) >= self.BATCH or time.monotonic() - self._last_commit > self.COMMIT_INTERVAL:
+                self._commit()
+
+    def _commit(self):
+        self._db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._db.commit()
+        self._pending.clear()
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def summary(self, mode: str, match_distance: float) -> dict:
+        """Outcome counts and distance statistics over every run of `mode`."""
+        self.flush()
+        db = self._db
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM results WHERE mode = ? GROUP BY status", (mode,)))
+        stats = {"counts": counts, "images": db.execute(
+            "SELECT COALESCE(SUM(images), 0) FROM results WHERE mode = ?", (mode,)).fetchone()[0]}
+        n, mean, low, high, matched = db.execute(
+            "SELECT COUNT(distance), AVG(distance), MIN(distance), MAX(distance), "
+            "SUM(distance < ?) FROM results WHERE mode = ? AND distance IS NOT NULL",
+            (match_distance, mode)).fetchone()
+        if n:
+            pct = {}
+            for p in (50, 90, 99):
+                pct[p] = db.execute("SELECT distance FROM results WHERE mode = ? AND distance IS NOT NULL "
+                                    "ORDER BY distance LIMIT 1 OFFSET ?",
+                                    (mode, min(n - 1, int(n * p / 100)))).fetchone()[0]
+            stats["distance"] = {"count": n, "mean": mean, "min": low, "max": high, "matched": matched,
+                                 "p50": pct[50], "p90": pct[90], "p99": pct[99]}
+        return stats
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+# ===== Runner =====
+class BatchRunner:
+    """Drives decode workers and uploads for one batch run.
+
+    Args:
+        client: Client used for the server calls.
+        checkpoint: Checkpoint recording finished items.
+        mode: "verify" or "enroll".
+        workers: decode processes (default: CPU count).
+        concurrency: requests in flight at once.
+        top_k: matches kept per verification (see Client.check_fingerprint).
+    """
+
+    DECODE_CHUNK = 32
+    MATCH_DISTANCE = 50
+    PROGRESS_INTERVAL = 5.0
+
+    def __init__(self, client, checkpoint: Checkpoint, mode: str = "verify", workers: int = None,
+                 concurrency: int = 4, top_k: int = 5):
+        if mode not in ("verify", "enroll"):
+            raise ValueError(f"Unknown batch mode: {mode}")
+        self.client = client
+        self.checkpoint = checkpoint
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.top_k = top_k
+        self.upload_time = LatencyHistogram("batch.upload")
+        self.done = self.skipped = self.failed = self.images = 0
+        self._lock = threading.Lock()
+
+    def run(self, source: str, jobs, progress: bool = True) -> dict:
+        """Process every job not already in the checkpoint; returns this run's counters."""
+        codec = self.client.upload_codec().name
+        slots = threading.BoundedSemaphore(self.concurrency * 2)   # decoded jobs waiting or uploading
+        t0 = last_report = time.monotonic()
+        decoding = deque()
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(source, codec)) as pool, \
+                ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch-upload") as uploads:
+
+            def drain(block: bool):
+                # Hand decoded chunks to the uploaders, oldest first
+                while decoding and (block or decoding[0].done()):
+                    for item in decoding.popleft().result():
+                        slots.acquire()
+                        uploads.submit(self._upload, codec, *item).add_done_callback(lambda _: slots.release())
+                    block = False
+
+            chunk = []
+            for key, refs, user in jobs:
+                if self.checkpoint.done(key):
+                    self.skipped += 1
+                    continue
+                chunk.append((key, refs, user))
+                if len(chunk) == self.DECODE_CHUNK:
+                    decoding.append(pool.submit(decode_chunk, chunk))
+                    chunk = []
+                    drain(block=len(decoding) >= self.workers * 2)
+                if progress and time.monotonic() - last_report > self.PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    self._progress(last_report - t0)
+            if chunk:
+                decoding.append(pool.submit(decode_chunk, chunk))
+            while decoding:
+                drain(block=True)
+        self.checkpoint.flush()
+        elapsed = time.monotonic() - t0
+        return {"done": self.done, "failed": self.failed, "skipped": self.skipped, "images": self.images,
+                "seconds": elapsed, "images_per_second": self.images / elapsed if elapsed else 0.0,
+                "upload": self.upload_time.summary()}
+
+    def _progress(self, elapsed: float):
+        print(f"{self.done + self.failed} sent · {self.images / elapsed:.0f} images/s · "
+              f"{self.failed} failed · {self.skipped} already done")
+
+    def _upload(self, codec: str, key: str, payloads, user, error, decode_seconds: float):
+        record_span("batch.decode", decode_seconds)
+        if error is not None:
+            # Decoding will not do better next time, so this is final
+            self._finish(key, "unreadable", images=0, error=error)
+            return
+        t0 = time.perf_counter()
+        try:
+            if self.mode == "verify":
+                status, distance, best, error = self._verify(payloads[0], codec)
+            else:
+                status, distance, best, error = self._enroll(user, payloads, codec)
+        except Exception as e:  # connection errors, timeouts: retried on the next run
+            status, distance, best, error = "error", None, None, f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - t0
+        self.upload_time.record(seconds)
+        self._finish(key, status, distance, best, len(payloads), seconds, error)
+
+    def _verify(self, payload: bytes, codec: str) -> tuple:
+        body = self.client.check_fingerprint(payload, codec, top_k=self.top_k)
+        if body is None:
+            return "error", None, None, "server error"
+        matches = body.get("matching") or []
+        if not matches:
+            return "no_match", None, None, None
+        best = min(matches, key=lambda m: float(m.get("distance", float("inf"))))
+        distance = float(best.get("distance"))
+        status = "match" if distance < self.MATCH_DISTANCE else "no_match"
+        return status, distance, best.get("user", {}).get("email"), None
+
+    def _enroll(self, email: str, payloads: list, codec: str) -> tuple:
+        # Same user and images give the same key, so a resumed run is not registered twice
+        key = hashlib.sha256(email.encode() + b"".join(hashlib.sha256(p).digest() for p in payloads)).hexdigest()
+        response = self.client.post_registration(email, email.split("@")[0], payloads, codec,
+                                                 idempotency_key=key)
+        if response.status_code == 200:
+            return "registered", None, email, None
+        return "error", None, email, f"HTTP {response.status_code}: {response.text[:200]}"
+
+    def _finish(self, key: str, status: str, distance: float = None, user: str = None, images: int = 1,
+                seconds: float = None, error: str = None):
+        self.checkpoint.record(key, self.mode, status, distance, user, images, seconds, error)
+        with self._lock:
+            if status in ("error", "unreadable"):
+                self.failed += 1
+            else:
+                self.done += 1
+                self.images += images
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MiB (0 where resource is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def print_report(run: dict, summary: dict):
+    up = run["upload"]
+    print(f"This run: {run['done']} done, {run['failed']} failed, {run['skipped']} skipped (checkpoint), "
+          f"{run['images']} images in {run['seconds']:.1f} s = {run['images_per_second']:.1f} images/s")
+    if up["count"]:
+        print(f"Request latency p50 {up['p50'] * 1000:.0f} ms, p99 {up['p99'] * 1000:.0f} ms; "
+              f"peak memory {peak_rss_mb():.0f} MiB")
+    print(f"All runs: {summary['images']} images, " +
+          ", ".join(f"{status} {n}" for status, n in sorted(summary["counts"].items())))
+    d = summary.get("distance")
+    if d:
+        print(f"Distance over {d['count']} answers: mean {d['mean']:.2f}, min {d['min']:.2f}, "
+              f"p50 {d['p50']:.2f}, p90 {d['p90']:.2f}, p99 {d['p99']:.2f}, max {d['max']:.2f}; "
+              f"{d['matched']} below {BatchRunner.MATCH_DISTANCE}")
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-verify or bulk-enroll saved captures")
+    parser.add_argument("mode", choices=["verify", "enroll"])
+    parser.add_argument("source", help="folder of images or frame archive")
+    parser.add_argument("--api-url", help="matching server (default: the client's api_url)")
+    parser.add_argument("--checkpoint", help="progress database (default: <source>.<mode>.db)")
+    parser.add_argument("--workers", type=int, help="decode processes (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--top-k", type=int, default=5, help="matches kept per verification")
+    parser.add_argument("--images-per-user", type=int, default=4, help="enroll: images sent per user")
+    args = parser.parse_args(argv)
+
+    from client.client import Client
+    client = Client(args.api_url, pool_size=args.concurrency)
+    checkpoint = Checkpoint(args.checkpoint or f"{args.source.rstrip('/')}.{args.mode}.db")
+    runner = BatchRunner(client, checkpoint, args.mode, args.workers, args.concurrency, args.top_k)
+    jobs = verify_jobs(args.source) if args.mode == "verify" else enroll_jobs(args.source, args.images_per_user)
+    try:
+        run = runner.run(args.source, jobs)
+        print_report(run, checkpoint.summary(args.mode, BatchRunner.MATCH_DISTANCE))
+    except KeyboardInterrupt:
+        print(f"Interrupted; progress is saved in {checkpoint.path}")
+    finally:
+        checkpoint.close()
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
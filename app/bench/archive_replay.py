@@ -0,0 +1,122 @@
+"""Raw frame archive vs one BMP file per capture.
+
+Writes the same synthetic captures both ways into a temporary directory,
+then measures what replay and re-verification need: a full sequential
+pass, random single-frame reads and an index query. Reports frames/s and
+disk usage for each store.
+
+Run from app/:  python -m bench.archive_replay --frames 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import numpy as np
+from bench.synthetic import SyntheticIdentity
+from finger_device.archive import FrameArchive
+from imaging.encoder import ImageEncoder, decode_bmp
+
+
+def disk_usage(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, n)) for root, _, names in os.walk(path) for n in names)
+
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--identities", type=int, default=50)
+    parser.add_argument("--random-reads", type=int, default=2000)
+    parser.add_argument("--dir", help="work directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args(argv)
+
+    work = args.dir or tempfile.mkdtemp(prefix="archive-bench-")
+    bmp_dir, arc_dir = os.path.join(work, "normal"), os.path.join(work, "archive")
+    os.makedirs(bmp_dir, exist_ok=True)
+    people = [SyntheticIdentity(i) for i in range(args.identities)]
+    frames = [people[i % args.identities].impression(i) for i in range(min(args.frames, 256))]
+    users = [f"user{i % args.identities}@example.com" for i in range(args.frames)]
+    encoder = ImageEncoder()
+    rng = random.Random(0)
+    picks = [rng.randrange(args.frames) for _ in range(args.random_reads)]
+    results = {}
+
+    try:
+        def write_bmps():
+            for i in range(args.frames):
+                with open(os.path.join(bmp_dir, f"fingerprint_{i:08d}.bmp"), "wb") as f:
+                    f.write(encoder.encode_bmp_into(frames[i % len(frames)]))
+
+        def write_archive():
+            with FrameArchive(arc_dir) as archive:
+                for i in range(args.frames):
+                    archive.append(frames[i % len(frames)], reader=i % 2, user=users[i], quality=rng.random())
+
+        results["write"] = (timed(write_bmps), timed(write_archive))
+        names = sorted(os.listdir(bmp_dir))
+
+        def scan_bmps():
+            total = 0
+            for name in names:
+                with open(os.path.join(bmp_dir, name), "rb") as f:
+                    total += decode_bmp(f.read()).reshape(-1)[::64].sum()
+            return total
+
+        archive = FrameArchive(arc_dir, readonly=True)
+
+        def scan_archive():
+            total = 0
+            for _, _, batch in archive.iter_batches(256):
+                total += batch.reshape(len(batch), -1)[:, ::64].sum()
+            return total
+
+        results["sequential"] = (timed(scan_bmps), timed(scan_archive))
+
+        def random_bmps():
+            for i in picks:
+                with open(os.path.join(bmp_dir, names[i]), "rb") as f:
+                    decode_bmp(f.read()).tobytes()
+
+        def random_archive():
+            for i in picks:
+                archive.frame(i).tobytes()
+
+        results["random"] = (timed(random_bmps), timed(random_archive))
+
+        # A time window is the only query BMP dumps can answer (via mtime);
+        # user, reader and quality are simply not recorded there
+        since = time.time() - 3600
+
+        def query_bmps():
+            return [n for n in names if os.path.getmtime(os.path.join(bmp_dir, n)) >= since]
+
+        def query_archive():
+            return archive.select(since=since)
+
+        results["query"] = (timed(query_bmps), timed(query_archive))
+        sizes = disk_usage(bmp_dir), disk_usage(arc_dir)
+        archive.close()
+    finally:
+        if not args.dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    counts = {"write": args.frames, "sequential": args.frames, "random": args.random_reads, "query": 1}
+    print(f"{'':<11} {'BMP files':>14} {'archive':>14} {'speedup':>8}")
+    for name, (t_bmp, t_arc) in results.items():
+        n = counts[name]
+        if n > 1:
+            print(f"{name:<11} {n / t_bmp:10.0f} f/s {n / t_arc:10.0f} f/s {t_bmp / t_arc:7.1f}x")
+        else:
+            print(f"{name:<11} {t_bmp * 1000:11.1f} ms {t_arc * 1000:11.1f} ms {t_bmp / t_arc:7.1f}x")
+    print(f"{'disk':<11} {sizes[0] / 2 ** 20:11.1f} MB {sizes[1] / 2 ** 20:11.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
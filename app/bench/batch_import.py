@@ -0,0 +1,87 @@
+"""Throughput, resume and memory of the offline batch tool.
+
+Fills a frame archive with --frames synthetic captures (or uses --source),
+then re-verifies it against the stub server in two runs sharing one
+checkpoint: the first stops after half the frames, the second resumes.
+Reports images/s per run and peak RSS of the driving process, sampled
+as the run progresses, so growth with the number of images shows up.
+
+Run from app/:  python -m bench.batch_import --frames 10000 --concurrency 8
+"""
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from batch import BatchRunner, Checkpoint, peak_rss_mb, print_report, verify_jobs
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from finger_device.archive import FrameArchive
+
+
+def rss_mb() -> float:
+    """Current resident memory in MiB (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--source", help="existing folder or archive instead of synthetic frames")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rtt-ms", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=200, help="users in each stub match answer")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="batch-bench-")
+    source = args.source
+    try:
+        if source is None:
+            source = os.path.join(work, "archive")
+            frames = [SyntheticIdentity(i).impression(i) for i in range(64)]
+            with FrameArchive(source) as archive:
+                for i in range(args.frames):
+                    archive.append(frames[i % len(frames)], user=f"user{i % 64}@example.com")
+        total = sum(1 for _ in verify_jobs(source))
+        samples = []
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(0.5):
+                samples.append(rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        with StubServer(StubConfig(latency=args.rtt_ms / 1000, users=args.users,
+                                   codecs=["gray8+zlib", "bmp"], top_k=True)) as stub:
+            checkpoint = Checkpoint(os.path.join(work, "checkpoint.db"))
+            for name, limit in (("first half", total // 2), ("resume", None)):
+                client = Client(stub.url, pool_size=args.concurrency)
+                runner = BatchRunner(client, checkpoint, workers=args.workers, concurrency=args.concurrency)
+                jobs = itertools.islice(verify_jobs(source), limit)
+                start = len(samples)
+                run = runner.run(source, jobs, progress=False)
+                client.close()
+                run_samples = samples[start:] or [rss_mb()]
+                print(f"{name}: {run['done']} sent, {run['skipped']} skipped, "
+                      f"{run['images_per_second']:.0f} images/s, RSS {min(run_samples):.0f}-{max(run_samples):.0f} MiB")
+            print()
+            print_report(run, checkpoint.summary("verify", BatchRunner.MATCH_DISTANCE))
+            checkpoint.close()
+        stop.set()
+        if len(samples) >= 4:
+            q = len(samples) // 4
+            print(f"RSS first quarter {max(samples[:q]):.0f} MiB, last quarter {max(samples[-q:]):.0f} MiB")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
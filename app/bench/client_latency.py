@@ -0,0 +1,77 @@
+"""Client request latency against a local stub API.
+
+Run from app/:  python -m bench.client_latency --requests 500
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from client.client import Client
+from bench.stub_server import StubConfig, StubServer
+from finger_device.backend import synthetic_frame
+from imaging.encoder import encode_bmp
+from metrics import LatencyHistogram
+
+
+def run(name: str, call, n: int, threads: int) -> dict:
+    hist = LatencyHistogram(name)
+
+    def one(_):
+        t0 = time.perf_counter()
+        call()
+        hist.record(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n)))
+    elapsed = time.perf_counter() - t0
+    summary = hist.summary()
+    summary["throughput"] = n / elapsed
+    return summary
+
+
+def report(summary: dict):
+    print(f"{summary['name']:<28} p50 {summary['p50'] * 1000:7.2f} ms  p99 {summary['p99'] * 1000:7.2f} ms  "
+          f"{summary['throughput']:8.1f} req/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.002, help="stub server time per request (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="share of slow requests in the hedge test")
+    parser.add_argument("--slow-delay", type=float, default=0.25, help="extra delay of a slow request (s)")
+    parser.add_argument("--hedge-after", type=float, default=0.05, help="hedge threshold (s)")
+    args = parser.parse_args(argv)
+
+    image = encode_bmp(synthetic_frame())
+    files = lambda: {"file": ("fingerprint.bmp", image, "image/bmp")}
+
+    with StubServer(StubConfig(latency=args.latency, seed=1)) as stub:
+        url = f"{stub.url}/auth/match-finger-print"
+        report(run("requests.post (no pool)", lambda: requests.post(url, files=files()), args.requests, args.threads))
+        print(f"  connections opened: {stub.config.connections}")
+
+        stub.config.connections = 0
+        client = Client(stub.url, pool_size=args.threads)
+        report(run("Client (pooled)", lambda: client.check_fingerprint(image), args.requests, args.threads))
+        print(f"  connections opened: {stub.config.connections}")
+        client.close()
+
+    # Tail latency with a primary that sometimes stalls, plus a hedge server
+    def tail(seed):
+        return StubConfig(latency=args.latency, slow_rate=args.slow_rate, slow_delay=args.slow_delay, seed=seed)
+
+    with StubServer(tail(2)) as primary, StubServer(tail(3)) as backup:
+        client = Client(primary.url, pool_size=args.threads)
+        report(run("slow tail, no hedge", lambda: client.check_fingerprint(image), args.requests, args.threads))
+        client.close()
+        client = Client(primary.url, hedge_url=backup.url, hedge_after=args.hedge_after, pool_size=args.threads)
+        report(run("slow tail, hedged", lambda: client.check_fingerprint(image), args.requests, args.threads))
+        print(f"  hedged requests: {backup.config.requests}")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
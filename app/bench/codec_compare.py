@@ -0,0 +1,55 @@
+"""Bytes-on-wire, encode time and end-to-end upload estimate per codec.
+
+Run from app/:  python -m bench.codec_compare --uplink-mbps 2 [--frames DIR]
+"""
+import argparse
+import time
+from finger_device.backend import load_frames, synthetic_frame
+from imaging.codecs import available_codecs
+from client.client import Client
+from bench.stub_server import StubConfig, StubServer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="directory of recorded .raw/.bmp frames (synthetic if omitted)")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--uplink-mbps", type=float, default=2.0, help="site uplink used for the estimate")
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="site round-trip time used for the estimate")
+    parser.add_argument("--quality", type=int, default=50, help="png-lossy quality")
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.frames) if args.frames else [synthetic_frame()]
+    codecs = available_codecs(args.quality)
+    for codec in codecs.values():
+        for _ in range(args.repeat):
+            for frame in frames:
+                codec.encode(frame)
+
+    bytes_per_s = args.uplink_mbps * 1e6 / 8
+    print(f"{'codec':<12} {'bytes':>9} {'ratio':>6} {'enc p50':>9} {'enc p99':>9} {'est. verify':>12}")
+    rows = []
+    for codec in codecs.values():
+        m = codec.metrics.summary()
+        estimate = m["encode_p50"] + m["mean_bytes"] / bytes_per_s + args.rtt_ms / 1000
+        rows.append((estimate, m))
+        print(f"{m['codec']:<12} {m['mean_bytes']:9.0f} {m['ratio']:6.2f} {m['encode_p50'] * 1000:7.2f}ms "
+              f"{m['encode_p99'] * 1000:7.2f}ms {estimate * 1000:10.1f}ms")
+    best = min(rows, key=lambda r: r[0])[1]
+    print(f"fastest end-to-end at {args.uplink_mbps} Mbit/s: {best['codec']}")
+
+    # Negotiation against a stub that only understands some codecs
+    with StubServer(StubConfig(codecs=["bmp", "png"])) as stub:
+        client = Client(stub.url)
+        t0 = time.perf_counter()
+        codec = client.upload_codec().name
+        probe = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        client.upload_codec()
+        cached = time.perf_counter() - t0
+        print(f"negotiated {codec!r}: probe {probe * 1000:.2f} ms, cached {cached * 1e6:.1f} us")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
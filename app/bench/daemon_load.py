@@ -0,0 +1,130 @@
+"""Load test of the capture/verify daemon on simulated readers.
+
+Runs the daemon in-process on a free port with --readers simulated readers
+and a stub matching server, then drives it from several HTTP clients at
+once: "greedy" clients keep --greedy-depth requests in flight, "polite"
+ones one at a time. Reports per-client throughput and latency, how the
+readers were shared (Jain's fairness index over requests served) and how
+many requests were refused by the queue limits.
+
+Run from app/:  python -m bench.daemon_load --readers 2 --greedy 2 --polite 4 --seconds 10
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from client.edge import EdgeVerifier, LocalGallery
+from daemon import Daemon
+from finger_device.backend import SimulatedBackend
+from finger_device.device import Device
+from metrics import LatencyHistogram
+
+
+class DaemonThread:
+    """Runs a Daemon on its own event loop thread."""
+
+    def __init__(self, daemon: Daemon):
+        self.daemon = daemon
+        self.url = None
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), name="daemon", daemon=True)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        await self.daemon.start()
+        (host, port), = await self.daemon.listen("127.0.0.1", 0)
+        self.url = f"http://{host}:{port}"
+        self._ready.set()
+        await self._stop.wait()
+        await self.daemon.close()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait(30)
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(10)
+
+
+def jain(values: list) -> float:
+    """Jain's fairness index: 1.0 when everyone got the same share."""
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values)) if any(values) else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--greedy", type=int, default=2, help="clients keeping several requests in flight")
+    parser.add_argument("--greedy-depth", type=int, default=8)
+    parser.add_argument("--polite", type=int, default=4, help="clients with one request at a time")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--endpoint", choices=["capture", "verify"], default="verify")
+    parser.add_argument("--finger-delay", type=float, default=0.05, help="seconds until the next finger lands")
+    parser.add_argument("--up-image-ms", type=float, default=20.0)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--per-client", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    frames = [SyntheticIdentity(i).impression(i).tobytes() for i in range(4)]
+    devices = {r: Device(SimulatedBackend(frames=frames, finger_delay=args.finger_delay,
+                                          finger_jitter=args.finger_delay / 4,
+                                          up_image_latency=args.up_image_ms / 1000, seed=r))
+               for r in range(args.readers)}
+
+    with StubServer(StubConfig(latency=args.rtt_ms / 1000, codecs=["bmp", "gray8+zlib"])) as stub:
+        daemon = Daemon(devices, client=Client(stub.url), edge=EdgeVerifier(LocalGallery(path=None)),
+                        per_client=args.per_client, timeout=10.0)
+        with DaemonThread(daemon) as running:
+            clients = [(f"greedy{i}", args.greedy_depth) for i in range(args.greedy)] + \
+                      [(f"polite{i}", 1) for i in range(args.polite)]
+            hists = {name: LatencyHistogram(name) for name, _ in clients}
+            refused = {name: {} for name, _ in clients}
+            deadline = time.monotonic() + args.seconds
+            url = f"{running.url}/{args.endpoint}"
+
+            def drive(name: str):
+                session = requests.Session()
+                while time.monotonic() < deadline:
+                    t0 = time.perf_counter()
+                    r = session.post(url, json={"timeout": 10}, headers={"X-Client": name}, timeout=30)
+                    if r.status_code == 200:
+                        hists[name].record(time.perf_counter() - t0)
+                    else:
+                        refused[name][r.status_code] = refused[name].get(r.status_code, 0) + 1
+                        if r.status_code in (429, 503):
+                            time.sleep(0.05)  # back off like a well-behaved client
+                session.close()
+
+            threads = sum(depth for _, depth in clients)
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                for name, depth in clients:
+                    for _ in range(depth):
+                        pool.submit(drive, name)
+            status = requests.get(f"{running.url}/status", timeout=5).json()
+
+    print(f"{'client':<9} {'in flight':>9} {'ok':>6} {'per s':>7} {'p50':>8} {'p99':>8}  refused")
+    served = []
+    for name, depth in clients:
+        s = hists[name].summary()
+        served.append(s["count"])
+        print(f"{name:<9} {depth:>9} {s['count']:>6} {s['count'] / args.seconds:7.2f} "
+              f"{s['p50'] * 1000:6.0f}ms {s['p99'] * 1000:6.0f}ms  {refused[name] or '-'}")
+    total = sum(served)
+    print(f"total {total / args.seconds:.1f} {args.endpoint}/s over {args.readers} reader(s); "
+          f"fairness (Jain) {jain(served):.3f}")
+    for lane in status["readers"]:
+        print(f"reader {lane['reader']}: served {sum(lane['served'].values())}")
+
+
+if __name__ == "__main__":
+    main()
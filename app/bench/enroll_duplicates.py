@@ -0,0 +1,86 @@
+"""Near-duplicate enrollment captures: cost of the check and what dropping them buys.
+
+Simulates an operator who puts the finger down the same way every time
+(--rotation / --shift give the placement spread) for --captures touches.
+"all" enrolls every touch, "drop" leaves out the duplicates and "retake"
+replaces each duplicate with a deliberately varied placement. Reports:
+- the check time against the captures kept so far;
+- the images uploaded;
+- how well each gallery recognises later, freely placed touches of the
+  same finger, using the local edge matcher.
+
+Run from app/:  python -m bench.enroll_duplicates --captures 10 --fingers 10
+"""
+import argparse
+import numpy as np
+from bench.synthetic import SyntheticIdentity
+from client.edge import EdgeVerifier, LocalGallery
+from client.lsh_index import CandidateIndex
+from imaging.codecs import available_codecs
+from imaging.duplicates import DuplicateDetector
+from metrics import LatencyHistogram
+
+
+def enroll(identity: SyntheticIdentity, captures: int, rotation: float, shift: float, retake: float,
+           mode: str, hist: LatencyHistogram, seed: int) -> tuple:
+    """(kept frames, dropped count) for one finger."""
+    detector = DuplicateDetector()
+    dedupe = mode != "all"
+    attempts = 4 * captures if mode == "retake" else captures
+    kept, dropped, attempt = [], 0, 0
+    while len(kept) < captures and attempt < attempts:
+        varied = mode == "retake" and dropped > 0
+        frame = identity.impression(seed + attempt, rotation=retake if varied else rotation,
+                                    shift=12.0 if varied else shift)
+        attempt += 1
+        if dedupe:
+            check = detector.check(frame)
+            hist.record(check.seconds)
+            if check.duplicate:
+                dropped += 1
+                continue
+            detector.keep(check)
+        kept.append(frame)
+    return kept, dropped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--captures", type=int, default=10)
+    parser.add_argument("--fingers", type=int, default=10)
+    parser.add_argument("--probes", type=int, default=10, help="later touches per finger")
+    parser.add_argument("--rotation", type=float, default=0.02, help="placement spread of the operator, radians")
+    parser.add_argument("--shift", type=float, default=4.0, help="placement spread of the operator, pixels")
+    parser.add_argument("--retake", type=float, default=0.3, help="rotation spread of a retake after a duplicate")
+    args = parser.parse_args(argv)
+
+    codec = available_codecs()["gray8+zlib"]
+    fingers = [SyntheticIdentity(1000 + i) for i in range(args.fingers)]
+    print(f"{'gallery':<10} {'images':>7} {'dropped':>8} {'upload':>9} {'genuine score':>14} {'accepted':>9}")
+    for mode in ("all", "drop", "retake"):
+        hist = LatencyHistogram("duplicate_check")
+        edge = EdgeVerifier(LocalGallery(path=None), index=CandidateIndex())
+        images = dropped = upload = 0
+        for i, finger in enumerate(fingers):
+            kept, n_dropped = enroll(finger, args.captures, args.rotation, args.shift, args.retake,
+                                     mode, hist, seed=i * 100)
+            edge.enroll({"name": f"F{i}", "email": f"f{i}@example.com"}, kept)
+            images += len(kept)
+            dropped += n_dropped
+            upload += sum(len(codec.encode(f)) for f in kept)
+        scores = []
+        for i, finger in enumerate(fingers):
+            for p in range(args.probes):
+                matches = edge.match_local(edge.extract(finger.impression(50000 + i * 100 + p)))
+                own = [m["score"] for m in matches if m["user"]["email"] == f"f{i}@example.com"]
+                scores.append(own[0] if own else 0.0)
+        scores = np.array(scores)
+        print(f"{mode:<10} {images:>7} {dropped:>8} {upload / 1024:7.0f}kB "
+              f"{scores.mean():14.3f} {np.mean(scores >= edge.accept_score):9.0%}")
+        if hist.count:
+            s = hist.summary()
+            print(f"  duplicate check: {s['count']} checks, p50 {s['p50'] * 1000:.2f} ms, p99 {s['p99'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Enrollment wall time: capture-then-upload versus the streaming session.
+
+Run from app/:  python -m bench.enroll_pipeline --captures 10 --finger-delay 0.3 --uplink-mbps 4
+"""
+import argparse
+import time
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from client.edge import EdgeVerifier, LocalGallery
+from client.enrollment import EnrollmentSession
+from client.lsh_index import CandidateIndex
+from finger_device.backend import SimulatedBackend
+from finger_device.device import Device
+from imaging.quality import QualityGate
+
+
+def make_device(captures: int, finger_delay: float) -> Device:
+    identity = SyntheticIdentity(7)
+    frames = [identity.impression(i).tobytes() for i in range(captures)]
+    return Device(SimulatedBackend(frames=frames, finger_delay=finger_delay, seed=1))
+
+
+def make_edge() -> EdgeVerifier:
+    return EdgeVerifier(LocalGallery(path=None), index=CandidateIndex())
+
+
+def capture(dev: Device, gate: QualityGate):
+    frame = dev.capture_frame()
+    gate.score(frame)
+    return frame
+
+
+def serial(url: str, captures: int, finger_delay: float) -> tuple:
+    """The old flow: every capture first, then encode, upload and template extraction."""
+    dev, gate, client, edge = make_device(captures, finger_delay), QualityGate(), Client(url), make_edge()
+    client.upload_codec()
+    t0 = time.perf_counter()
+    images = []
+    for _ in range(captures):
+        with capture(dev, gate) as frame:
+            images.append(frame.tobytes())
+    captured = time.perf_counter() - t0
+    codec, payloads = client.encode_images(images)
+    response = client.register_user("a@example.com", "A", payloads, codec)
+    edge.enroll({"name": "A", "email": "a@example.com", **response["user"]}, images)
+    total = time.perf_counter() - t0
+    client.close()
+    dev.close()
+    return captured, total
+
+
+def pipelined(url: str, captures: int, finger_delay: float) -> tuple:
+    dev, gate, client, edge = make_device(captures, finger_delay), QualityGate(), Client(url), make_edge()
+    client.upload_codec()
+    # Every capture counts here, as in the serial flow, so both upload the same images
+    session = EnrollmentSession(client, edge, duplicates=False)
+    t0 = time.perf_counter()
+    for _ in range(captures):
+        session.add(capture(dev, gate))
+    captured = time.perf_counter() - t0
+    response, used = session.finish("a@example.com", "A")
+    total = time.perf_counter() - t0
+    assert response["user"]["images"] == used == captures
+    session.close()
+    client.close()
+    dev.close()
+    return captured, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--captures", type=int, default=10)
+    parser.add_argument("--finger-delay", type=float, default=0.3, help="seconds between placements")
+    parser.add_argument("--uplink-mbps", type=float, default=4.0)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    args = parser.parse_args(argv)
+
+    bandwidth = args.uplink_mbps * 1e6 / 8
+    print(f"{'mode':<22} {'capture':>9} {'total':>9} {'after last capture':>19}")
+    for label, fn, staging in (("serial", serial, False),
+                               ("session, inline", pipelined, False),
+                               ("session, staged", pipelined, True)):
+        cfg = StubConfig(latency=args.rtt_ms / 1000, bandwidth=bandwidth, codecs=["bmp", "png", "gray8+zlib"],
+                         staging=staging)
+        with StubServer(cfg) as stub:
+            captured, total = fn(stub.url, args.captures, args.finger_delay)
+        print(f"{label:<22} {captured:8.2f}s {total:8.2f}s {(total - captured) * 1000:17.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
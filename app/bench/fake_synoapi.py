@@ -0,0 +1,167 @@
+"""Pure-Python stand-in for SynoAPIEx.dll with scripted timings.
+
+Pass an instance as DllBackend(dll=FakeSynoAPI(...)): every vendor call
+DllBackend makes is implemented with the same arguments (ctypes byref
+pointers, c_ubyte buffers) and return codes, so the real open, poll and
+transfer code paths run unchanged on Linux.
+"""
+import ctypes
+import random
+import threading
+import time
+from finger_device.backend import IMAGE_BYTES, PS_COMM_ERR, PS_NO_FINGER, PS_OK
+from imaging.encoder import encode_bmp
+
+PS_DEVICE_NOT_FOUND = 0x1F  # any non-zero code works, this one reads well in logs
+
+
+def _target(ref):
+    """The ctypes object behind byref(obj) or a pointer."""
+    return ref._obj if hasattr(ref, "_obj") else ref.contents
+
+
+class _Export:
+    """A callable that accepts argtypes/restype like a ctypes function."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.argtypes = None
+        self.restype = None
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.fn(*args)
+
+
+class FakeSynoAPI:
+    """Scripted SynoAPIEx.
+
+    Args:
+        frames: raw 256x288 frames returned by PSUpImage, cycled.
+        transport: where the reader answers: ("auto",), ("usb", package)
+            or ("com", port, baud).
+        usb_devices: count reported by PSGetUSBDevNum.
+        open_latency: seconds per PSOpenDeviceEx / PSAutoOpen attempt.
+        get_image_latency: seconds per PSGetImage round trip.
+        up_image_latency: seconds per PSUpImage (the frame transfer).
+        finger_delay: seconds from the first poll after a capture until the
+            next finger is on the sensor.
+        comm_error_rate: probability that PSGetImage fails with a comm error.
+        seed: random seed.
+    """
+
+    def __init__(self, frames: list = None, transport: tuple = ("auto",), usb_devices: int = 1,
+                 open_latency: float = 0.0, get_image_latency: float = 0.0, up_image_latency: float = 0.0,
+                 finger_delay: float = 0.0, comm_error_rate: float = 0.0, seed: int = 0):
+        from finger_device.backend import synthetic_frame
+        self.frames = [bytes(f) for f in frames] if frames else [synthetic_frame()]
+        self.transport = transport
+        self.usb_devices = usb_devices
+        self.open_latency = open_latency
+        self.get_image_latency = get_image_latency
+        self.up_image_latency = up_image_latency
+        self.finger_delay = finger_delay
+        self.comm_error_rate = comm_error_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._handles = {}          # handle value -> per-handle state
+        self._next_handle = 0x1000
+        for name in ("PSOpenDeviceEx", "PSAutoOpen", "PSGetUSBDevNum", "PSGetUDiskNum", "PSCloseDeviceEx",
+                     "PSGetImage", "PSUpImage", "PSImgData2BMP", "PSErr2Str", "PSReadParTable"):
+            setattr(self, name, _Export(getattr(self, "_" + name)))
+
+    # ===== Device discovery and open =====
+    def _new_handle(self, ref) -> int:
+        with self._lock:
+            value = self._next_handle
+            self._next_handle += 1
+            self._handles[value] = {"arrival": None, "grabbed": False, "index": 0}
+        _target(ref).value = value
+        return PS_OK
+
+    def _PSGetUSBDevNum(self, ref):
+        _target(ref).value = self.usb_devices
+        return PS_OK
+
+    def _PSGetUDiskNum(self, ref):
+        _target(ref).value = 0
+        return PS_OK
+
+    def _PSAutoOpen(self, ref, dtype_ref, addr, password, verify):
+        time.sleep(self.open_latency)
+        if self.transport[0] != "auto":
+            return PS_DEVICE_NOT_FOUND
+        _target(dtype_ref).value = 0
+        return self._new_handle(ref)
+
+    def _PSOpenDeviceEx(self, ref, device_type, port, baud, package, dev_num):
+        time.sleep(self.open_latency)
+        kind = self.transport[0]
+        if dev_num >= max(1, self.usb_devices):
+            return PS_DEVICE_NOT_FOUND
+        if kind == "auto" and device_type == 0:
+            return self._new_handle(ref)
+        if kind == "usb" and device_type == 0 and package == self.transport[1]:
+            return self._new_handle(ref)
+        if kind == "com" and device_type == 1 and (port, baud) == tuple(self.transport[1:3]):
+            return self._new_handle(ref)
+        return PS_DEVICE_NOT_FOUND
+
+    def _PSCloseDeviceEx(self, handle):
+        with self._lock:
+            self._handles.pop(_handle_value(handle), None)
+        return PS_OK
+
+    # ===== Capture =====
+    def _PSGetImage(self, handle, addr):
+        state = self._handles.get(_handle_value(handle))
+        if state is None:
+            return PS_COMM_ERR
+        if self.get_image_latency:
+            time.sleep(self.get_image_latency)
+        if self.comm_error_rate and self.rng.random() < self.comm_error_rate:
+            return PS_COMM_ERR
+        now = time.monotonic()
+        if state["arrival"] is None:
+            state["arrival"] = now + self.finger_delay
+        if now < state["arrival"]:
+            return PS_NO_FINGER
+        state["grabbed"] = True
+        return PS_OK
+
+    def _PSUpImage(self, handle, addr, buf, len_ref):
+        state = self._handles.get(_handle_value(handle))
+        if state is None or not state["grabbed"]:
+            return PS_COMM_ERR
+        if self.up_image_latency:
+            time.sleep(self.up_image_latency)
+        frame = self.frames[state["index"] % len(self.frames)]
+        img_len = _target(len_ref)
+        n = min(len(frame), img_len.value)
+        ctypes.memmove(buf, frame, n)
+        img_len.value = n
+        state["index"] += 1
+        state["grabbed"] = False
+        state["arrival"] = None
+        return PS_OK
+
+    def _PSImgData2BMP(self, buf, path: bytes):
+        with open(path.decode("utf-8"), "wb") as f:
+            f.write(encode_bmp(bytes(buf)[:IMAGE_BYTES]))
+        return PS_OK
+
+    def _PSErr2Str(self, code: int) -> bytes:
+        return {PS_OK: b"OK", PS_COMM_ERR: b"Communication error", PS_NO_FINGER: b"No finger",
+                PS_DEVICE_NOT_FOUND: b"Device not found"}.get(code, b"Unknown error")
+
+    # ===== Health =====
+    def _PSReadParTable(self, handle, addr, buf):
+        if _handle_value(handle) not in self._handles:
+            return PS_COMM_ERR
+        ctypes.memmove(buf, bytes(16), 16)
+        return PS_OK
+
+
+def _handle_value(handle) -> int:
+    return handle.value if hasattr(handle, "value") else handle
@@ -0,0 +1,65 @@
+"""Recall and latency of the LSH candidate index on synthetic identities.
+
+Run from app/:  python -m bench.lsh_recall --sizes 1000 10000 100000
+"""
+import argparse
+import time
+import numpy as np
+from client.lsh_index import CandidateIndex, describe
+from bench.synthetic import minutiae_identity, minutiae_impression
+from metrics import LatencyHistogram
+
+
+def run(size: int, queries: int, k: int, enrolled: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    identities = [minutiae_identity(rng) for _ in range(size)]
+    index = CandidateIndex()
+    t0 = time.perf_counter()
+    for i, t in enumerate(identities):
+        index.add(str(i), [describe(minutiae_impression(t, rng)) for _ in range(enrolled)])
+    build = time.perf_counter() - t0
+
+    lsh_hist, lin_hist = LatencyHistogram("lsh"), LatencyHistogram("linear")
+    lsh_hits = lin_hits = scanned = 0
+    for q in rng.choice(size, queries, replace=False):
+        desc = describe(minutiae_impression(identities[q], rng))
+        t0 = time.perf_counter()
+        shortlist = index.lsh_query(desc, k)
+        lsh_hist.record(time.perf_counter() - t0)
+        scanned += index.last_scanned
+        t0 = time.perf_counter()
+        exact = index.linear_query(desc, k)
+        lin_hist.record(time.perf_counter() - t0)
+        lsh_hits += any(key == str(q) for key, _ in shortlist)
+        lin_hits += any(key == str(q) for key, _ in exact)
+    return {
+        "size": size,
+        "build_s": build,
+        "recall_lsh": lsh_hits / queries,
+        "recall_linear": lin_hits / queries,
+        "scanned": scanned / queries / len(index),
+        "lsh_p50_ms": lsh_hist.percentile(50) * 1000,
+        "lsh_p99_ms": lsh_hist.percentile(99) * 1000,
+        "linear_p50_ms": lin_hist.percentile(50) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=50, help="shortlist size")
+    parser.add_argument("--enrolled", type=int, default=5, help="captures enrolled per identity")
+    args = parser.parse_args(argv)
+
+    print(f"{'users':>8} {'build':>8} {'recall@k lsh':>13} {'linear':>7} {'scanned':>8} "
+          f"{'lsh p50':>9} {'lsh p99':>9} {'linear p50':>11}")
+    for size in args.sizes:
+        r = run(size, args.queries, args.k, args.enrolled)
+        print(f"{r['size']:>8} {r['build_s']:7.1f}s {r['recall_lsh']:13.3f} {r['recall_linear']:7.3f} "
+              f"{r['scanned']:7.1%} "
+              f"{r['lsh_p50_ms']:7.2f}ms {r['lsh_p99_ms']:7.2f}ms {r['linear_p50_ms']:9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
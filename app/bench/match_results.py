@@ -0,0 +1,88 @@
+"""Match answer handling as the gallery grows: full JSON parse vs streamed top-k.
+
+Parses answers listing N users both ways (time and peak Python memory via
+tracemalloc), then times Client.check_fingerprint end to end against the
+stub server: full answer, top_k parsed on the client, and top_k applied by
+a server that advertises "match_top_k".
+
+Run from app/:  python -m bench.match_results --users 1000 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from bench.stub_server import StubConfig, StubServer, match_response
+from client.client import Client
+from client.match_stream import MatchStreamParser
+from finger_device.backend import synthetic_frame
+from imaging.encoder import encode_bmp
+from metrics import LatencyHistogram
+
+
+def measure(fn, repeat: int) -> tuple:
+    """(best seconds, peak bytes) of fn()."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def full_parse(raw: bytes, k: int) -> list:
+    """What the client did before: load everything, then sort."""
+    body = json.loads(raw)
+    return sorted(body["matching"], key=lambda m: m["distance"])[:k]
+
+
+def stream_parse(raw: bytes, k: int, chunk: int) -> list:
+    parser = MatchStreamParser(k)
+    for i in range(0, len(raw), chunk):
+        parser.feed(raw[i:i + chunk])
+    return parser.close()["matching"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--chunk", type=int, default=Client.STREAM_CHUNK)
+    parser.add_argument("--requests", type=int, default=5, help="end-to-end requests per size")
+    args = parser.parse_args(argv)
+
+    print(f"{'users':>7} {'body':>9} {'full parse':>11} {'full peak':>10} {'stream':>9} {'stream peak':>12} "
+          f"{'table rows':>11}")
+    for users in args.users:
+        raw = json.dumps(match_response(users, random.Random(users))).encode()
+        expected = full_parse(raw, args.top_k)
+        assert stream_parse(raw, args.top_k, args.chunk) == expected
+        repeat = 3 if users >= 50000 else 10
+        t_full, m_full = measure(lambda: full_parse(raw, args.top_k), repeat)
+        t_stream, m_stream = measure(lambda: stream_parse(raw, args.top_k, args.chunk), repeat)
+        print(f"{users:>7} {len(raw) / 1e6:7.2f}MB {t_full * 1000:9.1f}ms {m_full / 1e6:8.1f}MB "
+              f"{t_stream * 1000:7.1f}ms {m_stream / 1e6:10.2f}MB {users:>5} -> {min(users, 2):<3}")
+
+    print()
+    payload = encode_bmp(synthetic_frame())
+    runs = (("full", False, None), ("client top-k", False, args.top_k), ("server top-k", True, args.top_k))
+    for users in args.users:
+        for name, server_top_k, top_k in runs:
+            with StubServer(StubConfig(users=users, codecs=["bmp"], top_k=server_top_k)) as stub:
+                client = Client(stub.url, retries=0)
+                hist = LatencyHistogram(name)
+                for _ in range(args.requests):
+                    t0 = time.perf_counter()
+                    body = client.check_fingerprint(payload, top_k=top_k)
+                    hist.record(time.perf_counter() - t0)
+                kept = len(body["matching"])
+                print(f"{users:>7} users {name:<13} p50 {hist.percentile(50) * 1000:8.1f} ms  kept {kept}")
+                client.close()
+
+
+if __name__ == "__main__":
+    main()
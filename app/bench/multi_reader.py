@@ -0,0 +1,78 @@
+"""Per-reader throughput with several simulated readers feeding one matcher.
+
+One reader can be given a slow finger (--slow-delay) to check that it does
+not hold the others back.
+
+Run from app/:  python -m bench.multi_reader --readers 4 --seconds 10
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from finger_device.backend import SimulatedBackend
+from finger_device.device import Device
+from finger_device.manager import DeviceManager
+from metrics import LatencyHistogram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--finger-delay", type=float, default=0.2, help="seconds between placements")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="placement delay on reader 0")
+    parser.add_argument("--up-image-ms", type=float, default=60.0, help="frame transfer time")
+    parser.add_argument("--rtt-ms", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    frames = [SyntheticIdentity(i).impression(i).tobytes() for i in range(4)]
+    devices = {}
+    for reader in range(args.readers):
+        delay = args.slow_delay if reader == 0 else args.finger_delay
+        backend = SimulatedBackend(frames=frames, finger_delay=delay, finger_jitter=delay / 4,
+                                   up_image_latency=args.up_image_ms / 1000, seed=reader)
+        devices[reader] = Device(backend)
+    manager = DeviceManager(devices)
+
+    with StubServer(StubConfig(latency=args.rtt_ms / 1000, codecs=["bmp", "gray8+zlib"])) as stub:
+        client = Client(stub.url)
+        codec = client.upload_codec()
+        verify_hist = LatencyHistogram("verify")
+        served = {reader: 0 for reader in manager.readers()}
+
+        def verify(item):
+            try:
+                payload = codec.encode(item.frame)
+            finally:
+                item.release()
+            client.check_fingerprint(payload, codec.name)
+            verify_hist.record(time.monotonic() - item.captured_at)
+            served[item.reader] += 1
+
+        pool = ThreadPoolExecutor(max_workers=args.readers * 2, thread_name_prefix="verify")
+        manager.start()
+        deadline = time.monotonic() + args.seconds
+        while time.monotonic() < deadline:
+            try:
+                pool.submit(verify, manager.get(timeout=0.1))
+            except Exception:
+                continue
+        manager.stop()
+        pool.shutdown(wait=True)
+        client.close()
+
+    print(f"{'reader':>6} {'finger':>7} {'captures':>9} {'per s':>6} {'capture p50':>12} "
+          f"{'dropped':>8} {'verified':>9}")
+    for s in manager.summary():
+        delay = args.slow_delay if s["reader"] == 0 else args.finger_delay
+        print(f"{s['reader']:>6} {delay:6.1f}s {s['captures']:>9} {s['per_second']:6.2f} "
+              f"{s['capture']['p50'] * 1000:10.0f}ms {s['dropped']:>8} {served[s['reader']]:>9}")
+    v = verify_hist.summary()
+    print(f"capture-to-answer p50 {v['p50'] * 1000:.0f} ms, p99 {v['p99'] * 1000:.0f} ms over {v['count']} frames")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
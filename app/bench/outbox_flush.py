@@ -0,0 +1,55 @@
+"""Front-desk latency and delivery of the registration outbox under server errors.
+
+Run from app/:  python -m bench.outbox_flush --users 50 --error-rate 0.3
+"""
+import argparse
+import os
+import tempfile
+import time
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from client.outbox import Outbox
+from metrics import LatencyHistogram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.3, help="share of requests answered 503")
+    parser.add_argument("--rtt-ms", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    client = Client(codecs=("gray8+zlib",))
+    codec = client.codecs["gray8+zlib"]
+    payloads = [codec.encode(SyntheticIdentity(i).impression(i)) for i in range(args.images)]
+
+    cfg = StubConfig(latency=args.rtt_ms / 1000, error_rate=args.error_rate, seed=3)
+    with StubServer(cfg) as stub, tempfile.TemporaryDirectory() as tmp:
+        client.base_url = stub.url
+        delivered = []
+        outbox = Outbox(client, path=os.path.join(tmp, "outbox.db"), backoff=0.05, max_backoff=1.0,
+                        on_delivered=lambda item, body: delivered.append(time.perf_counter()))
+        put_hist = LatencyHistogram("put")
+        t0 = time.perf_counter()
+        outbox.start()
+        for i in range(args.users):
+            t = time.perf_counter()
+            outbox.put_registration(f"user{i}@example.com", f"User {i}", payloads, codec.name)
+            put_hist.record(time.perf_counter() - t)
+        while len(delivered) < args.users and time.perf_counter() - t0 < 120:
+            time.sleep(0.05)
+        drained = time.perf_counter() - t0
+        outbox.close()
+
+    p = put_hist.summary()
+    redelivered = sum(1 for n in cfg.idempotency_keys.values() if n > 1)
+    print(f"submit (local write): p50 {p['p50'] * 1000:.1f} ms, p99 {p['p99'] * 1000:.1f} ms")
+    print(f"delivered {len(delivered)}/{args.users} in {drained:.2f}s with {cfg.requests} requests "
+          f"at {args.error_rate:.0%} 503s; {redelivered} keys sent more than once")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Upload size and local cost of the ROI crop / enhancement pipeline.
+
+Runs synthetic captures (placed off-centre by up to --shift pixels, as
+real placements often are) through each preprocessing configuration and
+reports per-stage p50 time, the crop area and the mean payload per codec.
+Finishes with Client.check_fingerprint against a stub server advertising
+"image_roi" to show bytes on the wire per match.
+
+Run from app/:  python -m bench.preprocess_roi --frames 50 --shift 40
+"""
+import argparse
+import numpy as np
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from client.client import Client
+from imaging.codecs import available_codecs
+from imaging.preprocess import Preprocessor
+
+CONFIGS = ("off", "segment", "crop", "crop,normalize", "crop,enhance")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--shift", type=float, default=40.0)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS))
+    args = parser.parse_args(argv)
+
+    frames = [SyntheticIdentity(i % 10).impression(i, shift=args.shift) for i in range(args.frames)]
+    codecs = available_codecs()
+    print(f"{'stages':<16} {'p50 ms':>7} {'area':>6} " + " ".join(f"{name:>11}" for name in codecs) + "  per stage p50 ms")
+    for spec in args.configs:
+        pre = Preprocessor.from_spec(spec)
+        sizes = {name: [] for name in codecs}
+        timings, areas = {}, []
+        for frame in frames:
+            if pre is None:
+                image, area = frame, 1.0
+            else:
+                result = pre.run(frame)
+                image, area = result.image, result.image.size / frame.size
+                for stage, seconds in result.timings.items():
+                    timings.setdefault(stage, []).append(seconds)
+            areas.append(area)
+            for name, codec in codecs.items():
+                sizes[name].append(len(codec.encode(image)))
+        total = np.median(timings.pop("total", [0.0])) * 1000
+        stages = ", ".join(f"{stage} {np.median(t) * 1000:.1f}" for stage, t in timings.items())
+        print(f"{spec:<16} {total:7.1f} {np.mean(areas):6.0%} " +
+              " ".join(f"{np.mean(sizes[name]) / 1024:9.1f}kB" for name in codecs) + f"  {stages or '-'}")
+
+    print()
+    for spec in ("off", "crop", "crop,enhance"):
+        with StubServer(StubConfig(codecs=["gray8+zlib", "bmp"], roi=True)) as stub:
+            client = Client(stub.url, retries=0, preprocess=spec)
+            for frame in frames:
+                codec, payload, geometry = client.encode_image(frame)
+                client.check_fingerprint(payload, codec, **geometry)
+            client.close()
+            cfg = stub.config
+            print(f"match uploads, {spec:<13} {cfg.bytes_received / len(frames) / 1024:7.1f} kB/request "
+                  f"({cfg.roi_requests} with roi fields)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubConfig:
+    """Scripted behaviour of the stub API.
+
+    Args:
+        latency: base server time per request, seconds.
+        jitter: extra uniform random delay, seconds.
+        error_rate: probability of answering 503.
+        fail_first: answer 503 to this many POSTs before any other.
+        slow_rate: probability of a request hitting a slow path (tail latency).
+        slow_delay: extra delay of the slow path, seconds.
+        users: number of enrolled users listed in each match response.
+        codecs: image codecs advertised on GET /capabilities; None answers
+            404 like the current production server.
+        bandwidth: uplink bytes per second, so bigger uploads take longer;
+            None means unlimited.
+        staging: accept POST /auth/stage-finger-print and advertise it.
+        top_k: honour the top_k / max_distance match fields and advertise it.
+        roi: advertise "image_roi" (cropped/enhanced match images); the
+            roi fields received are counted in roi_requests.
+        seed: random seed.
+    """
+
+    def __init__(self, latency: float = 0.005, jitter: float = 0.0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_delay: float = 0.0, users: int = 20, codecs: list = None,
+                 bandwidth: float = None, staging: bool = False, top_k: bool = False, roi: bool = False,
+                 fail_first: int = 0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.users = users
+        self.codecs = codecs
+        self.bandwidth = bandwidth
+        self.staging = staging
+        self.top_k = top_k
+        self.roi = roi
+        self.roi_requests = 0
+        self.staged = {}
+        self.idempotency_keys = {}  # key -> times seen, to spot redeliveries
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+        self.connections = 0
+
+
+def match_response(users: int, rng: random.Random) -> dict:
+    """Body shaped like the real /auth/match-finger-print answer."""
+    matching = []
+    for i in range(users):
+        matching.append({
+            "user": {"id": i + 1, "name": f"User {i + 1}", "email": f"user{i + 1}@example.com"},
+            "distance": round(rng.uniform(20.0, 120.0), 4),
+            "matching_time": round(rng.uniform(0.001, 0.004), 6),
+        })
+    best = min(matching, key=lambda m: m["distance"]) if matching else None
+    return {"matching": matching, "best_match": best if best and best["distance"] < 50 else None}
+
+
+def _form_field(body: bytes, name: str, content_type: str = "") -> str:
+    """Value of a small text field in a multipart or urlencoded body (good enough for the stub)."""
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return parse_qs(body.decode("utf-8", "replace")).get(name, [None])[0]
+    marker = f'name="{name}"\r\n\r\n'.encode()
+    start = body.find(marker)
+    if start < 0:
+        return None
+    start += len(marker)
+    return body[start:body.find(b"\r\n", start)].decode("utf-8", "replace")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.config.lock:
+            self.server.config.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        cfg = self.server.config
+        if self.path == "/capabilities" and (cfg.codecs is not None or cfg.staging or cfg.top_k or cfg.roi):
+            caps = {"image_codecs": list(cfg.codecs or ["bmp"])}
+            if cfg.staging:
+                caps["enrollment_staging"] = True
+            if cfg.top_k:
+                caps["match_top_k"] = True
+            if cfg.roi:
+                caps["image_roi"] = True
+            self._reply(200, caps)
+        else:
+            self._reply(404, {"message": "Not found"})
+
+    def do_POST(self):
+        cfg = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        with cfg.lock:
+            cfg.requests += 1
+            cfg.bytes_received += length
+            key = self.headers.get("Idempotency-Key")
+            if key:
+                cfg.idempotency_keys[key] = cfg.idempotency_keys.get(key, 0) + 1
+            delay = cfg.latency + (cfg.rng.uniform(0, cfg.jitter) if cfg.jitter else 0.0)
+            if cfg.slow_rate and cfg.rng.random() < cfg.slow_rate:
+                delay += cfg.slow_delay
+            if cfg.bandwidth:
+                delay += length / cfg.bandwidth
+            fail = cfg.fail_first > 0 or (cfg.error_rate and cfg.rng.random() < cfg.error_rate)
+            cfg.fail_first = max(0, cfg.fail_first - 1)
+            rng = random.Random(cfg.rng.random())
+        time.sleep(delay)
+        if fail:
+            self._reply(503, {"message": "Service unavailable (stub)"})
+        elif self.path == "/auth/match-finger-print":
+            answer = match_response(cfg.users, rng)
+            if cfg.roi and _form_field(body, "roi", self.headers.get("Content-Type", "")):
+                with cfg.lock:
+                    cfg.roi_requests += 1
+            if cfg.top_k:
+                content_type = self.headers.get("Content-Type", "")
+                k, limit = _form_field(body, "top_k", content_type), _form_field(body, "max_distance", content_type)
+                matching = answer["matching"]
+                if limit:
+                    matching = [m for m in matching if m["distance"] <= float(limit)]
+                if k:
+                    matching = sorted(matching, key=lambda m: m["distance"])[:int(k)]
+                answer["matching"] = matching
+            self._reply(200, answer)
+        elif self.path == "/auth/register-new-user":
+            files = body.count(b'name="files"')
+            staged = _form_field(body, "staged", self.headers.get("Content-Type", ""))
+            staged = [s for s in staged.split(",") if s in cfg.staged] if staged else []
+            self._reply(200, {"message": "User registered",
+                              "user": {"id": cfg.requests, "images": files + len(staged)}})
+        elif self.path == "/auth/stage-finger-print" and cfg.staging:
+            stage_id = _form_field(body, "stage_id", self.headers.get("Content-Type", ""))
+            with cfg.lock:
+                cfg.staged[stage_id] = len(body)
+            self._reply(200, {"stage_id": stage_id})
+        else:
+            self._reply(404, {"message": "Not found"})
+
+
+class StubServer:
+    """Local stand-in for the fingerprint API, run on a background thread."""
+
+    def __init__(self, config: StubConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
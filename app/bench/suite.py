@@ -0,0 +1,280 @@
+"""End-to-end benchmark suite: fake SynoAPIEx, local stub API, baselines.
+
+Runs on Linux without a reader or a server. Each benchmark reports a few
+metrics; every run checks them against bench/baseline.json and exits 1
+when one regressed by more than `--threshold` (20% by default; p99
+latencies, measured from few samples, get TAIL_TOLERANCE times that).
+
+Absolute timings only mean something on the machine that recorded them, so
+baselines are kept per host (platform.node(), or --host NAME for a shared
+CI runner label). A host without one gets no verdict until it records its
+own; re-record after hardware or dependency changes. Metrics that cannot
+run here (e.g. the lz4 codec without the lz4 package) are reported as
+skipped, never compared.
+
+Run from app/:
+    python -m bench.suite                      # run and compare with this host's baseline
+    python -m bench.suite --update-baseline    # (re)record this host's baseline
+    python -m bench.suite --only encode client
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench.fake_synoapi import FakeSynoAPI
+from bench.stub_server import StubConfig, StubServer
+from bench.synthetic import SyntheticIdentity
+from metrics import LatencyHistogram
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LOWER, HIGHER = "lower", "higher"
+OPTIONAL_CODECS = {"gray8+lz4": "lz4"}     # codec -> package it needs
+TAIL_TOLERANCE = 2.5                       # p99s come from a few dozen samples: allow 2.5x the threshold
+MIN_ENCODE_SECONDS = 0.5                   # fast codecs are timed for at least this long
+
+
+def _frames(n: int = 4) -> list:
+    return [SyntheticIdentity(i).impression(i).tobytes() for i in range(n)]
+
+
+def _device(fake: FakeSynoAPI):
+    from finger_device.backend import DllBackend
+    from finger_device.device import Device
+    return Device(DllBackend(fake, profile_path=None))
+
+
+# ===== Benchmarks =====
+def bench_open(args) -> dict:
+    """Cold open through the full probe (reader on COM17) and warm open from the cached profile."""
+    import tempfile
+    from finger_device.backend import DllBackend
+    fake = FakeSynoAPI(transport=("com", 17, 12), open_latency=0.01)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "transport.json")
+        t0 = time.perf_counter()
+        cold = DllBackend(fake, profile_path=path)
+        cold.open()
+        cold_s = time.perf_counter() - t0
+        cold.close()
+        t0 = time.perf_counter()
+        warm = DllBackend(fake, profile_path=path)
+        warm.open()
+        warm_s = time.perf_counter() - t0
+        warm.close()
+    return {"open_cold_ms": (cold_s * 1000, LOWER), "open_warm_ms": (warm_s * 1000, LOWER)}
+
+
+def bench_capture(args) -> dict:
+    """Capture loop: delay between finger landing and frame bytes, minus the transfer itself."""
+    delay, transfer = 0.2, 0.03
+    fake = FakeSynoAPI(_frames(), finger_delay=delay, get_image_latency=0.002, up_image_latency=transfer)
+    dev = _device(fake)
+    hist = LatencyHistogram("capture_overhead")
+    for _ in range(args.captures):
+        t0 = time.monotonic()
+        dev.capture_frame().release()
+        hist.record(max(0.0, time.monotonic() - t0 - delay - transfer))
+    dev.close()
+    s = hist.summary()
+    return {"capture_overhead_p50_ms": (s["p50"] * 1000, LOWER),
+            "capture_overhead_p99_ms": (s["p99"] * 1000, LOWER),
+            "polls_per_capture": (fake.PSGetImage.calls / args.captures, LOWER)}
+
+
+def bench_encode(args) -> dict:
+    """Encode throughput per codec, frames per second on one thread."""
+    from imaging.codecs import available_codecs
+    frames = _frames()
+    out = {}
+    for name, codec in available_codecs().items():
+        if name == "png-lossy":
+            continue
+        n = 0
+        t0 = time.perf_counter()
+        while n < args.encodes or time.perf_counter() - t0 < MIN_ENCODE_SECONDS:
+            codec.encode(frames[n % len(frames)])
+            n += 1
+        out[f"encode_{name}_fps"] = (n / (time.perf_counter() - t0), HIGHER)
+    for name in OPTIONAL_CODECS:
+        out.setdefault(f"encode_{name}_fps", (None, HIGHER))
+    return out
+
+
+def bench_client(args) -> dict:
+    """Match requests per second against the stub, one thread and eight threads."""
+    from client.client import Client
+    from imaging.codecs import available_codecs
+    payload = available_codecs()["gray8+zlib"].encode(_frames(1)[0])
+    out = {}
+    with StubServer(StubConfig(latency=0.005, codecs=["bmp", "gray8+zlib"])) as stub:
+        client = Client(stub.url)
+        client.check_fingerprint(payload, "gray8+zlib")  # warm the connection
+        for threads in (1, 8):
+            hist = LatencyHistogram(f"match_{threads}")
+
+            def one(_):
+                t0 = time.perf_counter()
+                client.check_fingerprint(payload, "gray8+zlib")
+                hist.record(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(one, range(args.requests)))
+            out[f"client_{threads}t_rps"] = (args.requests / (time.perf_counter() - t0), HIGHER)
+            out[f"client_{threads}t_p99_ms"] = (hist.percentile(99) * 1000, LOWER)
+        client.close()
+    return out
+
+
+def bench_verify(args) -> dict:
+    """Full verify: capture, quality gate, template, encode, edge check and server match."""
+    from client.client import Client
+    from client.edge import EdgeVerifier, LocalGallery
+    from client.lsh_index import CandidateIndex
+    from imaging.quality import QualityGate
+    fake = FakeSynoAPI(_frames(), get_image_latency=0.002, up_image_latency=0.03)
+    dev = _device(fake)
+    gate = QualityGate()
+    edge = EdgeVerifier(LocalGallery(path=None), index=CandidateIndex())
+    hist = LatencyHistogram("verify")
+    with StubServer(StubConfig(latency=0.01, codecs=["bmp", "gray8+zlib"])) as stub:
+        client = Client(stub.url)
+        client.upload_codec()
+        for _ in range(args.verifies):
+            t0 = time.perf_counter()
+            with dev.capture_frame() as frame:
+                gate.score(frame)
+                template = edge.extract(frame)
+                codec, (payload,) = client.encode_images([frame])
+            response = edge.verify(template, lambda c: client.check_fingerprint(payload, codec, candidates=c))
+            assert response is not None
+            hist.record(time.perf_counter() - t0)
+        client.close()
+    dev.close()
+    s = hist.summary()
+    return {"verify_p50_ms": (s["p50"] * 1000, LOWER), "verify_p99_ms": (s["p99"] * 1000, LOWER)}
+
+
+BENCHMARKS = {
+    "open": bench_open,
+    "capture": bench_capture,
+    "encode": bench_encode,
+    "client": bench_client,
+    "verify": bench_verify,
+}
+
+
+# ===== Baselines =====
+def default_host() -> str:
+    return platform.node() or "unknown"
+
+
+def load_baselines(path: str) -> dict:
+    """host -> {"machine": ..., "metrics": {name: {"value", "better"}}}."""
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("hosts", {})
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions as (metric, value, baseline) tuples; skipped (None) metrics are left out."""
+    regressions = []
+    for name, (value, better) in results.items():
+        base = baseline.get(name)
+        if base is None or value is None:
+            continue
+        allowed = threshold * (TAIL_TOLERANCE if "_p99_" in name else 1.0)
+        limit = base["value"] * (1 + allowed) if better == LOWER else base["value"] * (1 - allowed)
+        if (better == LOWER and value > limit) or (better == HIGHER and value < limit):
+            regressions.append((name, value, base["value"]))
+    return regressions
+
+
+def better_of(a: tuple, b: tuple) -> tuple:
+    """The better of two (value, better) measurements of the same metric."""
+    if a[0] is None or b[0] is None:
+        return a if b[0] is None else b
+    pick = min if a[1] == LOWER else max
+    return (pick(a[0], b[0]), a[1])
+
+
+def run(names, args) -> tuple:
+    """Run benchmarks; returns (metric -> (value, better), metric -> benchmark name)."""
+    results, source = {}, {}
+    for name in names:
+        t0 = time.perf_counter()
+        metrics = BENCHMARKS[name](args)
+        print(f"[{name}] {time.perf_counter() - t0:.1f}s")
+        for metric, (value, better) in metrics.items():
+            if value is None:
+                print(f"  {metric:<28} {'skipped':>12}  (not available here)")
+            else:
+                print(f"  {metric:<28} {value:12.2f}  ({better} is better)")
+            source[metric] = name
+        results.update(metrics)
+    return results, source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", "--save-baseline", dest="update_baseline", action="store_true",
+                        help="record the results as this host's baseline")
+    parser.add_argument("--host", default=default_host(), help="baseline key (default: this machine's name)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--captures", type=int, default=20)
+    parser.add_argument("--encodes", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--verifies", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    results, source = run(args.only or BENCHMARKS, args)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({k: {"value": v, "better": b} for k, (v, b) in results.items()}, f, indent=2)
+
+    hosts = load_baselines(args.baseline)
+    if args.update_baseline:
+        entry = hosts.setdefault(args.host, {"metrics": {}})
+        entry["machine"] = f"{platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}"
+        entry["metrics"].update({k: {"value": round(v, 3), "better": b}
+                                 for k, (v, b) in results.items() if v is not None})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"hosts": hosts}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline for {args.host} saved to {args.baseline}")
+        return 0
+
+    if args.host not in hosts:
+        print(f"No baseline for host {args.host!r} (have: {', '.join(sorted(hosts)) or 'none'}); "
+              f"run with --update-baseline to record one.")
+        return 0
+    baseline = hosts[args.host]["metrics"]
+    for name, (value, _) in results.items():
+        if value is None and name in baseline:
+            print(f"SKIPPED {name}: not available here, baseline {baseline[name]['value']:.2f} not checked")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        # One noisy run is not a regression: re-run the benchmarks involved and keep the better value
+        again = sorted({source[name] for name, _, _ in regressions})
+        print(f"Re-running {', '.join(again)} to confirm ...")
+        retry, _ = run(again, args)
+        for metric, measured in retry.items():
+            results[metric] = better_of(results[metric], measured)
+        regressions = compare(results, baseline, args.threshold)
+    for name, value, base in regressions:
+        print(f"REGRESSION {name}: {value:.2f} vs baseline {base:.2f} (threshold {args.threshold:.0%})")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
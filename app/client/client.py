@@ -1,54 +1,415 @@
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from client.match_stream import MatchStreamParser
+from imaging.codecs import available_codecs
+from metrics import record_span, span
 
 
 api_url = "http://10.21.54.187"  # استبدل هذا بالرابط الصحيح للـ API
+hedge_api_url = None  # Optional second server for hedged match requests
+# Match uploads are preprocessed locally (e.g. "crop" or "crop,enhance") when the server
+# advertises "image_roi"; off unless set here or in FINGERPRINT_PREPROCESS
+preprocess_stages = os.environ.get("FINGERPRINT_PREPROCESS", "")
+
+
+def _not_connected(error: Exception) -> bool:
+    """True when a request failed while connecting (refused, unresolvable or timed out)."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _close_unless(future, keep):
+    """Close a finished request's response unless it is the one being returned."""
+    if not future.cancelled() and future.exception() is None and future.result() is not keep:
+        future.result().close()
 
 
 class Client:
-   def register_user(self, email: str, name: str, images: list[bytes]):
+    # (connect, read) timeouts per endpoint, in seconds
+    TIMEOUTS = {
+        "register": (3.05, 60.0),
+        "match": (3.05, 15.0),
+        "probe": (1.0, 2.0),
+    }
+    RETRY_STATUS = (502, 503, 504)
+    # Upload encodings, best first; the server's capability list filters them
+    PREFERRED_CODECS = ("gray8+lz4", "gray8+zlib", "png", "bmp")
+    CAPABILITIES_TTL = 600.0
+    FALLBACK_TTL = 15.0     # the probe failed (timeout, 5xx): ask again soon
+    STREAM_CHUNK = 64 * 1024
+    FALLBACK_CAPABILITIES = {"image_codecs": ["bmp"]}
+
+    def __init__(self, base_url: str = None, hedge_url: str = None, hedge_after: float = 0.5,
+                 pool_size: int = 8, timeouts: dict = None, retries: int = 2, backoff: float = 0.1,
+                 codecs: tuple = None, lossy_quality: int = 50, top_k: int = None, max_distance: float = None,
+                 preprocess=None):
         """
-        Register a user with multiple fingerprint images (BMP format).
+        HTTP client for the fingerprint API.
+
+        Args:
+            base_url (str): API root, defaults to the module-level api_url
+            hedge_url (str): second API root; a match that has not answered
+                after `hedge_after` seconds is also sent there and the first
+                answer wins
+            pool_size (int): keep-alive connections kept per host
+            timeouts (dict): per-endpoint (connect, read) overrides
+            retries (int): extra attempts for idempotent requests
+            backoff (float): base delay for full-jitter exponential backoff
+            codecs (tuple): upload encodings in order of preference, e.g.
+                ("png-lossy", "png", "bmp"); BMP is always the fallback
+            lossy_quality (int): 1-100 quality of the png-lossy codec
+            top_k (int): default for check_fingerprint, keep only the k
+                closest matches
+            max_distance (float): default for check_fingerprint, drop
+                matches farther than this
+            preprocess: Preprocessor or stage list (e.g. "crop,enhance")
+                applied by encode_image; defaults to preprocess_stages
+        """
+        self.base_url = base_url or api_url
+        self.hedge_url = hedge_url or hedge_api_url
+        self.hedge_after = hedge_after
+        self.timeouts = dict(self.TIMEOUTS, **(timeouts or {}))
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers["accept"] = "application/json"
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hedge_pool = None
+        self.codecs = available_codecs(lossy_quality)
+        self.preferred_codecs = tuple(codecs or self.PREFERRED_CODECS)
+        self.top_k = top_k
+        self.max_distance = max_distance
+        # A stage list becomes a Preprocessor on first use, so plain API calls never load it
+        self._preprocess = preprocess if preprocess is not None else preprocess_stages
+        self._capabilities = None
+        self._capabilities_until = 0.0
+        self._capabilities_lock = threading.Lock()
+
+    @property
+    def preprocess(self):
+        """Preprocessor applied by encode_image, or None when preprocessing is off."""
+        if isinstance(self._preprocess, str):
+            pre = None
+            if self._preprocess:
+                from imaging.preprocess import Preprocessor
+                pre = Preprocessor.from_spec(self._preprocess)
+            self._preprocess = pre
+        return self._preprocess
+
+    def close(self):
+        self.session.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+    # ===== Transport =====
+    def _post(self, base_url: str, path: str, endpoint: str, idempotent: bool, **kwargs):
+        """POST with pooled keep-alive connections, timeouts and bounded retry.
+
+        Idempotent requests are retried on connection errors, timeouts and
+        502/503/504. Others are only retried when the connection could not be
+        established, since then nothing reached the server.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(f"{base_url}{path}", timeout=self.timeouts[endpoint], **kwargs)
+                if not (idempotent and response.status_code in self.RETRY_STATUS and attempt < self.retries):
+                    return response
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not (idempotent or _not_connected(e)) or attempt >= self.retries:
+                    raise
+            attempt += 1
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _post_hedged(self, path: str, endpoint: str, **kwargs):
+        """Send to base_url, and also to hedge_url if the first is slow."""
+        if not self.hedge_url:
+            return self._post(self.base_url, path, endpoint, True, **kwargs)
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+        primary = self._hedge_pool.submit(self._post, self.base_url, path, endpoint, True, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done and primary.exception() is None and primary.result().status_code == 200:
+            return primary.result()
+        futures = [primary, self._hedge_pool.submit(self._post, self.hedge_url, path, endpoint, True, **kwargs)]
+        winner = None
+        try:
+            winner = self._first_ok(futures)
+            return winner
+        finally:
+            # Streamed responses hold a pooled connection until closed; release every
+            # response that is not handed back, including ones still in flight
+            for future in futures:
+                future.add_done_callback(lambda f: _close_unless(f, winner))
+
+    @staticmethod
+    def _first_ok(futures: list):
+        """First 200 among the futures, else the last other response, else the last error."""
+        pending = set(futures)
+        last_error = last_response = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    last_error = future.exception()
+                    continue
+                if future.result().status_code == 200:
+                    return future.result()
+                last_response = future.result()
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    # ===== Content Negotiation =====
+    def capabilities(self, refresh: bool = False) -> dict:
+        """
+        Server capabilities from GET /capabilities, cached for CAPABILITIES_TTL.
+
+        Servers without the endpoint get FALLBACK_CAPABILITIES, i.e. plain
+        BMP uploads. So do unreachable or failing ones, but only for
+        FALLBACK_TTL, so a transient error does not pin BMP for long. The
+        GET runs outside the lock; concurrent callers never wait on it.
+        """
+        with self._capabilities_lock:
+            if self._capabilities is not None and not refresh and time.monotonic() < self._capabilities_until:
+                return self._capabilities
+        ttl = self.FALLBACK_TTL
+        try:
+            response = self.session.get(f"{self.base_url}/capabilities", timeout=self.timeouts["probe"])
+            caps = response.json() if response.status_code == 200 else self.FALLBACK_CAPABILITIES
+            if response.status_code < 500:
+                ttl = self.CAPABILITIES_TTL
+        except (requests.exceptions.RequestException, ValueError):
+            caps = self.FALLBACK_CAPABILITIES
+        with self._capabilities_lock:
+            self._capabilities = caps
+            self._capabilities_until = time.monotonic() + ttl
+        return caps
+
+    def upload_codec(self):
+        """Best codec that both we and the server support (BMP as fallback)."""
+        supported = set(self.capabilities().get("image_codecs", ["bmp"]))
+        for name in self.preferred_codecs:
+            if name in supported and name in self.codecs:
+                return self.codecs[name]
+        return self.codecs["bmp"]
+
+    def encode_images(self, images: list) -> tuple:
+        """
+        Encode raw gray frames (Frame, bytes or arrays) with the negotiated codec.
+
+        Returns:
+            (codec name, list of payload bytes)
+        """
+        codec = self.upload_codec()
+        return codec.name, [codec.encode(img) for img in images]
+
+    def encode_image(self, img, width: int = 256, height: int = 288) -> tuple:
+        """
+        Preprocess (when enabled and the server supports it) and encode one match image.
+
+        Returns:
+            (codec name, payload bytes, geometry) where geometry holds the
+            width, height and roi keyword arguments for check_fingerprint
+        """
+        codec = self.upload_codec()
+        if self.preprocess is None or not self.supports_roi():
+            return codec.name, codec.encode(img, width, height), {"width": width, "height": height, "roi": None}
+        pre = self.preprocess.run(img, width, height)
+        return codec.name, codec.encode(pre.image), {"width": pre.width, "height": pre.height, "roi": pre.fields()}
+
+    def codec_metrics(self) -> list:
+        """Per-codec bytes-on-wire and encode-time summaries."""
+        return [c.metrics.summary() for c in self.codecs.values() if c.metrics.frames]
+
+    def _codec_fields(self, codec: str, width: int, height: int) -> dict:
+        """Form fields describing the payload encoding (none for BMP, as before)."""
+        if codec == "bmp":
+            return {}
+        fields = {"codec": codec}
+        if self.codecs[codec].needs_geometry:
+            fields.update(width=str(width), height=str(height))
+        return fields
+
+    def supports_staging(self) -> bool:
+        """True when the server accepts enrollment images ahead of the register call."""
+        return bool(self.capabilities().get("enrollment_staging"))
+
+    def supports_roi(self) -> bool:
+        """True when the server accepts cropped/enhanced match images with roi metadata."""
+        return bool(self.capabilities().get("image_roi"))
+
+    def supports_top_k(self) -> bool:
+        """True when the server can trim match answers to top_k / max_distance itself."""
+        return bool(self.capabilities().get("match_top_k"))
+
+    # ===== API =====
+    def stage_image(self, image: bytes, codec: str = "bmp", width: int = 256, height: int = 288) -> str:
+        """
+        Upload one enrollment image before the user is registered.
+
+        The stage id is generated here and sent along, so a retried upload
+        overwrites the same slot and the call is safe to retry.
+
+        Returns:
+            the stage id to pass to register_user, or None on failure
+        """
+        c = self.codecs[codec]
+        stage_id = uuid.uuid4().hex
+        t0 = time.perf_counter()
+        data = {"stage_id": stage_id, **self._codec_fields(codec, width, height)}
+        response = self._post(
+            self.base_url,
+            "/auth/stage-finger-print",
+            "register",
+            True,
+            data=data,
+            files={'file': (c.filename(), image, c.mime)},
+        )
+        record_span("client.stage", time.perf_counter() - t0)
+        if response.status_code == 200:
+            return response.json().get("stage_id", stage_id)
+        return None
+
+    def register_user(self, email: str, name: str, images: list[bytes], codec: str = "bmp",
+                      width: int = 256, height: int = 288, staged: list = None):
+        """
+        Register a user with multiple fingerprint images.
 
         Args:
             email (str): user email
             name (str): user name
-            images (list[bytes]): list of BMP image bytes
+            images (list[bytes]): list of image payloads (BMP unless `codec` says otherwise)
+            codec (str): codec the payloads were encoded with, see encode_images
+            staged (list): stage ids of images already sent with stage_image
+        """
+        with span("client.register"):
+            response = self.post_registration(email, name, images, codec, width, height, staged)
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            print("Server error:", response.text)
+            return None
+
+    def post_registration(self, email: str, name: str, images: list[bytes], codec: str = "bmp",
+                          width: int = 256, height: int = 288, staged: list = None,
+                          idempotency_key: str = None):
+        """
+        Send a registration and return the raw response (see register_user).
+
+        With an `idempotency_key` the request is sent as an Idempotency-Key
+        header and treated as safe to retry, so the outbox can redeliver it.
         """
+        c = self.codecs[codec]
         # Prepare files list with correct field name 'files' and MIME type
         files = [
-            ('files', (f'fingerprint_{i+1}.bmp', img, 'image/bmp'))
+            ('files', (c.filename(i), img, c.mime))
             for i, img in enumerate(images)
         ]
 
         data = {
             "email": email,
-            "name": name
+            "name": name,
+            **self._codec_fields(codec, width, height),
         }
+        if staged:
+            data["staged"] = ",".join(staged)
 
-        response = requests.post(
-            f"{api_url}/auth/register-new-user",  # ✅ endpoint matches curl
+        return self._post(
+            self.base_url,
+            "/auth/register-new-user",  # ✅ endpoint matches curl
+            "register",
+            idempotency_key is not None,
             data=data,
             files=files,
-            headers={"accept": "application/json"}
+            headers={"Idempotency-Key": idempotency_key} if idempotency_key else None,
         )
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print("Server error:", response.text)
-            return None
-   
-   def check_fingerprint(self, image: bytes):
+    def check_fingerprint(self, image: bytes, codec: str = "bmp", width: int = 256, height: int = 288,
+                          candidates: list = None, top_k: int = None, max_distance: float = None,
+                          roi: dict = None):
+        """
+        Match one fingerprint against the enrolled users.
 
-    files = {
-        'file': ('fingerprint.bmp', image, 'image/bmp')  # ✅ نفس الفورم المطلوب
-    }
-    response = requests.post(
-        f"{api_url}/auth/match-finger-print",
-        files=files,
-        headers={"accept": "application/json"}  # ✅ مثل الـ curl
-    )
-    if response.status_code == 200:
-        return response.json()
-    else:
-      return None
+        `image` is BMP bytes unless `codec` names another encoding.
+        `candidates` (user emails from the local LSH shortlist) lets the
+        server run its matcher on those users only.
+        With `top_k` and/or `max_distance` (defaulting to the client's) the
+        answer is parsed as it streams in and only the closest matches are
+        kept, so memory does not grow with the size of the gallery;
+        "matching_total" then tells how many users the server reported.
+        Servers advertising "match_top_k" get the limits as form fields and
+        trim the answer themselves, which also keeps its size flat.
+        `roi` holds the form fields of a preprocessed image (see encode_image).
+        Matching does not change server state, so it is retried and hedged.
+        """
+        top_k = top_k if top_k is not None else self.top_k
+        max_distance = max_distance if max_distance is not None else self.max_distance
+        bounded = top_k is not None or max_distance is not None
+        with span("client.match"):
+            response = self.post_match(image, codec, width, height, candidates, hedged=True,
+                                       top_k=top_k, max_distance=max_distance, stream=bounded, roi=roi)
+            if response.status_code != 200:
+                response.close()
+                return None
+            if bounded:
+                parser = MatchStreamParser(top_k, max_distance)
+                with response:
+                    for chunk in response.iter_content(self.STREAM_CHUNK):
+                        parser.feed(chunk)
+                body = parser.close()
+                server_time = parser.top.matching_time
+            else:
+                body = response.json()
+                server_time = self.server_matching_time(body)
+        record_span("server.match", server_time)
+        return body
+
+    @staticmethod
+    def server_matching_time(body: dict) -> float:
+        """Server-side matcher time of a match answer: sum of the per-user matching_time."""
+        total = 0.0
+        for match in body.get("matching", []):
+            try:
+                total += float(match.get("matching_time", 0))
+            except (TypeError, ValueError):
+                pass
+        return total
+
+    def post_match(self, image: bytes, codec: str = "bmp", width: int = 256, height: int = 288,
+                   candidates: list = None, hedged: bool = False, idempotency_key: str = None,
+                   top_k: int = None, max_distance: float = None, stream: bool = False, roi: dict = None):
+        """Send a match request and return the raw response (see check_fingerprint)."""
+        c = self.codecs[codec]
+        files = {
+            'file': (c.filename(), image, c.mime)  # ✅ نفس الفورم المطلوب
+        }
+        data = self._codec_fields(codec, width, height)
+        if candidates:
+            data["candidates"] = ",".join(candidates)
+        if roi:
+            data.update(roi)
+        if (top_k is not None or max_distance is not None) and self.supports_top_k():
+            if top_k is not None:
+                data["top_k"] = str(top_k)
+            if max_distance is not None:
+                data["max_distance"] = str(max_distance)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        if hedged:
+            return self._post_hedged("/auth/match-finger-print", "match", files=files, data=data, headers=headers,
+                                     stream=stream)
+        return self._post(self.base_url, "/auth/match-finger-print", "match", True,
+                          files=files, data=data, headers=headers, stream=stream)
@@ -0,0 +1,400 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from imaging.blocks import block_orientation, block_view, box_mean
+from imaging.encoder import as_gray_array, IMAGE_X, IMAGE_Y
+from client.lsh_index import CandidateIndex, describe
+from metrics import record_span, span
+
+
+# ===== Image helpers =====
+def zhang_suen_thin(ridges: np.ndarray, max_iter: int = 30) -> np.ndarray:
+    """Vectorized Zhang-Suen thinning of a boolean ridge map."""
+    img = np.pad(ridges.astype(np.uint8), 1)
+    for _ in range(max_iter):
+        changed = False
+        for step in (0, 1):
+            p2 = img[:-2, 1:-1]
+            p3 = img[:-2, 2:]
+            p4 = img[1:-1, 2:]
+            p5 = img[2:, 2:]
+            p6 = img[2:, 1:-1]
+            p7 = img[2:, :-2]
+            p8 = img[1:-1, :-2]
+            p9 = img[:-2, :-2]
+            ring = (p2, p3, p4, p5, p6, p7, p8, p9, p2)
+            b = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            a = sum(((ring[i] == 0) & (ring[i + 1] == 1)).astype(np.uint8) for i in range(8))
+            if step == 0:
+                side = (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+            else:
+                side = (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+            remove = (img[1:-1, 1:-1] == 1) & (b >= 2) & (b <= 6) & (a == 1) & side
+            if remove.any():
+                img[1:-1, 1:-1][remove] = 0
+                changed = True
+        if not changed:
+            break
+    return img[1:-1, 1:-1].astype(bool)
+
+
+# ===== Template extraction =====
+class MinutiaeExtractor:
+    """Enhancement, binarization, thinning and crossing-number minutiae.
+
+    A template is a float32 array of rows (x, y, theta, kind) where theta is
+    the local ridge orientation in [0, pi) and kind is 1 for a ridge ending
+    and 3 for a bifurcation.
+    """
+
+    def __init__(self, block: int = 16, foreground_std: float = 12.0, window: int = 7,
+                 min_spacing: float = 8.0, max_minutiae: int = 40):
+        self.block = block
+        self.foreground_std = foreground_std
+        self.window = window
+        self.min_spacing = min_spacing
+        self.max_minutiae = max_minutiae
+
+    def _mask(self, a: np.ndarray) -> np.ndarray:
+        """Foreground block mask, eroded by one block to drop border minutiae."""
+        fg = block_view(a, self.block).std(axis=(2, 3)) > self.foreground_std
+        p = np.pad(fg, 1)
+        eroded = fg.copy()
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                eroded &= p[dy:dy + fg.shape[0], dx:dx + fg.shape[1]]
+        mask = np.zeros(a.shape, dtype=bool)
+        up = np.repeat(np.repeat(eroded, self.block, 0), self.block, 1)
+        mask[:up.shape[0], :up.shape[1]] = up
+        return mask
+
+    def _orientation(self, a: np.ndarray) -> np.ndarray:
+        """Block ridge orientation in [0, pi) from the gradient structure tensor."""
+        return block_orientation(a, self.block)
+
+    def extract(self, img, width: int = IMAGE_X, height: int = IMAGE_Y) -> np.ndarray:
+        a = as_gray_array(img, width, height).astype(np.float32)
+        mask = self._mask(a)
+        if not mask.any():
+            return np.zeros((0, 4), dtype=np.float32)
+
+        # Enhance: light smoothing, then local-mean binarization (ridges are dark)
+        smooth = box_mean(a, 1)
+        ridges = (smooth < box_mean(smooth, self.window)) & mask
+        skel = zhang_suen_thin(ridges)
+
+        # Crossing number over the 8-neighbourhood
+        s = np.pad(skel.astype(np.int8), 1)
+        ring = (s[:-2, 1:-1], s[:-2, 2:], s[1:-1, 2:], s[2:, 2:],
+                s[2:, 1:-1], s[2:, :-2], s[1:-1, :-2], s[:-2, :-2])
+        cn = sum(np.abs(ring[i] - ring[(i + 1) % 8]) for i in range(8)) // 2
+        minutiae = skel & ((cn == 1) | (cn == 3)) & mask
+        ys, xs = np.nonzero(minutiae)
+        if xs.size == 0:
+            return np.zeros((0, 4), dtype=np.float32)
+        kinds = cn[ys, xs].astype(np.float32)
+
+        # Drop clustered points (usually breaks and spurs of the skeleton)
+        pts = np.stack([xs, ys], axis=1).astype(np.float32)
+        d = np.hypot(pts[:, None, 0] - pts[None, :, 0], pts[:, None, 1] - pts[None, :, 1])
+        np.fill_diagonal(d, np.inf)
+        keep = d.min(axis=1) >= self.min_spacing
+        pts, kinds = pts[keep], kinds[keep]
+
+        # Keep the points closest to the core (most stable across placements)
+        if len(pts) > self.max_minutiae:
+            centre = pts.mean(axis=0)
+            order = np.argsort(((pts - centre) ** 2).sum(axis=1))[:self.max_minutiae]
+            pts, kinds = pts[order], kinds[order]
+
+        theta = self._orientation(a)
+        bi = np.minimum(pts[:, 1].astype(int) // self.block, theta.shape[0] - 1)
+        bj = np.minimum(pts[:, 0].astype(int) // self.block, theta.shape[1] - 1)
+        return np.column_stack([pts, theta[bi, bj], kinds]).astype(np.float32)
+
+
+def pack_template(t: np.ndarray) -> bytes:
+    """Compact 6-byte-per-minutia encoding: x, y (uint16), angle/256 and kind (uint8)."""
+    rec = np.zeros(len(t), dtype=[("x", "<u2"), ("y", "<u2"), ("a", "u1"), ("k", "u1")])
+    rec["x"], rec["y"] = t[:, 0], t[:, 1]
+    rec["a"] = np.round(t[:, 2] / np.pi * 256).astype(int) % 256
+    rec["k"] = t[:, 3]
+    return rec.tobytes()
+
+
+def unpack_template(blob: bytes) -> np.ndarray:
+    rec = np.frombuffer(blob, dtype=[("x", "<u2"), ("y", "<u2"), ("a", "u1"), ("k", "u1")])
+    return np.column_stack([rec["x"], rec["y"], rec["a"] * (np.pi / 256), rec["k"]]).astype(np.float32)
+
+
+# ===== Matching =====
+class MinutiaeMatcher:
+    """Vectorized Hough-alignment minutiae matcher over a batch of templates.
+
+    For every (probe, gallery) minutia pair the rotation and translation that
+    would map one onto the other casts a vote; the densest bin per template
+    gives the alignment, then paired minutiae within distance/angle
+    tolerance are counted. Score = paired^2 / (n_probe * n_gallery), in [0, 1].
+    """
+
+    def __init__(self, dist_tol: float = 12.0, angle_tol: float = np.pi / 12,
+                 max_rotation: float = np.pi / 4, rot_bins: int = 8, shift_bin: float = 16.0,
+                 max_shift: float = 256.0, batch: int = 32):
+        self.dist_tol = dist_tol
+        self.angle_tol = angle_tol
+        self.max_rotation = max_rotation
+        self.rot_bins = rot_bins
+        self.shift_bin = shift_bin
+        self.max_shift = max_shift
+        self.shift_bins = int(np.ceil(2 * max_shift / shift_bin))
+        self.batch = batch
+
+    def _score_batch(self, probe: np.ndarray, pts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        # Trig is only evaluated per minutia; pair-wise rotations come from
+        # angle-addition identities, so the (T, n, M) arrays see no sin/cos.
+        T = pts.shape[0]
+        px, py, pt = probe[:, 0], probe[:, 1], probe[:, 2]
+        pc, ps = np.cos(pt)[None, :, None], np.sin(pt)[None, :, None]
+        gx, gy, gt = pts[:, None, :, 0], pts[:, None, :, 1], pts[:, None, :, 2]
+        gc, gs = np.cos(gt), np.sin(gt)
+        # cos/sin of the rotation gallery - probe, folded to |rot| <= pi/2
+        # (orientations are only defined modulo pi)
+        c = gc * pc + gs * ps
+        s = gs * pc - gc * ps
+        flip = np.where(c < 0, np.float32(-1), np.float32(1))
+        c *= flip
+        s *= flip
+        pxx, pyy = px[None, :, None], py[None, :, None]
+        tx = gx - (c * pxx - s * pyy)
+        ty = gy - (s * pxx + c * pyy)
+
+        smax = np.float32(np.sin(self.max_rotation))
+        ok = valid[:, None, :] & (np.abs(s) <= smax) \
+            & (np.abs(tx) < self.max_shift) & (np.abs(ty) < self.max_shift)
+        rb = np.clip(((s + smax) * (self.rot_bins / (2 * smax))).astype(np.int64), 0, self.rot_bins - 1)
+        xb = np.clip(((tx + self.max_shift) * (1 / self.shift_bin)).astype(np.int64), 0, self.shift_bins - 1)
+        yb = np.clip(((ty + self.max_shift) * (1 / self.shift_bin)).astype(np.int64), 0, self.shift_bins - 1)
+        nbins = self.rot_bins * self.shift_bins * self.shift_bins
+        vote = (rb * self.shift_bins + xb) * self.shift_bins + yb
+        flat = (np.arange(T)[:, None, None] * nbins + vote)[ok]
+        counts = np.bincount(flat, minlength=T * nbins).reshape(T, nbins)
+        best = counts.argmax(axis=1)
+
+        # Refine the alignment as the mean of the votes in the winning bin
+        sel = ok & (vote == best[:, None, None])
+        n_sel = np.maximum(sel.sum(axis=(1, 2)), 1)
+        r = np.arctan2((s * sel).sum(axis=(1, 2)), (c * sel).sum(axis=(1, 2)))
+        mx = (tx * sel).sum(axis=(1, 2)) / n_sel
+        my = (ty * sel).sum(axis=(1, 2)) / n_sel
+
+        rc, rs = np.cos(r)[:, None], np.sin(r)[:, None]
+        ax = (rc * px[None, :] - rs * py[None, :] + mx[:, None])[:, :, None]
+        ay = (rs * px[None, :] + rc * py[None, :] + my[:, None])[:, :, None]
+        close = (ax - gx) ** 2 + (ay - gy) ** 2 < self.dist_tol ** 2
+        # |angle difference mod pi| < tol  <=>  cos(2 * difference) > cos(2 * tol)
+        a2 = 2 * (pt[None, :] + r[:, None])
+        pc2, ps2 = np.cos(a2)[:, :, None], np.sin(a2)[:, :, None]
+        aligned = pc2 * np.cos(2 * gt) + ps2 * np.sin(2 * gt) > np.cos(2 * self.angle_tol)
+        paired = close & aligned & valid[:, None, :]
+        matched = np.minimum(paired.any(axis=2).sum(axis=1), paired.any(axis=1).sum(axis=1))
+        n_gallery = np.maximum(valid.sum(axis=1), 1)
+        return (matched ** 2) / (len(probe) * n_gallery)
+
+    def score(self, probe: np.ndarray, pts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """Scores of a probe template against padded gallery arrays (T, M, 3)."""
+        if len(probe) == 0 or len(pts) == 0:
+            return np.zeros(len(pts))
+        probe = probe.astype(np.float32, copy=False)
+        out = np.empty(len(pts))
+        for i in range(0, len(pts), self.batch):
+            out[i:i + self.batch] = self._score_batch(probe, pts[i:i + self.batch], valid[i:i + self.batch])
+        return out
+
+
+# ===== Local gallery =====
+class LocalGallery:
+    """Enrolled templates cached on disk, stacked into padded arrays for matching."""
+
+    def __init__(self, path: str = "fingerprint/gallery.npz", max_minutiae: int = 40):
+        self.path = path
+        self.max_minutiae = max_minutiae
+        self.users = []        # dicts with at least name/email
+        self.templates = []    # list of (user index, template array)
+        self._stack = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time, newest snapshot last
+        if path and os.path.isfile(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def add(self, user: dict, templates: list):
+        with self._lock:
+            key = user.get("email")
+            idx = next((i for i, u in enumerate(self.users) if key and u.get("email") == key), None)
+            if idx is None:
+                idx = len(self.users)
+                self.users.append(dict(user))
+            self.templates.extend((idx, t[:self.max_minutiae, :3]) for t in templates)
+            self._stack = None
+
+    def stacked(self):
+        """(points (T, M, 3), valid (T, M), user index (T,)) rebuilt lazily."""
+        with self._lock:
+            if self._stack is None:
+                T, M = len(self.templates), self.max_minutiae
+                pts = np.zeros((T, M, 3), dtype=np.float32)
+                valid = np.zeros((T, M), dtype=bool)
+                owner = np.zeros(T, dtype=np.int64)
+                for i, (u, t) in enumerate(self.templates):
+                    pts[i, :len(t)] = t
+                    valid[i, :len(t)] = True
+                    owner[i] = u
+                self._stack = (pts, valid, owner)
+            return self._stack
+
+    def owners_of(self, keys) -> np.ndarray:
+        """Indices of the users whose email is in keys."""
+        keys = set(keys)
+        return np.array([i for i, u in enumerate(self.users) if u.get("email") in keys], dtype=np.int64)
+
+    def save(self):
+        """Write a consistent snapshot atomically (unique temp file, then rename)."""
+        with self._save_lock:
+            pts, valid, owner = self.stacked()
+            with self._lock:
+                users = json.dumps(self.users)
+            folder = os.path.dirname(self.path) or "."
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=folder, prefix=".gallery-", suffix=".npz")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez_compressed(f, pts=pts, valid=valid, owner=owner, users=users)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def load(self):
+        with np.load(self.path) as data:
+            pts, valid, owner = data["pts"], data["valid"], data["owner"]
+            users = json.loads(str(data["users"]))
+        with self._lock:
+            self.users = users
+            self.templates = [(int(owner[i]), pts[i][valid[i]]) for i in range(len(owner))]
+            self._stack = None
+
+
+class EdgeVerifier:
+    """Answer verifications locally and fall back to the server when unsure.
+
+    A local answer is used when the best user's score is at least
+    `accept_score` and beats the runner-up by `margin`; otherwise, or when
+    fewer than two users were scored (no runner-up to measure the margin
+    against), the server is asked. If the server is
+    unreachable the local result is returned anyway, flagged "ambiguous".
+    Scores are reported as distance = 100 * (1 - score), so the GUI's
+    "distance < 50 is a match" rule holds for both sources.
+
+    Once more than `prefilter_min_users` users are enrolled, the
+    candidate index shortlists `shortlist_k` users first; only their
+    templates are matched locally and the shortlist is passed on to the
+    server call.
+    """
+
+    def __init__(self, gallery: LocalGallery = None, extractor: MinutiaeExtractor = None,
+                 matcher: MinutiaeMatcher = None, index: CandidateIndex = None,
+                 accept_score: float = 0.5, margin: float = 0.15, top: int = 10,
+                 shortlist_k: int = 50, prefilter_min_users: int = 200):
+        self.gallery = gallery if gallery is not None else LocalGallery()
+        self.extractor = extractor or MinutiaeExtractor()
+        self.matcher = matcher or MinutiaeMatcher()
+        self.index = index if index is not None else CandidateIndex(path="fingerprint/candidates.npz")
+        self.accept_score = accept_score
+        self.margin = margin
+        self.top = top
+        self.shortlist_k = shortlist_k
+        self.prefilter_min_users = prefilter_min_users
+
+    def extract(self, img) -> np.ndarray:
+        with span("edge.extract"):
+            return self.extractor.extract(img)
+
+    def enroll(self, user: dict, images: list):
+        """Add a registered user's captures to the local gallery and index, and persist both."""
+        self.enroll_templates(user, [self.extract(img) for img in images])
+
+    def enroll_templates(self, user: dict, templates: list):
+        """Like enroll, with templates already extracted (e.g. by EnrollmentSession)."""
+        self.gallery.add(user, templates)
+        self.index.add(user.get("email"), [describe(t) for t in templates])
+        if self.gallery.path:
+            self.gallery.save()
+        if self.index.path:
+            self.index.save()
+
+    def shortlist(self, template: np.ndarray) -> list:
+        """Candidate user keys (emails) for a probe, or None when the gallery is small."""
+        if len(self.index) < self.prefilter_min_users:
+            return None
+        return [key for key, _ in self.index.query(describe(template), self.shortlist_k)]
+
+    def match_local(self, template: np.ndarray, candidates: list = None) -> list:
+        """Best score per scored user (all, or the shortlisted ones), highest first, as match dicts."""
+        if not len(self.gallery):
+            return []
+        pts, valid, owner = self.gallery.stacked()
+        if candidates is not None:
+            sel = np.isin(owner, self.gallery.owners_of(candidates))
+            pts, valid, owner = pts[sel], valid[sel], owner[sel]
+            if not len(owner):
+                return []
+        t0 = time.perf_counter()
+        scores = self.matcher.score(template[:, :3], pts, valid)
+        per_user = np.zeros(len(self.gallery.users))
+        np.maximum.at(per_user, owner, scores)
+        elapsed = time.perf_counter() - t0
+        record_span("edge.match", elapsed)
+        # Rank only users that were scored; the others are unknown, not a score of 0
+        scored = np.unique(owner)
+        order = scored[np.argsort(-per_user[scored], kind="stable")][:self.top]
+        return [{
+            "user": self.gallery.users[i],
+            "distance": float(100.0 * (1.0 - per_user[i])),
+            "score": float(per_user[i]),
+            "matching_time": elapsed,
+        } for i in order]
+
+    def verify(self, template: np.ndarray, server_call) -> dict:
+        """Return a response shaped like /auth/match-finger-print plus "source".
+
+        server_call(candidates) asks the server; candidates is the
+        shortlist or None.
+        """
+        candidates = self.shortlist(template)
+        matches = self.match_local(template, candidates)
+        best = matches[0]["score"] if matches else 0.0
+        second = matches[1]["score"] if len(matches) > 1 else 0.0
+        local = {
+            "matching": matches,
+            "best_match": matches[0] if best >= self.accept_score else None,
+            "source": "edge",
+        }
+        if len(matches) >= 2 and best >= self.accept_score and best - second >= self.margin:
+            return local
+        import requests     # only needed once the server is asked
+        try:
+            response = server_call(candidates)
+        except requests.exceptions.RequestException:
+            response = None
+        if response is None:
+            if not matches:
+                return None
+            local["ambiguous"] = True
+            return local
+        response["source"] = "server"
+        return response
@@ -0,0 +1,198 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from client.edge import pack_template
+from imaging.duplicates import DuplicateDetector
+from metrics import LatencyHistogram
+
+
+class DuplicateCapture(RuntimeError):
+    """Raised by EnrollmentSession.add when a capture repeats one already added."""
+
+    def __init__(self, check):
+        super().__init__(f"Near-duplicate of capture {check.index + 1} (similarity {check.score:.2f}); "
+                         f"shift or roll the finger a little and capture again")
+        self.check = check
+
+
+class PreparedCapture:
+    """One enrollment capture after the downstream stages have run."""
+
+    __slots__ = ("payload", "template", "stage_id")
+
+    def __init__(self, payload: bytes, template=None, stage_id: str = None):
+        self.payload = payload
+        self.template = template
+        self.stage_id = stage_id
+
+
+class EnrollmentSession:
+    """Streams one user's enrollment captures through encode, template and upload.
+
+    add() hands each accepted capture to a small pool, which encodes it with
+    the negotiated codec, extracts the local edge template and, when the
+    server advertises "enrollment_staging", uploads it right away. All of
+    that overlaps the next finger placement, so finish() only waits for the
+    last capture and sends a small register request.
+
+    Before that, every capture is checked against the ones already added
+    (a few ms, see DuplicateDetector): a near-identical placement adds
+    nothing to the template set but upload and storage, so it is dropped
+    with DuplicateCapture, or only counted in `flagged` when
+    `drop_duplicates` is off.
+
+    Args:
+        client: Client used for codec negotiation, staging and registration.
+        edge: EdgeVerifier to extract templates for (None skips it).
+        workers: pool threads; two is enough to keep up with one sensor.
+        stage_uploads: force staging on or off; None asks the server.
+        duplicates: DuplicateDetector to use, True for the default one,
+            False to accept every capture.
+        drop_duplicates: reject near-duplicates instead of flagging them.
+    """
+
+    def __init__(self, client, edge=None, workers: int = 2, stage_uploads: bool = None,
+                 duplicates=True, drop_duplicates: bool = True):
+        self.client = client
+        self.edge = edge
+        self.stage_uploads = stage_uploads
+        if duplicates is True:
+            duplicates = DuplicateDetector()
+        # An empty detector has len() 0, so test for the off values explicitly
+        self.duplicates = None if duplicates is False else duplicates
+        self.drop_duplicates = drop_duplicates
+        self.flagged = 0
+        self._add_lock = threading.Lock()   # one check-and-keep at a time
+        self.codec = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enroll")
+        self._items = []            # futures of PreparedCapture, in capture order
+        self._lock = threading.Lock()
+        self.prepare_hist = LatencyHistogram("enroll_prepare")
+        self.finish_hist = LatencyHistogram("enroll_finish")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def add(self, img, width: int = 256, height: int = 288):
+        """Queue a capture (Frame, bytes or array). A Frame is released once encoded.
+
+        Raises DuplicateCapture for a near-duplicate. The frame is released
+        whenever add raises, since it then never reaches the encoder.
+        """
+        with self._add_lock:
+            try:
+                if self.duplicates is not None:
+                    check = self.duplicates.check(img)
+                    if check.duplicate:
+                        if self.drop_duplicates:
+                            raise DuplicateCapture(check)
+                        self.flagged += 1
+                future = self._pool.submit(self._prepare, img, width, height)
+            except BaseException:
+                release = getattr(img, "release", None)
+                if release is not None:
+                    release()
+                raise
+            with self._lock:
+                # Kept descriptors change only under self._lock, in step with _items
+                if self.duplicates is not None:
+                    self.duplicates.keep(check)
+                self._items.append(future)
+        return future
+
+    def _consumed(self, n: int):
+        # Called with self._lock held: the first n captures left the session
+        del self._items[:n]
+        if self.duplicates is not None:
+            self.duplicates.forget_first(n)
+
+    def _prepare(self, img, width: int, height: int) -> PreparedCapture:
+        t0 = time.perf_counter()
+        if self.codec is None:
+            # Probe outside self._lock (the client caches the answer), so a slow
+            # server never blocks add() or pending() on the UI thread
+            codec = self.client.upload_codec().name
+            staging = self.client.supports_staging() if self.stage_uploads is None else self.stage_uploads
+            with self._lock:
+                if self.codec is None:
+                    self.codec, self.stage_uploads = codec, staging
+        try:
+            payload = self.client.codecs[self.codec].encode(img)
+            template = self.edge.extract(img) if self.edge is not None else None
+        finally:
+            release = getattr(img, "release", None)
+            if release is not None:
+                release()
+        stage_id = None
+        if self.stage_uploads:
+            try:
+                stage_id = self.client.stage_image(payload, self.codec, width, height)
+            except Exception:
+                stage_id = None  # sent with the register call instead
+        self.prepare_hist.record(time.perf_counter() - t0)
+        return PreparedCapture(payload, template, stage_id)
+
+    def pending(self) -> int:
+        """Captures whose stages are still running."""
+        with self._lock:
+            return sum(1 for f in self._items if not f.done())
+
+    def finish(self, email: str, name: str, width: int = 256, height: int = 288):
+        """Register the user with every capture added so far.
+
+        Staged captures are referenced by id, the rest are uploaded inline.
+        On success the consumed captures leave the session and their
+        templates go to the edge gallery. Returns (response, captures used).
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            items = list(self._items)
+        wait(items)
+        prepared = [f.result() for f in items]
+        staged = [p.stage_id for p in prepared if p.stage_id]
+        inline = [p.payload for p in prepared if not p.stage_id]
+        response = self.client.register_user(email, name, inline, self.codec or "bmp",
+                                             width, height, staged=staged)
+        if response and response.get("user"):
+            with self._lock:
+                self._consumed(len(items))
+            if self.edge is not None:
+                self.edge.enroll_templates({"name": name, "email": email, **response["user"]},
+                                           [p.template for p in prepared])
+        self.finish_hist.record(time.perf_counter() - t0)
+        return response, len(items)
+
+    def queue(self, outbox, email: str, name: str, width: int = 256, height: int = 288):
+        """Commit the registration to an Outbox instead of sending it now.
+
+        Returns (outbox key, captures used). The captures leave the session
+        at once; templates travel with the item and are handed back when
+        the outbox delivers it.
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            items = list(self._items)
+        wait(items)
+        prepared = [f.result() for f in items]
+        key = outbox.put_registration(
+            email, name, [p.payload for p in prepared if not p.stage_id], self.codec or "bmp", width, height,
+            staged=[p.stage_id for p in prepared if p.stage_id],
+            templates=[pack_template(p.template) for p in prepared if p.template is not None],
+        )
+        with self._lock:
+            self._consumed(len(items))
+        self.finish_hist.record(time.perf_counter() - t0)
+        return key, len(items)
+
+    def clear(self):
+        with self._lock:
+            items, self._items = self._items, []
+            if self.duplicates is not None:
+                self.duplicates.clear()
+        for f in items:
+            f.cancel()
+
+    def close(self):
+        self.clear()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import numpy as np
+
+# Pair-histogram layout: distance bins x relative-orientation bins x same/different kind
+DIST_BINS, ANGLE_BINS, KIND_BINS = 24, 8, 2
+MAX_PAIR_DIST = 300.0
+DESCRIPTOR_DIM = DIST_BINS * ANGLE_BINS * KIND_BINS
+
+
+def _pair_histogram(t: np.ndarray) -> np.ndarray:
+    """Soft-binned histogram of minutia pairs (bilinear in distance and angle)."""
+    n = len(t)
+    if n < 2:
+        return np.zeros(DESCRIPTOR_DIM, dtype=np.float32)
+    i, j = np.triu_indices(n, 1)
+    d = np.hypot(t[i, 0] - t[j, 0], t[i, 1] - t[j, 1])
+    keep = d < MAX_PAIR_DIST
+    i, j, d = i[keep], j[keep], d[keep]
+    da = np.abs(t[i, 2] - t[j, 2]) % np.pi
+    da = np.minimum(da, np.pi - da)  # relative orientation in [0, pi/2]
+    same = (t[i, 3] == t[j, 3]).astype(np.int64)
+
+    fd = d / MAX_PAIR_DIST * DIST_BINS - 0.5
+    d0 = np.floor(fd).astype(np.int64)
+    wd = fd - d0
+    fa = da / (np.pi / 2) * ANGLE_BINS - 0.5
+    a0 = np.floor(fa).astype(np.int64)
+    wa = fa - a0
+    h = np.zeros(DESCRIPTOR_DIM, dtype=np.float64)
+    for db, w1 in ((d0, 1 - wd), (d0 + 1, wd)):
+        for ab, w2 in ((a0, 1 - wa), (a0 + 1, wa)):
+            ok = (db >= 0) & (db < DIST_BINS)
+            idx = (db * ANGLE_BINS + np.clip(ab, 0, ANGLE_BINS - 1)) * KIND_BINS + same
+            h += np.bincount(idx[ok], weights=(w1 * w2)[ok], minlength=DESCRIPTOR_DIM)
+    return h.astype(np.float32)
+
+
+def _prior_mean() -> np.ndarray:
+    """Expected histogram of uniformly scattered minutiae, used for centring."""
+    rng = np.random.default_rng(0)
+    acc = np.zeros(DESCRIPTOR_DIM, dtype=np.float64)
+    for _ in range(64):
+        t = np.column_stack([rng.uniform(30, 226, 40), rng.uniform(30, 258, 40),
+                             rng.uniform(0, np.pi, 40), rng.choice([1.0, 3.0], 40)])
+        h = np.sqrt(_pair_histogram(t))
+        acc += h / max(np.linalg.norm(h), 1e-6)
+    return (acc / 64).astype(np.float32)
+
+
+_PRIOR = None
+
+
+def describe(template: np.ndarray) -> np.ndarray:
+    """Fixed-length, pose-invariant descriptor of a minutiae template.
+
+    A histogram of minutia pairs by distance, relative orientation and
+    kind does not change when the finger is shifted or rotated on the
+    sensor. It is square-rooted, unit-normalized and centred on the
+    histogram of random minutiae, so cosine similarity (and SimHash) works.
+    """
+    global _PRIOR
+    if _PRIOR is None:
+        _PRIOR = _prior_mean()
+    h = np.sqrt(_pair_histogram(template))
+    h /= max(float(np.linalg.norm(h)), 1e-6)
+    h -= _PRIOR
+    h /= max(float(np.linalg.norm(h)), 1e-6)
+    return h
+
+
+class CandidateIndex:
+    """Random-hyperplane (SimHash) LSH index over per-user descriptors.
+
+    Every user is stored once, as the normalized mean of their enrolled
+    descriptors (averaging captures removes much of the placement noise).
+    The centroid is hashed into `tables` buckets of `bits` bits. A query
+    probes its own bucket plus every bucket one bit away in each table,
+    then re-ranks the union by exact cosine similarity and returns the best
+    `k` users.
+
+    The pair-histogram descriptor is noisy enough that the buckets only
+    reach ~0.9 recall@50 while touching ~30% of the users, and a plain
+    matrix-vector scan beats them on time as well as recall at every
+    gallery size measured (up to 100k users). `query` therefore scans
+    exactly up to `exact_scan_max` users and only probes the buckets
+    beyond that (see bench.lsh_recall).
+    """
+
+    EXACT_SCAN_MAX = 100000
+
+    def __init__(self, tables: int = 16, bits: int = 9, seed: int = 0, path: str = None,
+                 exact_scan_max: int = EXACT_SCAN_MAX):
+        self.tables = tables
+        self.bits = bits
+        self.exact_scan_max = exact_scan_max
+        self.path = path
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, bits, DESCRIPTOR_DIM)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.int64)
+        self.keys = []          # user key per row
+        self._key_index = {}
+        self._sum = np.zeros((0, DESCRIPTOR_DIM), dtype=np.float32)
+        self._count = np.zeros(0, dtype=np.int64)
+        self._centroid = np.zeros((0, DESCRIPTOR_DIM), dtype=np.float32)
+        self._codes_of = np.zeros((0, tables), dtype=np.int64)
+        self._buckets = [dict() for _ in range(tables)]
+        self._lock = threading.Lock()
+        self.last_scanned = 0   # users re-ranked by the last query
+        if path and os.path.isfile(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _codes(self, desc: np.ndarray) -> np.ndarray:
+        """(N, tables) integer bucket codes."""
+        bits = np.einsum("tbd,nd->ntb", self.planes, desc) > 0
+        return bits.astype(np.int64) @ self._weights
+
+    def _grow(self, n: int):
+        if n > len(self._sum):
+            cap = max(2 * len(self._sum), n, 64)
+            self._sum = np.resize(self._sum, (cap, DESCRIPTOR_DIM))
+            self._count = np.resize(self._count, cap)
+            self._centroid = np.resize(self._centroid, (cap, DESCRIPTOR_DIM))
+            self._codes_of = np.resize(self._codes_of, (cap, self.tables))
+
+    def add(self, key: str, descriptors: list, count: int = None):
+        """Fold descriptors into the user's centroid (re-hashing it)."""
+        descriptors = np.asarray(descriptors, dtype=np.float32).reshape(-1, DESCRIPTOR_DIM)
+        if not len(descriptors):
+            return
+        with self._lock:
+            row = self._key_index.get(key)
+            if row is None:
+                row = self._key_index[key] = len(self.keys)
+                self.keys.append(key)
+                self._grow(len(self.keys))
+                self._sum[row] = 0
+                self._count[row] = 0
+            else:
+                for table, code in enumerate(self._codes_of[row]):
+                    self._buckets[table][int(code)].remove(row)
+            self._sum[row] += descriptors.sum(axis=0)
+            self._count[row] += count if count is not None else len(descriptors)
+            c = self._sum[row] / max(float(np.linalg.norm(self._sum[row])), 1e-6)
+            self._centroid[row] = c
+            codes = self._codes(c[None, :])[0]
+            self._codes_of[row] = codes
+            for table, code in enumerate(codes):
+                self._buckets[table].setdefault(int(code), []).append(row)
+
+    def _rank(self, desc: np.ndarray, rows: np.ndarray, k: int) -> list:
+        sims = self._centroid[rows] @ desc
+        return self._top(sims, rows, k)
+
+    def _top(self, sims: np.ndarray, rows: np.ndarray, k: int) -> list:
+        top = np.argpartition(-sims, k)[:k] if len(sims) > k else np.arange(len(sims))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(self.keys[rows[i]], float(sims[i])) for i in top]
+
+    def query(self, desc: np.ndarray, k: int = 20) -> list:
+        """Top-k (user key, cosine similarity) candidates: exact scan, or LSH for large galleries."""
+        if len(self.keys) <= self.exact_scan_max:
+            return self.linear_query(desc, k)
+        return self.lsh_query(desc, k)
+
+    def lsh_query(self, desc: np.ndarray, k: int = 20) -> list:
+        """Top-k (user key, cosine similarity) candidates from the LSH buckets."""
+        desc = np.asarray(desc, dtype=np.float32)
+        with self._lock:
+            if not self.keys:
+                return []
+            codes = self._codes(desc[None, :])[0]
+            found = []
+            for table, code in enumerate(codes):
+                buckets = self._buckets[table]
+                code = int(code)
+                for probe in [code] + [code ^ (1 << b) for b in range(self.bits)]:
+                    rows = buckets.get(probe)
+                    if rows:
+                        found.append(rows)
+            if not found:
+                return []
+            rows = np.unique(np.concatenate([np.asarray(r, dtype=np.int64) for r in found]))
+            self.last_scanned = len(rows)
+            return self._rank(desc, rows, k)
+
+    def linear_query(self, desc: np.ndarray, k: int = 20) -> list:
+        """Exact top-k by scanning every user's centroid."""
+        with self._lock:
+            n = len(self.keys)
+            self.last_scanned = n
+            sims = self._centroid[:n] @ np.asarray(desc, dtype=np.float32)
+            return self._top(sims, np.arange(n), k)
+
+    def save(self):
+        with self._lock:
+            n = len(self.keys)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp.npz"
+            np.savez_compressed(tmp, sum=self._sum[:n], count=self._count[:n], keys=json.dumps(self.keys))
+            os.replace(tmp, self.path)
+
+    def load(self):
+        with np.load(self.path) as data:
+            sums, counts = data["sum"], data["count"]
+            keys = json.loads(str(data["keys"]))
+        for key, s, c in zip(keys, sums, counts):
+            self.add(key, s[None, :], int(c))
@@ -0,0 +1,166 @@
+import codecs
+import heapq
+import json
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+_WS_COMMA = _WS + ","
+_NUMBER_END = tuple(_WS_COMMA + "}]")
+
+
+class TopKMatches:
+    """Keeps the k closest entries of a match answer's "matching" list.
+
+    Entries farther than `max_distance` are dropped at once; the rest go
+    through a bounded max-heap on distance, so memory is O(k) however many
+    users the server compared against.
+    """
+
+    def __init__(self, k: int = None, max_distance: float = None):
+        self.k = k
+        self.max_distance = max_distance
+        self.seen = 0
+        self.matching_time = 0.0     # summed over every entry, kept or not
+        self._heap = []              # max-heap on distance: (-distance, -seq, match)
+
+    def push(self, match: dict):
+        self.seen += 1
+        try:
+            self.matching_time += float(match.get("matching_time", 0))
+        except (TypeError, ValueError):
+            pass
+        try:
+            distance = float(match.get("distance"))
+        except (TypeError, ValueError):
+            return
+        if self.max_distance is not None and distance > self.max_distance:
+            return
+        item = (-distance, -self.seen, match)  # on equal distance the earlier entry wins
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def result(self) -> list:
+        """Kept entries, closest first."""
+        return [m for _, _, m in sorted(self._heap, key=lambda i: (-i[0], -i[1]))]
+
+
+class MatchStreamParser:
+    """Incremental parser for the /auth/match-finger-print JSON body.
+
+    feed() accepts the body in arbitrary chunks. Elements of the top-level
+    "matching" array are decoded one at a time and handed to a TopKMatches,
+    so the full list is never materialised; every other top-level value is
+    decoded as usual. close() returns the body with "matching" replaced by
+    the kept entries and "matching_total" set to the number received.
+    """
+
+    def __init__(self, k: int = None, max_distance: float = None):
+        self.top = TopKMatches(k, max_distance)
+        self.body = {}
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"        # start, key, colon, value, array, next, end
+        self._key = None
+
+    def feed(self, chunk):
+        if isinstance(chunk, bytes):
+            chunk = self._text.decode(chunk)
+        # Drop what is already parsed so the buffer holds about one element
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        while self._state != "end" and self._step():
+            pass
+
+    def _skip(self) -> bool:
+        """Skip whitespace; False if the buffer ran out."""
+        buf, pos, n = self._buf, self._pos, len(self._buf)
+        while pos < n and buf[pos] in _WS:
+            pos += 1
+        self._pos = pos
+        return pos < n
+
+    def _take(self, chars: str) -> str:
+        c = self._buf[self._pos]
+        if c not in chars:
+            raise ValueError(f"Unexpected {c!r} in match answer")
+        self._pos += 1
+        return c
+
+    def _decode(self):
+        """(value, True) for the JSON value at the cursor, (None, False) if it is not complete yet."""
+        try:
+            value, end = _DECODER.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            return None, False
+        if self._buf[self._pos] in "-0123456789" and self._buf[end:end + 1] not in _NUMBER_END:
+            return None, False       # "-12" may be the start of "-12.5" in the next chunk
+        self._pos = end
+        return value, True
+
+    def _step(self) -> bool:
+        """Advance one token (or a run of array elements); False when more input is needed."""
+        if not self._skip():
+            return False
+        state = self._state
+        if state == "start":
+            self._take("{")
+            self._state = "key"
+        elif state == "key":
+            if self._buf[self._pos] == "}":
+                self._pos += 1
+                self._state = "end"
+                return True
+            self._key, ok = self._decode()
+            if not ok:
+                return False
+            self._state = "colon"
+        elif state == "colon":
+            self._take(":")
+            self._state = "value"
+        elif state == "value":
+            if self._key == "matching" and self._buf[self._pos] == "[":
+                self._pos += 1
+                self._state = "array"
+            else:
+                value, ok = self._decode()
+                if not ok:
+                    return False
+                self.body[self._key] = value
+                self._state = "next"
+        elif state == "array":
+            return self._array()
+        elif state == "next":
+            self._state = "key" if self._take(",}") == "," else "end"
+        return True
+
+    def _array(self) -> bool:
+        """Decode "matching" elements until the buffer runs out or the array ends."""
+        buf, push, n = self._buf, self.top.push, len(self._buf)
+        pos = self._pos
+        while True:
+            while pos < n and buf[pos] in _WS_COMMA:
+                pos += 1
+            if pos >= n:
+                self._pos = pos
+                return False
+            if buf[pos] == "]":
+                self._pos = pos + 1
+                self._state = "next"
+                return True
+            try:
+                value, pos = _DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                self._pos = pos
+                return False
+            push(value)
+
+    def close(self) -> dict:
+        if self._state != "end":
+            raise ValueError("Truncated match answer")
+        body = self.body
+        body["matching"] = self.top.result()
+        body["matching_total"] = self.top.seen
+        return body
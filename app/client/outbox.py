@@ -0,0 +1,318 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from metrics import LatencyHistogram
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_due ON items (state, next_try);
+CREATE TABLE IF NOT EXISTS parts (
+    item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (item_id, role, idx)
+);
+"""
+
+
+class OutboxItem:
+    """One queued request as read back from the outbox."""
+
+    def __init__(self, id: int, key: str, kind: str, meta: dict, attempts: int, parts: dict):
+        self.id = id
+        self.key = key
+        self.kind = kind
+        self.meta = meta
+        self.attempts = attempts
+        self.parts = parts          # role -> list of blobs, in order
+
+
+class Outbox:
+    """Durable store-and-forward queue for registrations and verifications.
+
+    put_registration / put_verification commit the encoded payloads to a
+    SQLite database in WAL mode and return at once, so the operator only
+    waits for a local write. A flusher thread sends due items in batches
+    of `batch`, each with its own Idempotency-Key so a redelivery after a
+    lost answer can be recognised by the server.
+
+    Failures are handled per item:
+        - connection errors, timeouts, 408/429 and 5xx are retried with
+          full-jitter exponential backoff (capped at `max_backoff`); the
+          whole queue pauses for the shortest such backoff, so a down or
+          overloaded server sees one batch at a time, not the backlog;
+        - other 4xx answers, and a 200 registration answer without a
+          "user", are permanent: the item is kept with state "failed" and
+          on_failed(item, message) is called. Only the newest `max_failed`
+          of them are kept; retry_failed() queues them again and
+          purge_failed() drops them.
+
+    Delivered items are deleted and on_delivered(item, json) is called on
+    the flusher thread. Errors of the flusher itself (database, callbacks)
+    go to on_error(exception), or are printed without one. Producers block
+    when `max_pending` items are queued (backpressure) and get RuntimeError
+    after `put_timeout` seconds.
+    """
+
+    RETRY_STATUS = (408, 429)
+
+    def __init__(self, client, path: str = "fingerprint/outbox.db", batch: int = 8, senders: int = 2,
+                 max_pending: int = 500, put_timeout: float = 5.0, backoff: float = 1.0,
+                 max_backoff: float = 300.0, max_failed: int = 1000, on_delivered=None, on_failed=None,
+                 on_error=None):
+        self.client = client
+        self.path = path
+        self.batch = batch
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_failed = max_failed
+        self.on_delivered = on_delivered
+        self.on_failed = on_failed
+        self.on_error = on_error
+        self.delivery_hist = LatencyHistogram("outbox_delivery")
+        self._local = threading.local()
+        self._space = threading.Condition()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._senders = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="outbox-send")
+        self._thread = None
+        self._paused_until = 0.0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        """Connection of the calling thread (SQLite connections are not shared)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # durable across app crashes; WAL keeps it consistent
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    # ===== Producers =====
+    def put_registration(self, email: str, name: str, payloads: list, codec: str = "bmp",
+                         width: int = 256, height: int = 288, staged: list = None, templates: list = None) -> str:
+        """Queue a registration; `templates` (packed) are handed back on delivery."""
+        meta = {"email": email, "name": name, "codec": codec, "width": width, "height": height,
+                "staged": list(staged or [])}
+        return self._put("register", meta, {"image": payloads, "template": templates or []})
+
+    def put_verification(self, payload: bytes, codec: str = "bmp", width: int = 256, height: int = 288,
+                         info: dict = None, roi: dict = None) -> str:
+        """Queue a match to be answered by the server later (e.g. while it was down)."""
+        meta = {"codec": codec, "width": width, "height": height, "info": info or {}, "roi": roi}
+        return self._put("verify", meta, {"image": [payload]})
+
+    def _put(self, kind: str, meta: dict, parts: dict) -> str:
+        deadline = time.monotonic() + self.put_timeout
+        with self._space:
+            while self.pending() >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("Outbox full: the server has not accepted uploads for a while.")
+                self._space.wait(min(remaining, 0.5))
+        key = uuid.uuid4().hex
+        db = self._db()
+        with db:
+            cur = db.execute("INSERT INTO items (key, kind, meta, created) VALUES (?, ?, ?, ?)",
+                             (key, kind, json.dumps(meta), time.time()))
+            db.executemany("INSERT INTO parts (item_id, role, idx, data) VALUES (?, ?, ?, ?)",
+                           [(cur.lastrowid, role, i, sqlite3.Binary(bytes(blob)))
+                            for role, blobs in parts.items() for i, blob in enumerate(blobs)])
+        self._wake.set()
+        return key
+
+    def pending(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM items WHERE state = 'pending'").fetchone()[0]
+
+    def failed(self) -> list:
+        """(key, kind, meta, last_error) of items the server rejected."""
+        rows = self._db().execute("SELECT key, kind, meta, last_error FROM items WHERE state = 'failed' ORDER BY id")
+        return [(key, kind, json.loads(meta), err) for key, kind, meta, err in rows]
+
+    def retry_failed(self, keys: list = None) -> int:
+        """Queue failed items (all, or those in `keys`) for sending again; returns how many."""
+        n = self._update_failed("UPDATE items SET state = 'pending', attempts = 0, next_try = 0", keys)
+        if n:
+            self._wake.set()
+        return n
+
+    def purge_failed(self, keys: list = None) -> int:
+        """Delete failed items (all, or those in `keys`); returns how many."""
+        return self._update_failed("DELETE FROM items", keys)
+
+    def _update_failed(self, statement: str, keys: list = None) -> int:
+        db = self._db()
+        with db:
+            if keys is None:
+                return db.execute(statement + " WHERE state = 'failed'").rowcount
+            return sum(db.execute(statement + " WHERE state = 'failed' AND key = ?", (key,)).rowcount
+                       for key in keys)
+
+    def _trim_failed(self):
+        """Keep only the newest max_failed failed items."""
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM items WHERE state = 'failed' AND id NOT IN "
+                       "(SELECT id FROM items WHERE state = 'failed' ORDER BY id DESC LIMIT ?)",
+                       (self.max_failed,))
+
+    # ===== Flusher =====
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self._senders.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.flush_once()
+                delay = self._next_due()
+            except Exception as e:
+                self._report(e)
+                delay = 1.0
+            self._wake.wait(delay)
+
+    def _report(self, error: Exception):
+        if self.on_error is None:
+            print("Outbox error:", error)
+            return
+        try:
+            self.on_error(error)
+        except Exception as e:
+            print(f"Outbox error: {error} (on_error raised {e})")
+
+    def _notify(self, callback, *args):
+        """Run a user callback; its errors are reported, not allowed to abort the batch."""
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            self._report(e)
+
+    def _next_due(self) -> float:
+        """Seconds until the next pending item may be tried (capped for housekeeping)."""
+        row = self._db().execute("SELECT MIN(next_try) FROM items WHERE state = 'pending'").fetchone()
+        if row[0] is None:
+            return 30.0
+        return min(30.0, max(0.0, row[0] - time.time(), self._paused_until - time.time()))
+
+    def _due(self) -> list:
+        if time.time() < self._paused_until:
+            return []
+        db = self._db()
+        rows = db.execute(
+            "SELECT id, key, kind, meta, attempts FROM items "
+            "WHERE state = 'pending' AND next_try <= ? ORDER BY id LIMIT ?",
+            (time.time(), self.batch),
+        ).fetchall()
+        items = []
+        for id, key, kind, meta, attempts in rows:
+            parts = {}
+            for role, data in db.execute("SELECT role, data FROM parts WHERE item_id = ? ORDER BY role, idx", (id,)):
+                parts.setdefault(role, []).append(bytes(data))
+            items.append(OutboxItem(id, key, kind, json.loads(meta), attempts, parts))
+        return items
+
+    def flush_once(self) -> int:
+        """Send one batch of due items; return how many were delivered."""
+        items = self._due()
+        if not items:
+            return 0
+        outcomes = list(self._senders.map(self._send, items))
+        delivered = 0
+        failed = False
+        pause = None
+        db = self._db()
+        for item, (status, body, error) in zip(items, outcomes):
+            if status == "ok":
+                with db:
+                    db.execute("DELETE FROM items WHERE id = ?", (item.id,))
+                delivered += 1
+                self._notify(self.on_delivered, item, body)
+            elif status == "failed":
+                with db:
+                    db.execute("UPDATE items SET state = 'failed', attempts = attempts + 1, last_error = ? "
+                               "WHERE id = ?", (error, item.id))
+                failed = True
+                self._notify(self.on_failed, item, error)
+            else:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** item.attempts))
+                pause = delay if pause is None else min(pause, delay)
+                with db:
+                    db.execute("UPDATE items SET attempts = attempts + 1, next_try = ?, last_error = ? "
+                               "WHERE id = ?", (time.time() + delay, error, item.id))
+        if failed:
+            self._trim_failed()
+        if pause is not None:
+            self._paused_until = time.time() + pause
+        if delivered:
+            with self._space:
+                self._space.notify_all()
+        return delivered
+
+    def _send(self, item: OutboxItem) -> tuple:
+        """("ok", json, None), ("retry", None, error) or ("failed", None, error)."""
+        m = item.meta
+        t0 = time.perf_counter()
+        try:
+            if item.kind == "register":
+                response = self.client.post_registration(
+                    m["email"], m["name"], item.parts.get("image", []), m["codec"], m["width"], m["height"],
+                    m.get("staged"), idempotency_key=item.key)
+            else:
+                response = self.client.post_match(item.parts["image"][0], m["codec"], m["width"], m["height"],
+                                                  idempotency_key=item.key, roi=m.get("roi"))
+        except requests.exceptions.RequestException as e:
+            return "retry", None, str(e)
+        self.delivery_hist.record(time.perf_counter() - t0)
+        if response.status_code == 200:
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if item.kind == "register" and not (body or {}).get("user"):
+                # The server answers 200 with only a message when it refused the registration
+                return "failed", None, (body or {}).get("message") or "No user in the registration response"
+            return "ok", body, None
+        error = f"HTTP {response.status_code}: {response.text[:200]}"
+        if response.status_code >= 500 or response.status_code in self.RETRY_STATUS:
+            return "retry", None, error
+        return "failed", None, error
@@ -0,0 +1,527 @@
+# daemon.py
+"""Headless capture/verify service sharing the reader(s) with local clients.
+
+One asyncio loop owns every Device. Blocking DLL calls run on one
+single-thread executor per reader (a handle must stay on one thread),
+encoding, template extraction and HTTP on a shared pool. Clients talk
+JSON over HTTP/1.1 on TCP and/or a Unix socket:
+
+    POST /capture  {"reader": 0, "timeout": 10, "format": "bmp"}  -> image bytes
+    POST /verify   {"reader": 0, "timeout": 10, "top_k": 25}      -> match answer
+    POST /enroll   {"email": ..., "name": ..., "captures": 3}     -> outbox key
+    GET  /status                                                  -> queues and counters
+    GET  /metrics                                                 -> Prometheus text
+
+Requests for a reader are served in start-time fair order across clients
+(see FairQueue), so one busy door controller cannot starve another.
+Queues are bounded per client (429) and per reader (503); a request that
+is not served within its timeout gets 504 and its capture is cancelled.
+Send an X-Client header to be scheduled by name instead of by address.
+
+Run from app/:  python daemon.py --port 8765 [--unix /run/fingerprint.sock]
+"""
+import asyncio
+import heapq
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from finger_device.polling import CancelToken, CaptureCancelled
+from metrics import REGISTRY, record_span
+
+
+class Rejected(RuntimeError):
+    """A request the daemon refuses, with the HTTP status to answer."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SensorRequest:
+    """One job waiting for a reader: fn(device, cancel, timeout) runs on the reader's thread."""
+
+    __slots__ = ("client", "fn", "deadline", "enqueued", "cancel", "future")
+
+    def __init__(self, client: str, fn, timeout: float):
+        self.client = client
+        self.fn = fn
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout
+        self.cancel = CancelToken()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class FairQueue:
+    """Start-time fair queue over clients (event loop thread only).
+
+    Each request is tagged with a virtual start time: right after the same
+    client's previous request, or "now" (the tag of the request in service)
+    if the client had nothing queued. The smallest tag is served first, so
+    a client with many requests queued gets every other turn at most, and a
+    client that shows up with one request waits for at most one request of
+    each other client rather than for their whole backlog.
+    """
+
+    def __init__(self, per_client: int = 8, total: int = 64):
+        self.per_client = per_client
+        self.total = total
+        self._heap = []              # (start tag, seq, client, item)
+        self._finish = {}            # client -> tag after its last queued request
+        self._counts = {}            # client -> requests queued
+        self._vtime = 0
+        self._seq = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, client: str, item):
+        if len(self._heap) >= self.total:
+            raise Rejected(HTTPStatus.SERVICE_UNAVAILABLE, "Reader queue is full, try again later.")
+        queued = self._counts.get(client, 0)
+        if queued >= self.per_client:
+            raise Rejected(HTTPStatus.TOO_MANY_REQUESTS, f"Client {client} already has {queued} requests queued.")
+        start = max(self._vtime, self._finish.get(client, 0))
+        self._finish[client] = start + 1
+        self._counts[client] = queued + 1
+        self._seq += 1
+        heapq.heappush(self._heap, (start, self._seq, client, item))
+        self._ready.set()
+
+    async def get(self):
+        while not self._heap:
+            self._ready.clear()
+            await self._ready.wait()
+        start, _, client, item = heapq.heappop(self._heap)
+        self._vtime = start
+        self._counts[client] -= 1
+        if not self._counts[client]:
+            del self._counts[client]
+        if len(self._finish) > 2 * len(self._counts) + 64:
+            # Tags at or behind "now" change nothing (max() above), forget them
+            self._finish = {c: f for c, f in self._finish.items() if f > self._vtime or c in self._counts}
+        return item
+
+    def depths(self) -> dict:
+        return dict(self._counts)
+
+
+class ReaderLane:
+    """A reader, its executor thread and its fair queue."""
+
+    def __init__(self, reader: int, device, per_client: int, total: int):
+        self.reader = reader
+        self.device = device
+        self.queue = FairQueue(per_client, total)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sensor{reader}")
+        self.busy = False
+        self.served = {}             # client -> requests served
+        self.task = None
+
+    def load(self) -> int:
+        return len(self.queue) + self.busy
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            req = await self.queue.get()
+            if req.future.done():
+                continue             # timed out or disconnected while queued
+            remaining = req.deadline - time.monotonic()
+            if remaining <= 0:
+                req.future.set_exception(TimeoutError("Request timed out waiting for the reader."))
+                continue
+            record_span("daemon.queue_wait", time.monotonic() - req.enqueued)
+            self.busy = True
+            try:
+                result = await loop.run_in_executor(self.executor, req.fn, self.device, req.cancel, remaining)
+            except Exception as e:
+                if not req.future.done():
+                    req.future.set_exception(e)
+            else:
+                if req.future.done():
+                    _release(result)     # nobody is waiting for these frames any more
+                else:
+                    req.future.set_result(result)
+            finally:
+                self.busy = False
+            self.served[req.client] = self.served.get(req.client, 0) + 1
+
+    def status(self) -> dict:
+        return {"reader": self.reader, "busy": self.busy, "queued": len(self.queue),
+                "queues": self.queue.depths(), "served": dict(self.served)}
+
+
+def _release(frames):
+    for frame in frames if isinstance(frames, list) else [frames]:
+        frame.release()
+
+
+class Daemon:
+    """Owns the readers and the matching services and serves the local API.
+
+    Args:
+        devices: Devices keyed by reader id; every attached reader is opened
+            (DeviceManager.open_all) when omitted.
+        client, edge, quality_gate, outbox: services, built with defaults
+            when omitted (the outbox only on the first enrollment).
+        per_client: requests one client may have queued per reader.
+        queue_size: requests queued per reader across all clients.
+        workers: threads for encoding, templates and server calls.
+        timeout: default seconds a request may wait for and use the reader.
+        max_retakes: recaptures when the quality gate rejects a frame.
+    """
+
+    MAX_BODY = 64 * 1024
+    ROUTES = ("/capture", "/verify", "/enroll", "/status", "/metrics")
+    MAX_ENROLL_CAPTURES = 10
+
+    def __init__(self, devices: dict = None, client=None, edge=None, quality_gate=None, outbox=None,
+                 per_client: int = 4, queue_size: int = 64, workers: int = 4, timeout: float = 30.0,
+                 max_retakes: int = 2):
+        self.devices = devices
+        self.client = client
+        self.edge = edge
+        self.quality_gate = quality_gate
+        self.outbox = outbox
+        self.per_client = per_client
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_retakes = max_retakes
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="daemon")
+        self.lanes = {}
+        self.servers = []
+        self.connections = set()     # open client streams, closed on shutdown
+        self.manager = None
+        self.started = time.monotonic()
+
+    # ===== Lifecycle =====
+    async def start(self):
+        """Open the readers and build the services (blocking work runs off the loop)."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.pool, self._open)
+        for reader, dev in sorted(self.devices.items()):
+            lane = ReaderLane(reader, dev, self.per_client, self.queue_size)
+            lane.task = asyncio.create_task(lane.run(), name=f"reader{reader}")
+            self.lanes[reader] = lane
+        return self
+
+    def _open(self):
+        from finger_device.manager import DeviceManager
+        if self.devices is None:
+            self.devices = DeviceManager.open_all()
+        self.manager = DeviceManager(self.devices)
+        if self.client is None:
+            from client.client import Client
+            self.client = Client()
+        if self.edge is None:
+            from client.edge import EdgeVerifier
+            self.edge = EdgeVerifier()
+        if self.quality_gate is None:
+            from imaging.quality import QualityGate
+            self.quality_gate = QualityGate()
+        # Built once here, before any request, so concurrent enrolls share one queue file
+        if self.outbox is None:
+            from client.outbox import Outbox
+            self.outbox = Outbox(self.client, on_delivered=self._on_outbox_delivered,
+                                 on_failed=self._on_outbox_failed)
+        self.outbox.start()
+
+    async def listen(self, host: str = None, port: int = None, unix_path: str = None) -> list:
+        """Start the HTTP listeners; returns the bound (host, port) or socket path."""
+        bound = []
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+            self.servers.append(server)
+            bound.append(unix_path)
+        if port is not None:
+            server = await asyncio.start_server(self._handle_connection, host or "127.0.0.1", port)
+            self.servers.append(server)
+            bound.append(server.sockets[0].getsockname()[:2])
+        return bound
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.sleep(0)       # let idle keep-alive handlers see EOF and return
+        for lane in self.lanes.values():
+            lane.task.cancel()
+            lane.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.outbox is not None:
+            self.outbox.close()
+        if self.manager is not None:
+            self.manager.close()
+
+    # ===== Scheduling =====
+    def _lane(self, reader) -> ReaderLane:
+        if reader is None:
+            return min(self.lanes.values(), key=ReaderLane.load)  # least loaded reader
+        lane = self.lanes.get(int(reader))
+        if lane is None:
+            raise Rejected(HTTPStatus.NOT_FOUND, f"No reader {reader}; readers are {sorted(self.lanes)}.")
+        return lane
+
+    async def submit(self, client: str, fn, reader=None, timeout: float = None):
+        """Queue fn(device, cancel, timeout) for a reader and wait for its result."""
+        timeout = float(timeout or self.timeout)
+        lane = self._lane(reader)
+        req = SensorRequest(client, fn, timeout)
+        lane.queue.put(client, req)
+        try:
+            return await asyncio.wait_for(req.future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No capture within {timeout:g} s.") from None
+        finally:
+            req.cancel.cancel()      # no-op once served; stops a capture that is still polling
+
+    def _capture_checked(self, dev, cancel: CancelToken, timeout: float):
+        """Capture until a frame passes the quality gate (runs on the reader's thread)."""
+        deadline = time.monotonic() + timeout
+        for attempt in range(self.max_retakes + 1):
+            frame = dev.capture_frame(cancel=cancel, timeout=max(0.0, deadline - time.monotonic()))
+            report = self.quality_gate.score(frame)
+            if report.ok:
+                return frame
+            frame.release()
+            if attempt < self.max_retakes:
+                dev.wait_for_lift(cancel, max(0.0, deadline - time.monotonic()))
+        raise Rejected(HTTPStatus.UNPROCESSABLE_ENTITY, f"Capture rejected: {', '.join(report.reasons)}")
+
+    def _capture_many(self, count: int):
+        """Sensor job taking `count` accepted captures of one finger placement each."""
+        def job(dev, cancel: CancelToken, timeout: float):
+            deadline = time.monotonic() + timeout
+            frames = []
+            try:
+                for i in range(count):
+                    if i:
+                        dev.wait_for_lift(cancel, max(0.0, deadline - time.monotonic()))
+                    frames.append(self._capture_checked(dev, cancel, max(0.0, deadline - time.monotonic())))
+            except BaseException:
+                _release(frames)
+                raise
+            return frames
+        return job
+
+    async def _in_pool(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    # ===== Operations =====
+    async def capture(self, client: str, reader=None, timeout: float = None, fmt: str = "bmp") -> tuple:
+        """(codec, payload bytes, frame width, height) of one accepted capture."""
+        from imaging.codecs import available_codecs
+        codec = available_codecs().get(fmt)
+        if codec is None and fmt != "raw":
+            raise ValueError(f"Unknown format {fmt!r}")
+        frame = await self.submit(client, self._capture_checked, reader, timeout)
+
+        def encode():
+            with frame:
+                return frame.tobytes() if codec is None else codec.encode(frame)
+        return codec, await self._in_pool(encode), frame.width, frame.height
+
+    async def verify(self, client: str, reader=None, timeout: float = None, top_k: int = None) -> dict:
+        frame = await self.submit(client, self._capture_checked, reader, timeout)
+        return await self._in_pool(self._verify, frame, top_k)
+
+    def _verify(self, frame, top_k: int = None) -> dict:
+        try:
+            template = self.edge.extract(frame)
+            codec, payload, geometry = self.client.encode_image(frame, frame.width, frame.height)
+        finally:
+            frame.release()
+        response = self.edge.verify(template, lambda candidates: self.client.check_fingerprint(
+            payload, codec, candidates=candidates, top_k=top_k, **geometry))
+        if response is None:
+            raise Rejected(HTTPStatus.BAD_GATEWAY, "Matching server did not answer.")
+        return response
+
+    async def enroll(self, client: str, email: str, name: str, captures: int = 3, reader=None,
+                     timeout: float = None) -> dict:
+        if not email or not name:
+            raise ValueError("email and name are required")
+        if not 1 <= captures <= self.MAX_ENROLL_CAPTURES:
+            raise ValueError(f"captures must be 1..{self.MAX_ENROLL_CAPTURES}")
+        # One sensor job for all placements, so nobody else's finger lands in between
+        timeout = float(timeout or self.timeout) * captures
+        frames = await self.submit(client, self._capture_many(captures), reader, timeout)
+        return await self._in_pool(self._enroll, frames, email, name)
+
+    def _enroll(self, frames: list, email: str, name: str) -> dict:
+        from client.enrollment import DuplicateCapture, EnrollmentSession
+        session = EnrollmentSession(self.client, self.edge)
+        duplicates = 0
+        try:
+            for frame in frames:
+                try:
+                    session.add(frame)
+                except DuplicateCapture:
+                    duplicates += 1     # same placement again: not worth uploading
+            key, used = session.queue(self.outbox, email, name)
+        finally:
+            session.close()
+        return {"queued": key, "captures": used, "duplicates": duplicates, "pending": self.outbox.pending()}
+
+    def _on_outbox_delivered(self, item, body):
+        # Runs on the outbox flusher thread; registrations only arrive here with a user
+        if item.kind != "register":
+            return
+        from client.edge import unpack_template
+        m = item.meta
+        self.edge.enroll_templates({"name": m["name"], "email": m["email"], **body["user"]},
+                                   [unpack_template(t) for t in item.parts.get("template", [])])
+
+    def _on_outbox_failed(self, item, error: str):
+        what = item.meta["email"] if item.kind == "register" else "a queued scan"
+        print(f"Server rejected {what}: {error}")
+
+    def status(self) -> dict:
+        return {"uptime": time.monotonic() - self.started,
+                "readers": [lane.status() for lane in self.lanes.values()]}
+
+    # ===== HTTP =====
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        default_client = peer[0] if isinstance(peer, tuple) else "unix"
+        self.connections.add(writer)
+        try:
+            while True:
+                request = await _read_request(reader, self.MAX_BODY)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                client = headers.get("x-client") or default_client
+                status, content_type, payload, extra = await self._dispatch(method, path, client, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, content_type, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except (Rejected, ValueError) as e:
+            status = getattr(e, "status", HTTPStatus.BAD_REQUEST)
+            writer.write(_response(int(status), "application/json", _json({"message": str(e)}), {}, False))
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, client: str, body: bytes) -> tuple:
+        t0 = time.perf_counter()
+        route = path.split("?", 1)[0]
+        try:
+            args = json.loads(body) if body else {}
+            if not isinstance(args, dict):
+                raise ValueError("Request body must be a JSON object")
+            if method == "GET" and route == "/status":
+                return 200, "application/json", _json(self.status()), {}
+            if method == "GET" and route == "/metrics":
+                return 200, "text/plain; version=0.0.4", REGISTRY.prometheus_text().encode(), {}
+            if method != "POST":
+                raise Rejected(HTTPStatus.NOT_FOUND, f"No route {method} {route}")
+            reader, timeout = args.get("reader"), args.get("timeout")
+            if route == "/capture":
+                codec, data, width, height = await self.capture(client, reader, timeout, args.get("format", "bmp"))
+                mime = codec.mime if codec is not None else "application/octet-stream"
+                return 200, mime, data, {"X-Width": width, "X-Height": height}
+            if route == "/verify":
+                return 200, "application/json", _json(await self.verify(client, reader, timeout, args.get("top_k"))), {}
+            if route == "/enroll":
+                result = await self.enroll(client, args.get("email"), args.get("name"),
+                                           int(args.get("captures", 3)), reader, timeout)
+                return 202, "application/json", _json(result), {}
+            raise Rejected(HTTPStatus.NOT_FOUND, f"No route {method} {route}")
+        except Rejected as e:
+            REGISTRY.incr(f"daemon_rejected_{int(e.status)}")
+            return int(e.status), "application/json", _json({"message": str(e)}), {}
+        except (ValueError, TypeError) as e:
+            return 400, "application/json", _json({"message": str(e)}), {}
+        except (TimeoutError, CaptureCancelled) as e:
+            REGISTRY.incr("daemon_timeouts")
+            return 504, "application/json", _json({"message": str(e)}), {}
+        except Exception as e:
+            return 500, "application/json", _json({"message": str(e)}), {}
+        finally:
+            if route in self.ROUTES:
+                record_span(f"daemon{route.replace('/', '.')}", time.perf_counter() - t0)
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj).encode("utf-8")
+
+
+async def _read_request(reader: asyncio.StreamReader, max_body: int):
+    """(method, path, headers, body) of the next request, or None at end of stream."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise Rejected(HTTPStatus.BAD_REQUEST, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > max_body:
+        raise Rejected(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _response(status: int, content_type: str, payload: bytes, extra: dict, keep_alive: bool) -> bytes:
+    head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in extra.items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Fingerprint capture/verify daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port; 0 picks a free one, -1 disables TCP")
+    parser.add_argument("--unix", metavar="PATH", help="also listen on this Unix socket")
+    parser.add_argument("--api-url", help="matching server (default: the client's api_url)")
+    parser.add_argument("--per-client", type=int, default=4, help="queued requests per client and reader")
+    parser.add_argument("--queue-size", type=int, default=64, help="queued requests per reader")
+    parser.add_argument("--workers", type=int, default=4, help="threads for encoding and server calls")
+    parser.add_argument("--timeout", type=float, default=30.0, help="default request timeout, seconds")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        client = None
+        if args.api_url:
+            from client.client import Client
+            client = Client(args.api_url)
+        daemon = Daemon(client=client, per_client=args.per_client, queue_size=args.queue_size,
+                        workers=args.workers, timeout=args.timeout)
+        await daemon.start()
+        bound = await daemon.listen(args.host, args.port if args.port >= 0 else None, args.unix)
+        print(f"Serving {len(daemon.lanes)} reader(s) on {', '.join(map(str, bound))}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await daemon.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""Append-only archive of raw 256x288 captures.
+
+Frames are stored back to back in fixed-size segment files next to a
+compact binary index, both memory-mapped for reading:
+
+    archive/
+        seg_000000.frames   SEGMENT_FRAMES x 73728 raw gray bytes
+        seg_000000.index    one INDEX_DTYPE record (24 bytes) per frame
+        users.txt           user labels, line n is user id n
+        archive.json        layout (segment size), fixed when the archive is created
+
+Frame ids are global and dense (segment * segment_frames + slot), reads
+are zero-copy NumPy views into the map, and iter_batches() walks whole
+segments at disk bandwidth. A crash can at most leave a torn last record,
+which is dropped on open. BMPs are only written on demand by export_bmp.
+
+Run from app/:
+    python -m finger_device.archive import fingerprint/archive fingerprint/normal
+    python -m finger_device.archive info fingerprint/archive
+    python -m finger_device.archive export fingerprint/archive out/ --user alice@example.com
+"""
+import json
+import mmap
+import os
+import threading
+import time
+import numpy as np
+from finger_device.framepool import IMAGE_BYTES, IMAGE_X, IMAGE_Y
+from imaging.encoder import ImageEncoder, as_gray_array, decode_bmp
+
+INDEX_DTYPE = np.dtype([
+    ("ts", "<f8"),         # capture time, Unix seconds
+    ("quality", "<f4"),    # quality score, NaN when not scored
+    ("user", "<i4"),       # id into users.txt, -1 when unknown
+    ("reader", "<u2"),
+    ("flags", "<u2"),
+    ("reserved", "<u4"),
+])
+
+
+class _Segment:
+    """One frames file and its index file, mapped read-only and remapped as they grow."""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.frames_path = base + ".frames"
+        self.index_path = base + ".index"
+        self._frames_map = None
+        self._index_map = None
+        self.frames = np.empty((0, IMAGE_Y, IMAGE_X), dtype=np.uint8)
+        self.index = np.empty(0, dtype=INDEX_DTYPE)
+
+    def count(self) -> int:
+        """Complete frames on disk: both the frame and its index record were written."""
+        sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in (self.frames_path, self.index_path)]
+        return min(sizes[0] // IMAGE_BYTES, sizes[1] // INDEX_DTYPE.itemsize)
+
+    def repair(self) -> int:
+        """Drop a torn tail left by a crash; return the number of complete frames."""
+        count = self.count()
+        for path, size in ((self.frames_path, count * IMAGE_BYTES), (self.index_path, count * INDEX_DTYPE.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        return count
+
+    def map(self, count: int):
+        """Map the first `count` records (no-op if already mapped that far)."""
+        if count == len(self.index):
+            return
+        self.close()
+        if count == 0:
+            return
+        with open(self.frames_path, "rb") as f:
+            self._frames_map = mmap.mmap(f.fileno(), count * IMAGE_BYTES, access=mmap.ACCESS_READ)
+        with open(self.index_path, "rb") as f:
+            self._index_map = mmap.mmap(f.fileno(), count * INDEX_DTYPE.itemsize, access=mmap.ACCESS_READ)
+        self.frames = np.frombuffer(self._frames_map, dtype=np.uint8).reshape(count, IMAGE_Y, IMAGE_X)
+        self.index = np.frombuffer(self._index_map, dtype=INDEX_DTYPE)
+
+    def close(self):
+        # Views must go before the maps can be closed
+        self.frames = np.empty((0, IMAGE_Y, IMAGE_X), dtype=np.uint8)
+        self.index = np.empty(0, dtype=INDEX_DTYPE)
+        for m in (self._frames_map, self._index_map):
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    pass         # a caller still holds a view; the map goes with it
+        self._frames_map = self._index_map = None
+
+
+class FrameArchive:
+    """Append-only, memory-mapped store of raw captures with a compact index.
+
+    Args:
+        path: archive directory, created if missing.
+        segment_frames: frames per segment file (4096 frames = 288 MiB); an existing
+            archive keeps the size it was created with.
+        readonly: open for reading only (no writer files are opened).
+    """
+
+    SEGMENT_FRAMES = 4096
+    BMP_NAME = "fingerprint_{:08d}.bmp"     # exported files, by frame id (Device.export_bmp too)
+
+    def __init__(self, path: str = "fingerprint/archive", segment_frames: int = None, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._writer = None          # (frames file, index file) of the last segment
+        meta_path = os.path.join(path, "archive.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                segment_frames = json.load(f)["segment_frames"]
+        elif not readonly:
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"segment_frames": segment_frames or self.SEGMENT_FRAMES}, f)
+        self.segment_frames = segment_frames or self.SEGMENT_FRAMES
+        self._users = []
+        self._user_ids = {}
+        users_path = os.path.join(path, "users.txt")
+        if os.path.exists(users_path):
+            with open(users_path, "r", encoding="utf-8") as f:
+                for label in f.read().splitlines():
+                    self._user_ids[label] = len(self._users)
+                    self._users.append(label)
+        self._segments = []
+        self._counts = []            # complete frames per segment
+        names = sorted(n[:-len(".frames")] for n in os.listdir(path) if n.endswith(".frames")) \
+            if os.path.isdir(path) else []
+        for name in names:
+            seg = _Segment(os.path.join(path, name))
+            self._segments.append(seg)
+            self._counts.append(seg.count() if readonly else seg.repair())
+
+    def __len__(self):
+        return sum(self._counts)
+
+    # ===== Writing =====
+    def user_id(self, label: str) -> int:
+        """Id of a user label (e.g. an email), added to users.txt on first use."""
+        if label is None:
+            return -1
+        uid = self._user_ids.get(label)
+        if uid is None:
+            with open(os.path.join(self.path, "users.txt"), "a", encoding="utf-8") as f:
+                f.write(label.replace("\n", " ") + "\n")
+            uid = self._user_ids[label] = len(self._users)
+            self._users.append(label)
+        return uid
+
+    def user_label(self, uid: int) -> str:
+        return self._users[uid] if 0 <= uid < len(self._users) else None
+
+    def append(self, img, reader: int = 0, user: str = None, quality: float = float("nan"),
+               ts: float = None, flags: int = 0) -> int:
+        """Store one frame (Frame, bytes or array) and return its id.
+
+        The frame is written before its index record, so an indexed frame
+        is always complete. Data reaches the OS at once; call flush() for
+        an fsync.
+        """
+        data = np.ascontiguousarray(as_gray_array(img))
+        if self.readonly:
+            raise RuntimeError("Archive is open read-only")
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["ts"] = time.time() if ts is None else ts
+        record["quality"] = quality
+        record["reader"] = reader
+        record["flags"] = flags
+        with self._lock:
+            record["user"] = self.user_id(user)
+            if not self._segments or self._counts[-1] >= self.segment_frames:
+                self._new_segment()
+            frames_file, index_file = self._writer_files()
+            frames_file.write(data)
+            frames_file.flush()
+            index_file.write(record.tobytes())
+            index_file.flush()
+            self._counts[-1] += 1
+            return (len(self._segments) - 1) * self.segment_frames + self._counts[-1] - 1
+
+    def _new_segment(self):
+        self._close_writer()
+        seg = _Segment(os.path.join(self.path, f"seg_{len(self._segments):06d}"))
+        open(seg.frames_path, "ab").close()
+        open(seg.index_path, "ab").close()
+        self._segments.append(seg)
+        self._counts.append(0)
+
+    def _writer_files(self):
+        if self._writer is None:
+            seg = self._segments[-1]
+            self._writer = (open(seg.frames_path, "ab"), open(seg.index_path, "ab"))
+        return self._writer
+
+    def _close_writer(self):
+        if self._writer is not None:
+            for f in self._writer:
+                f.close()
+            self._writer = None
+
+    def flush(self):
+        """fsync the segment being written."""
+        with self._lock:
+            if self._writer is not None:
+                for f in self._writer:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def close(self):
+        with self._lock:
+            self._close_writer()
+            for seg in self._segments:
+                seg.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ===== Reading =====
+    def _view(self, s: int) -> tuple:
+        """(frames, index) views of segment s as far as it is written now.
+
+        Mapping happens under the lock, so a reader never sees a map that
+        another thread is replacing. A remap leaves older views valid (they
+        keep their map alive), so the snapshot stays usable while appends
+        grow the segment.
+        """
+        with self._lock:
+            seg = self._segments[s]
+            seg.map(self._counts[s])
+            return seg.frames, seg.index
+
+    def frame(self, frame_id: int) -> np.ndarray:
+        """(288, 256) uint8 view of one frame, straight from the map."""
+        s, slot = divmod(int(frame_id), self.segment_frames)
+        if s >= len(self._segments) or slot >= self._counts[s]:
+            raise IndexError(f"No frame {frame_id}")
+        return self._view(s)[0][slot]
+
+    def record(self, frame_id: int) -> dict:
+        s, slot = divmod(int(frame_id), self.segment_frames)
+        if s >= len(self._segments) or slot >= self._counts[s]:
+            raise IndexError(f"No frame {frame_id}")
+        r = self._view(s)[1][slot]
+        return {"id": int(frame_id), "ts": float(r["ts"]), "quality": float(r["quality"]),
+                "user": self.user_label(int(r["user"])), "reader": int(r["reader"]), "flags": int(r["flags"])}
+
+    def index(self) -> tuple:
+        """(ids, records) over the whole archive; records is a copy of the index."""
+        parts = [(s, self._view(s)[1]) for s in range(len(self._segments))]
+        parts = [(s, index) for s, index in parts if len(index)]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=INDEX_DTYPE)
+        ids = [s * self.segment_frames + np.arange(len(index)) for s, index in parts]
+        return np.concatenate(ids), np.concatenate([index for _, index in parts])
+
+    def select(self, reader: int = None, user: str = None, since: float = None, until: float = None,
+               min_quality: float = None) -> np.ndarray:
+        """Ids of the frames matching every given filter, in capture order."""
+        ids, rec = self.index()
+        mask = np.ones(len(ids), dtype=bool)
+        if reader is not None:
+            mask &= rec["reader"] == reader
+        if user is not None:
+            mask &= rec["user"] == self._user_ids.get(user, -2)
+        if since is not None:
+            mask &= rec["ts"] >= since
+        if until is not None:
+            mask &= rec["ts"] < until
+        if min_quality is not None:
+            mask &= rec["quality"] >= min_quality
+        return ids[mask]
+
+    def iter_batches(self, batch: int = 256, ids=None):
+        """Yield (ids, records, frames) with frames an (n, 288, 256) view, segment by segment.
+
+        With `ids` (sorted, e.g. from select) only those frames are read;
+        they are gathered into a copy, since they are not contiguous.
+        """
+        for s in range(len(self._segments)):
+            frames, index = self._view(s)
+            count = len(index)
+            if not count:
+                continue
+            first = s * self.segment_frames
+            if ids is None:
+                for lo in range(0, count, batch):
+                    hi = min(lo + batch, count)
+                    yield np.arange(first + lo, first + hi), index[lo:hi], frames[lo:hi]
+                continue
+            ids = np.asarray(ids)
+            local = ids[(ids >= first) & (ids < first + count)] - first
+            for lo in range(0, len(local), batch):
+                slots = local[lo:lo + batch]
+                yield slots + first, index[slots], frames[slots]
+
+    # ===== Export =====
+    def export_bmp(self, out_dir: str, ids=None) -> int:
+        """Write frames (all, or `ids`) as BMP files named by frame id; returns the count."""
+        os.makedirs(out_dir, exist_ok=True)
+        encoder = ImageEncoder()
+        written = 0
+        for batch_ids, _, frames in self.iter_batches(ids=ids):
+            for frame_id, frame in zip(batch_ids, frames):
+                with open(os.path.join(out_dir, self.BMP_NAME.format(int(frame_id))), "wb") as f:
+                    f.write(encoder.encode_bmp_into(frame))
+                written += 1
+        return written
+
+    def import_bmp(self, bmp_dir: str, reader: int = 0, user: str = None) -> int:
+        """Append a folder of old 8-bit BMP dumps, oldest first, stamped with their mtimes."""
+        paths = [os.path.join(bmp_dir, n) for n in os.listdir(bmp_dir) if n.lower().endswith(".bmp")]
+        imported = 0
+        for path in sorted(paths, key=os.path.getmtime):
+            with open(path, "rb") as f:
+                try:
+                    frame = decode_bmp(f.read())
+                except ValueError:
+                    continue
+            if frame.shape == (IMAGE_Y, IMAGE_X):
+                self.append(frame, reader=reader, user=user, ts=os.path.getmtime(path))
+                imported += 1
+        return imported
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or export a frame archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="frame count, readers, users and time span")
+    info.add_argument("archive")
+    export = sub.add_parser("export", help="write frames as BMP files")
+    export.add_argument("archive")
+    export.add_argument("out_dir")
+    export.add_argument("--reader", type=int)
+    export.add_argument("--user")
+    export.add_argument("--min-quality", type=float)
+    imports = sub.add_parser("import", help="append a folder of BMP dumps (e.g. fingerprint/normal)")
+    imports.add_argument("archive")
+    imports.add_argument("bmp_dir")
+    imports.add_argument("--reader", type=int, default=0)
+    imports.add_argument("--user")
+    args = parser.parse_args(argv)
+
+    with FrameArchive(args.archive, readonly=args.command != "import") as archive:
+        if args.command == "import":
+            print(f"Imported {archive.import_bmp(args.bmp_dir, args.reader, args.user)} frames into {args.archive}")
+        elif args.command == "info":
+            ids, rec = archive.index()
+            print(f"{len(ids)} frames in {len(archive._segments)} segment(s), "
+                  f"{len(ids) * IMAGE_BYTES / 2 ** 20:.0f} MiB")
+            if len(ids):
+                print(f"from {time.ctime(rec['ts'].min())} to {time.ctime(rec['ts'].max())}")
+                readers, counts = np.unique(rec["reader"], return_counts=True)
+                print("readers:", ", ".join(f"{r}: {c}" for r, c in zip(readers, counts)))
+                print(f"users: {len(set(rec['user'][rec['user'] >= 0].tolist()))}")
+        else:
+            ids = archive.select(reader=args.reader, user=args.user, min_quality=args.min_quality)
+            print(f"Exported {archive.export_bmp(args.out_dir, ids)} BMP files to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+import os
+import json
+import time
+import random
+import ctypes
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ctypes import byref, c_int, c_uint, c_ubyte, c_char_p, c_void_p
+from imaging.encoder import decode_bmp, encode_bmp
+
+
+# Return codes shared by every backend (same values as SynoAPIEx)
+PS_OK, PS_COMM_ERR, PS_NO_FINGER = 0x00, 0x01, 0x02
+IMAGE_X, IMAGE_Y = 256, 288
+IMAGE_BYTES = IMAGE_X * IMAGE_Y
+
+
+class SensorBackend(ABC):
+    """Low-level sensor interface used by Device.
+
+    Methods mirror the vendor calls and return the vendor status codes so
+    Device can treat every backend the same way.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def open(self):
+        """Open the sensor and return an opaque handle."""
+
+    @abstractmethod
+    def get_image(self, addr: int) -> int:
+        """Ask the sensor to grab an image (PSGetImage)."""
+
+    @abstractmethod
+    def up_image(self, addr: int, buf, img_len: c_int) -> int:
+        """Copy the last grabbed image into buf (PSUpImage)."""
+
+    @abstractmethod
+    def to_bmp(self, buf, path: str) -> int:
+        """Write raw image data to a BMP file (PSImgData2BMP)."""
+
+    @abstractmethod
+    def close(self):
+        """Close the sensor."""
+
+    @abstractmethod
+    def ping(self) -> bool:
+        """Return True if the open handle still answers.
+
+        Must not grab an image: that would consume the finger placement the
+        next capture is waiting for.
+        """
+
+    def err_text(self, code: int) -> str:
+        return f"Error 0x{code:02X}"
+
+
+# ===== Vendor DLL =====
+class DllBackend(SensorBackend):
+    """SynoAPIEx.dll backend (the real sensor).
+
+    The transport that last opened successfully (USB package size, or COM
+    port and baud) is saved to `profile_path` and tried first next time, so
+    a warm open is one PSOpenDeviceEx call instead of a full probe. COM
+    ports are probed concurrently, and the probe gives up after
+    `com_probe_timeout` seconds.
+    """
+
+    name = "dll"
+    DLL_NAME = "SynoAPIEx.dll"
+    DEFAULT_ADDR = 0xFFFFFFFF
+    DEVICE_USB, DEVICE_COM, DEVICE_UDISK = 0, 1, 2
+    USB_PACKAGE_SIZES = (2, 3, 1, 0, 4)
+    COM_PORTS = range(1, 31)
+    COM_BAUDS = (6, 12)                 # multiples of 9600 bps
+    PROFILE_PATH = "fingerprint/transport.json"
+
+    def __init__(self, dll=None, profile_path: str = PROFILE_PATH,
+                 com_probe_workers: int = 16, com_probe_timeout: float = 3.0, device_index: int = 0):
+        self.dll = dll if dll is not None else self._load_vendor_dll(self.DLL_NAME)
+        self._set_signatures()
+        self.handle = None
+        self.profile = None             # transport of the open handle
+        self._grabbed = False           # ping grabbed a finger; the next get_image reports it
+        self._par_table = (c_ubyte * 512)()
+        self.device_index = device_index
+        if profile_path and device_index:
+            root, ext = os.path.splitext(profile_path)
+            profile_path = f"{root}.{device_index}{ext}"
+        self.profile_path = profile_path
+        self.com_probe_workers = com_probe_workers
+        self.com_probe_timeout = com_probe_timeout
+
+    @classmethod
+    def count_readers(cls, dll) -> int:
+        """Readers attached over USB or as U-disk, as reported by the DLL (at least 1)."""
+        usb_n, udisks = c_int(0), c_int(0)
+        dll.PSGetUSBDevNum(byref(usb_n))
+        dll.PSGetUDiskNum(byref(udisks))
+        return max(1, usb_n.value + udisks.value)
+
+    @staticmethod
+    def _load_vendor_dll(name: str) -> ctypes.CDLL:
+        here = os.path.dirname(os.path.abspath(__file__))
+        candidate = os.path.join(here, name)
+        return ctypes.WinDLL(candidate if os.path.isfile(candidate) else name)
+
+    def _set_signatures(self):
+        dll = self.dll
+        HANDLE = c_void_p
+
+        dll.PSOpenDeviceEx.argtypes = [ctypes.POINTER(HANDLE), c_int, c_int, c_int, c_int, c_int]
+        dll.PSOpenDeviceEx.restype = c_int
+
+        dll.PSAutoOpen.argtypes = [ctypes.POINTER(HANDLE), ctypes.POINTER(c_int), c_int, c_uint, c_int]
+        dll.PSAutoOpen.restype = c_int
+
+        dll.PSGetUSBDevNum.argtypes = [ctypes.POINTER(c_int)]
+        dll.PSGetUSBDevNum.restype = c_int
+
+        dll.PSGetUDiskNum.argtypes = [ctypes.POINTER(c_int)]
+        dll.PSGetUDiskNum.restype = c_int
+
+        dll.PSCloseDeviceEx.argtypes = [HANDLE]
+        dll.PSCloseDeviceEx.restype = c_int
+
+        dll.PSGetImage.argtypes = [HANDLE, c_int]
+        dll.PSGetImage.restype = c_int
+
+        dll.PSUpImage.argtypes = [HANDLE, c_int, ctypes.POINTER(c_ubyte), ctypes.POINTER(c_int)]
+        dll.PSUpImage.restype = c_int
+
+        dll.PSImgData2BMP.argtypes = [ctypes.POINTER(c_ubyte), c_char_p]
+        dll.PSImgData2BMP.restype = c_int
+
+        dll.PSErr2Str.argtypes = [c_int]
+        dll.PSErr2Str.restype = ctypes.c_char_p
+
+        # Not exported by every SDK build; ping falls back to PSGetImage without it
+        try:
+            dll.PSReadParTable.argtypes = [HANDLE, c_int, ctypes.POINTER(c_ubyte)]
+            dll.PSReadParTable.restype = c_int
+            self._has_par_table = True
+        except AttributeError:
+            self._has_par_table = False
+
+    def open(self):
+        """Open the sensor: cached transport first, then the full probe."""
+        cached = self.load_profile()
+        if cached:
+            h = self._open_profile(cached)
+            if h:
+                self.handle, self.profile = h, cached
+                return h
+
+        if self.device_index:
+            # PSAutoOpen and the COM scan only ever find the first reader
+            h, profile = self._try_USB_explicit()
+        else:
+            try:
+                h, dtype = self._try_PSAutoOpen()
+                profile = {"type": "auto", "device_type": dtype}
+            except Exception:
+                try:
+                    h, profile = self._try_USB_explicit()
+                except Exception:
+                    h, profile = self._try_COM_scan()
+        self.handle, self.profile = h, profile
+        self.save_profile(profile)
+        return h
+
+    # ===== Transport profile =====
+    def load_profile(self) -> dict:
+        if not self.profile_path or not os.path.isfile(self.profile_path):
+            return None
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_profile(self, profile: dict):
+        if not self.profile_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.profile_path) or ".", exist_ok=True)
+            tmp = self.profile_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(profile, f)
+            os.replace(tmp, self.profile_path)
+        except OSError:
+            pass  # a missing cache only costs a slower open next time
+
+    def _open_profile(self, profile: dict):
+        """One open attempt with a saved transport; None when it does not answer."""
+        kind = profile.get("type")
+        if kind == "usb":
+            return self._open_ex(self.DEVICE_USB, 1, 1, profile.get("package", 2))
+        if kind == "com":
+            return self._open_ex(self.DEVICE_COM, profile.get("port", 1), profile.get("baud", 6), 2)
+        if kind == "auto" and not self.device_index:
+            try:
+                return self._try_PSAutoOpen()[0]
+            except RuntimeError:
+                return None
+        return None
+
+    def _open_ex(self, device_type: int, port: int, baud: int, package: int):
+        h = c_void_p()
+        rc = self.dll.PSOpenDeviceEx(byref(h), device_type, port, baud, package, self.device_index)
+        return h if rc == PS_OK and h else None
+
+    # ===== Probing =====
+    def _try_PSAutoOpen(self):
+        h = c_void_p()
+        dtype = c_int(-1)
+        rc = self.dll.PSAutoOpen(byref(h), byref(dtype), self.DEFAULT_ADDR, 0, 1)
+        if rc == PS_OK and h:
+            return h, dtype.value
+        raise RuntimeError("PSAutoOpen failed")
+
+    def _try_USB_explicit(self):
+        # Sequential: every package size talks to the same USB device
+        for nPackageSize in self.USB_PACKAGE_SIZES:
+            h = self._open_ex(self.DEVICE_USB, 1, 1, nPackageSize)
+            if h:
+                return h, {"type": "usb", "package": nPackageSize}
+        raise RuntimeError("USB open attempts failed.")
+
+    def _try_COM_scan(self):
+        """Probe every COM port concurrently; the first port that answers wins.
+
+        Attempts on the same port run one baud rate after the other. A
+        handle opened by a loser (or after the timeout) is closed again.
+        """
+        won = threading.Event()
+
+        def probe(com):
+            for ibaud in self.COM_BAUDS:
+                if won.is_set():
+                    return None
+                h = self._open_ex(self.DEVICE_COM, com, ibaud, 2)
+                if h:
+                    return h, {"type": "com", "port": com, "baud": ibaud}
+            return None
+
+        def close_late(future):
+            if not future.cancelled() and future.exception() is None and future.result():
+                self.dll.PSCloseDeviceEx(future.result()[0])
+
+        pool = ThreadPoolExecutor(max_workers=self.com_probe_workers, thread_name_prefix="com-probe")
+        pending = {pool.submit(probe, com) for com in self.COM_PORTS}
+        deadline = time.monotonic() + self.com_probe_timeout
+        result = None
+        try:
+            while pending and result is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    r = future.result() if future.exception() is None else None
+                    if r and result is None:
+                        result = r
+                    elif r:
+                        self.dll.PSCloseDeviceEx(r[0])
+        finally:
+            won.set()
+            for future in pending:
+                future.add_done_callback(close_late)
+            pool.shutdown(wait=False, cancel_futures=True)
+        if result is None:
+            raise RuntimeError("COM open attempts failed.")
+        return result
+
+    # ===== Health =====
+    def ping(self) -> bool:
+        """Cheap liveness check that leaves the finger placement alone.
+
+        PSReadParTable reads the sensor's parameter table without grabbing
+        an image. Without it PSGetImage is used, and a finger it happens to
+        grab is reported by the next get_image instead of being lost.
+        """
+        if not self.handle:
+            return False
+        if self._has_par_table:
+            return self.dll.PSReadParTable(self.handle, self.DEFAULT_ADDR, self._par_table) == PS_OK
+        rc = self.dll.PSGetImage(self.handle, self.DEFAULT_ADDR)
+        self._grabbed = rc == PS_OK
+        return rc in (PS_OK, PS_NO_FINGER)
+
+    def get_image(self, addr: int) -> int:
+        if self._grabbed:
+            self._grabbed = False
+            return PS_OK
+        return self.dll.PSGetImage(self.handle, addr)
+
+    def up_image(self, addr: int, buf, img_len: c_int) -> int:
+        return self.dll.PSUpImage(self.handle, addr, buf, byref(img_len))
+
+    def to_bmp(self, buf, path: str) -> int:
+        return self.dll.PSImgData2BMP(buf, path.encode("utf-8"))
+
+    def close(self):
+        self._grabbed = False
+        if self.handle:
+            self.dll.PSCloseDeviceEx(self.handle)
+            self.handle = None
+
+    def err_text(self, code: int) -> str:
+        s = self.dll.PSErr2Str(code)
+        return s.decode(errors="ignore") if s else f"Error 0x{code:02X}"
+
+
+# ===== Simulated sensor =====
+class SimulatedBackend(SensorBackend):
+    """Replays recorded frames with scripted timings, no hardware needed.
+
+    Args:
+        frames: list of raw 256x288 8-bit frames; a synthetic ridge pattern
+            is generated when empty.
+        finger_delay: seconds between the first poll after a capture and the
+            next finger arriving on the sensor.
+        finger_jitter: uniform +/- jitter added to finger_delay.
+        get_image_latency: time spent inside each get_image call.
+        up_image_latency: time spent transferring a frame in up_image.
+        error_rate: probability that get_image returns PS_COMM_ERR.
+        seed: random seed, so runs are reproducible.
+    """
+
+    name = "sim"
+    ERRORS = {
+        PS_OK: "OK",
+        PS_COMM_ERR: "Communication error (simulated)",
+        PS_NO_FINGER: "No finger on sensor",
+    }
+
+    def __init__(self, frames=None, finger_delay: float = 0.5, finger_jitter: float = 0.0,
+                 get_image_latency: float = 0.0, up_image_latency: float = 0.0,
+                 error_rate: float = 0.0, seed=None):
+        self.frames = [bytes(f) for f in frames] if frames else [synthetic_frame()]
+        for f in self.frames:
+            if len(f) != IMAGE_BYTES:
+                raise ValueError(f"Simulated frames must be {IMAGE_BYTES} bytes, got {len(f)}")
+        self.finger_delay = finger_delay
+        self.finger_jitter = finger_jitter
+        self.get_image_latency = get_image_latency
+        self.up_image_latency = up_image_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.handle = None
+        self._index = 0
+        self._arrival = None
+        self._grabbed = False
+        # counters, handy for benchmarks
+        self.get_image_calls = 0
+        self.captures = 0
+
+    def open(self):
+        self.handle = c_void_p(1)
+        self._arrival = None
+        self._grabbed = False
+        return self.handle
+
+    def get_image(self, addr: int) -> int:
+        if not self.handle:
+            return PS_COMM_ERR
+        self.get_image_calls += 1
+        if self.get_image_latency:
+            time.sleep(self.get_image_latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return PS_COMM_ERR
+        now = time.monotonic()
+        if self._arrival is None:
+            jitter = self.rng.uniform(-self.finger_jitter, self.finger_jitter) if self.finger_jitter else 0.0
+            self._arrival = now + max(0.0, self.finger_delay + jitter)
+        if now < self._arrival:
+            return PS_NO_FINGER
+        self._grabbed = True
+        return PS_OK
+
+    def up_image(self, addr: int, buf, img_len: c_int) -> int:
+        if not self.handle or not self._grabbed:
+            return PS_COMM_ERR
+        if self.up_image_latency:
+            time.sleep(self.up_image_latency)
+        frame = self.frames[self._index % len(self.frames)]
+        n = min(len(frame), img_len.value)
+        ctypes.memmove(buf, frame, n)
+        img_len.value = n
+        self._index += 1
+        self.captures += 1
+        # Finger is lifted; the next one arrives finger_delay after the next poll
+        self._grabbed = False
+        self._arrival = None
+        return PS_OK
+
+    def to_bmp(self, buf, path: str) -> int:
+        with open(path, "wb") as f:
+            f.write(encode_bmp(bytes(buf)[:IMAGE_BYTES]))
+        return PS_OK
+
+    def close(self):
+        self.handle = None
+
+    def ping(self) -> bool:
+        return bool(self.handle)
+
+    def err_text(self, code: int) -> str:
+        return self.ERRORS.get(code, f"Error 0x{code:02X}")
+
+
+# ===== Frame helpers =====
+def synthetic_frame(width: int = IMAGE_X, height: int = IMAGE_Y) -> bytes:
+    """Build a concentric ridge pattern that looks vaguely like a fingerprint."""
+    import math
+    cx, cy = width / 2, height / 2
+    out = bytearray(width * height)
+    i = 0
+    for y in range(height):
+        for x in range(width):
+            dx, dy = (x - cx) / 110.0, (y - cy) / 130.0
+            if dx * dx + dy * dy > 1.0:
+                out[i] = 255
+            else:
+                r = math.hypot(x - cx, (y - cy) * 0.85)
+                out[i] = int(128 + 100 * math.sin(r / 2.2))
+            i += 1
+    return bytes(out)
+
+
+def load_frames(path: str, limit: int = 4096) -> list:
+    """Load recorded frames from a frame archive or a directory of .raw or 8-bit .bmp files."""
+    if any(entry.endswith(".frames") for entry in os.listdir(path)):
+        from finger_device.archive import FrameArchive
+        with FrameArchive(path, readonly=True) as archive:
+            return [archive.frame(i).tobytes() for i in archive.index()[0][:limit]]
+    frames = []
+    for entry in sorted(os.listdir(path)):
+        full = os.path.join(path, entry)
+        ext = os.path.splitext(entry)[1].lower()
+        if ext not in (".raw", ".bmp"):
+            continue
+        with open(full, "rb") as f:
+            blob = f.read()
+        frame = decode_bmp(blob).tobytes() if ext == ".bmp" else blob
+        if len(frame) == IMAGE_BYTES:
+            frames.append(frame)
+    return frames
+
+
+def make_backend(kind: str = None, device_index: int = 0, dll=None) -> SensorBackend:
+    """Build a backend by name ("dll" or "sim").
+
+    Defaults to the FINGERPRINT_BACKEND environment variable, then "dll".
+    The simulated backend replays frames from FINGERPRINT_SIM_FRAMES when set.
+    `device_index` picks one of several attached readers; pass a loaded
+    `dll` to share it between them.
+    """
+    kind = (kind or os.environ.get("FINGERPRINT_BACKEND") or "dll").lower()
+    if kind == "dll":
+        return DllBackend(dll, device_index=device_index)
+    if kind == "sim":
+        frames_dir = os.environ.get("FINGERPRINT_SIM_FRAMES")
+        frames = load_frames(frames_dir) if frames_dir else None
+        return SimulatedBackend(
+            frames=frames,
+            finger_delay=float(os.environ.get("FINGERPRINT_SIM_DELAY", "0.5")),
+            seed=device_index,
+        )
+    raise ValueError(f"Unknown fingerprint backend: {kind}")
+
+
+def count_readers(kind: str = None) -> tuple:
+    """(number of attached readers, shared dll or None) for make_backend.
+
+    The simulated backend reports FINGERPRINT_SIM_READERS readers (default 1).
+    """
+    kind = (kind or os.environ.get("FINGERPRINT_BACKEND") or "dll").lower()
+    if kind == "sim":
+        return int(os.environ.get("FINGERPRINT_SIM_READERS", "1")), None
+    dll = DllBackend._load_vendor_dll(DllBackend.DLL_NAME)
+    return DllBackend.count_readers(dll), dll
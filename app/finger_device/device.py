@@ -1,163 +1,183 @@
 import os
 import time
-import ctypes
-import requests
-from ctypes import byref, c_int, c_uint, c_ubyte, c_char_p, c_void_p
-from datetime import datetime
+from ctypes import c_int
+from finger_device.backend import SensorBackend, make_backend
+from finger_device.framepool import Frame, FramePool, FramePoolExhausted
+from finger_device.polling import AdaptivePoller, CancelToken, CaptureCancelled
+from imaging.encoder import encode_bmp
+from metrics import record_span, span
 
 
 class Device:
-    DLL_NAME = "SynoAPIEx.dll"
     DEFAULT_ADDR = 0xFFFFFFFF
     TIMEOUT_SECONDS = 30
     OUTPUT_DIR = "fingerprint/normal"
+    ARCHIVE_DIR = "fingerprint/archive"
 
     # Constants
     DEVICE_USB, DEVICE_COM, DEVICE_UDISK = 0, 1, 2
     PS_OK, PS_COMM_ERR, PS_NO_FINGER = 0x00, 0x01, 0x02
     IMAGE_X, IMAGE_Y = 256, 288
     IMAGE_BYTES = IMAGE_X * IMAGE_Y
+    FRAME_POOL_SIZE = 8
+    HEALTH_CHECK_INTERVAL = 5.0      # ping the sensor before a capture after this much idle time
+    FRAME_WAIT_SECONDS = 5.0         # give up when no pooled buffer is released within this
 
-    def __init__(self):
-        """Initialize the device and load the DLL."""
+    def __init__(self, backend: SensorBackend = None, poller: AdaptivePoller = None):
+        """Initialize the device on the given backend (vendor DLL by default)."""
         os.makedirs(self.OUTPUT_DIR, exist_ok=True)
-        self.dll = self._load_vendor_dll(self.DLL_NAME)
-        self._set_signatures()
+        self.backend = backend if backend is not None else make_backend()
         self.handle = None
+        self.poller = poller if poller is not None else AdaptivePoller()
+        self.frames = FramePool(self.FRAME_POOL_SIZE, self.IMAGE_BYTES, self.IMAGE_X, self.IMAGE_Y)
+        self.open_seconds = 0.0
+        self._last_ok = 0.0
+        self._archive = None
         self.open_device()
 
-    # ===== DLL Handling =====
-    def _load_vendor_dll(self, name: str) -> ctypes.CDLL:
-        here = os.path.dirname(os.path.abspath(__file__))
-        candidate = os.path.join(here, name)
-        return ctypes.WinDLL(candidate if os.path.isfile(candidate) else name)
-
-    def _set_signatures(self):
-        dll = self.dll
-        HANDLE = c_void_p
-
-        dll.PSOpenDeviceEx.argtypes = [ctypes.POINTER(HANDLE), c_int, c_int, c_int, c_int, c_int]
-        dll.PSOpenDeviceEx.restype = c_int
-
-        dll.PSAutoOpen.argtypes = [ctypes.POINTER(HANDLE), ctypes.POINTER(c_int), c_int, c_uint, c_int]
-        dll.PSAutoOpen.restype = c_int
-
-        dll.PSGetUSBDevNum.argtypes = [ctypes.POINTER(c_int)]
-        dll.PSGetUSBDevNum.restype = c_int
-
-        dll.PSGetUDiskNum.argtypes = [ctypes.POINTER(c_int)]
-        dll.PSGetUDiskNum.restype = c_int
-
-        dll.PSCloseDeviceEx.argtypes = [HANDLE]
-        dll.PSCloseDeviceEx.restype = c_int
-
-        dll.PSGetImage.argtypes = [HANDLE, c_int]
-        dll.PSGetImage.restype = c_int
-
-        dll.PSUpImage.argtypes = [HANDLE, c_int, ctypes.POINTER(c_ubyte), ctypes.POINTER(c_int)]
-        dll.PSUpImage.restype = c_int
-
-        dll.PSImgData2BMP.argtypes = [ctypes.POINTER(c_ubyte), c_char_p]
-        dll.PSImgData2BMP.restype = c_int
-
-        dll.PSErr2Str.argtypes = [c_int]
-        dll.PSErr2Str.restype = ctypes.c_char_p
-
     # ===== Device Opening =====
     def open_device(self):
         """Try to open the fingerprint device."""
-        usb_n = c_int(0)
-        self.dll.PSGetUSBDevNum(byref(usb_n))
-        udisks = c_int(0)
-        self.dll.PSGetUDiskNum(byref(udisks))
-
+        t0 = time.perf_counter()
+        self.handle = self.backend.open()
+        self.open_seconds = time.perf_counter() - t0
+        self._last_ok = time.monotonic()
+        return True
+
+    def reconnect(self):
+        """Drop the handle and open again (the cached transport makes this fast)."""
         try:
-            h, dtype = self._try_PSAutoOpen()
-            self.handle = h
-            return True
+            self.backend.close()
         except Exception:
-            try:
-                h = self._try_USB_explicit()
-                self.handle = h
-                return True
-            except Exception:
-                self.handle = self._try_COM_scan()
-                return True
-
-    def _try_PSAutoOpen(self):
-        h = c_void_p()
-        dtype = c_int(-1)
-        rc = self.dll.PSAutoOpen(byref(h), byref(dtype), self.DEFAULT_ADDR, 0, 1)
-        if rc == self.PS_OK and h:
-            return h, dtype.value
-        raise RuntimeError("PSAutoOpen failed")
-
-    def _try_USB_explicit(self):
-        for nPackageSize in (2, 3, 1, 0, 4):
-            h = c_void_p()
-            rc = self.dll.PSOpenDeviceEx(byref(h), self.DEVICE_USB, 1, 1, nPackageSize, 0)
-            if rc == self.PS_OK and h:
-                return h
-        raise RuntimeError("USB open attempts failed.")
-
-    def _try_COM_scan(self):
-        for com in range(1, 31):
-            for ibaud in (6, 12):
-                h = c_void_p()
-                rc = self.dll.PSOpenDeviceEx(byref(h), self.DEVICE_COM, com, ibaud, 2, 0)
-                if rc == self.PS_OK and h:
-                    return h
-        raise RuntimeError("COM open attempts failed.")
+            pass
+        self.handle = None
+        return self.open_device()
+
+    def ensure_open(self):
+        """Keep one handle across captures; reopen only if it stopped answering."""
+        if not self.handle:
+            self.open_device()
+        elif time.monotonic() - self._last_ok > self.HEALTH_CHECK_INTERVAL:
+            if not self.backend.ping():
+                self.reconnect()
+            self._last_ok = time.monotonic()
 
     def close(self):
         """Close the fingerprint device."""
         if self.handle:
-            self.dll.PSCloseDeviceEx(self.handle)
+            self.backend.close()
             self.handle = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
 
     # ===== Error Helper =====
     def _err_text(self, code: int) -> str:
-        s = self.dll.PSErr2Str(code)
-        return s.decode(errors="ignore") if s else f"Error 0x{code:02X}"
+        return self.backend.err_text(code)
 
     # ===== Fingerprint Capture =====
-    def read_fingerprint(self) -> bytes:
-        """Read fingerprint from the device and return image bytes."""
-        if not self.handle:
-            raise RuntimeError("Device not opened")
-
-        t0 = time.time()
-        while True:
-            rc = self.dll.PSGetImage(self.handle, self.DEFAULT_ADDR)
-            if rc == self.PS_OK:
-                break
-            if rc == self.PS_NO_FINGER:
-                if time.time() - t0 > self.TIMEOUT_SECONDS:
-                    raise TimeoutError("No finger detected within timeout.")
-                time.sleep(0.15)
-                continue
-            raise RuntimeError(f"PSGetImage failed: {self._err_text(rc)}")
-
-        img_buf = (c_ubyte * self.IMAGE_BYTES)()
+    def capture_frame(self, cancel: CancelToken = None, timeout: float = None) -> Frame:
+        """Capture straight into a pooled buffer and return it as a Frame.
+
+        Nothing is copied; call frame.release() (or use `with`) once the
+        preview, encoder or upload is done with it.
+        Pass a CancelToken to abort the wait from another thread.
+        """
+        self.ensure_open()
+        timeout = timeout if timeout is not None else self.TIMEOUT_SECONDS
+        started = time.monotonic()
+        try:
+            detected = self._wait_for_finger(cancel, timeout)
+        except CaptureCancelled:
+            raise
+        except RuntimeError:
+            # A USB glitch shows up as a comm error: reconnect once and carry on
+            if self.backend.ping():
+                raise
+            self.reconnect()
+            detected = self._wait_for_finger(cancel, timeout)
+
+        record_span("device.detect", detected - started)
+
+        frame = self._acquire_frame(cancel)
         img_len = c_int(self.IMAGE_BYTES)
-        rc = self.dll.PSUpImage(self.handle, self.DEFAULT_ADDR, img_buf, byref(img_len))
+        t0 = time.perf_counter()
+        rc = self.backend.up_image(self.DEFAULT_ADDR, frame.buffer, img_len)
+        record_span("device.transfer", time.perf_counter() - t0)
         if rc != self.PS_OK:
+            frame.release()
             raise RuntimeError(f"PSUpImage failed: {self._err_text(rc)}")
+        frame.length = img_len.value
 
-        return bytes(bytearray(img_buf)[:img_len.value])
+        self.poller.record_capture(detected)
+        self._last_ok = time.monotonic()
+        return frame
 
-    def save_fingerprint(self, img_bytes: bytes):
-        """Save fingerprint image to BMP file."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        out_path = os.path.join(self.OUTPUT_DIR, f"fingerprint_{timestamp}.bmp")
-        buf = (c_ubyte * len(img_bytes)).from_buffer_copy(img_bytes)
-        rc = self.dll.PSImgData2BMP(buf, out_path.encode("utf-8"))
-        if rc != self.PS_OK:
-            raise RuntimeError(f"PSImgData2BMP failed: {self._err_text(rc)}")
+    def _wait_for_finger(self, cancel: CancelToken, timeout: float) -> float:
+        return self.poller.wait_for_finger(
+            lambda: self.backend.get_image(self.DEFAULT_ADDR), timeout, cancel, self._err_text
+        )
+
+    def _acquire_frame(self, cancel: CancelToken = None) -> Frame:
+        """Take a pooled buffer, waiting in short slices so a cancel still gets through."""
+        deadline = time.monotonic() + self.FRAME_WAIT_SECONDS
+        while True:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            try:
+                return self.frames.acquire(timeout=min(0.05, max(0.0, deadline - time.monotonic())))
+            except FramePoolExhausted:
+                if time.monotonic() >= deadline:
+                    raise FramePoolExhausted(
+                        f"All {self.frames.size} frame buffers are still in use after {self.FRAME_WAIT_SECONDS:g}s; "
+                        f"a caller is holding frames without releasing them") from None
+
+    def read_fingerprint(self, cancel: CancelToken = None, timeout: float = None) -> bytes:
+        """Read fingerprint from the device and return image bytes."""
+        with span("device.read"):
+            with self.capture_frame(cancel, timeout) as frame:
+                return frame.tobytes()
+
+    def wait_for_lift(self, cancel: CancelToken = None, timeout: float = 5.0) -> bool:
+        """Wait until the finger is lifted, so a retake gets a fresh placement."""
+        return self.poller.wait_for_lift(lambda: self.backend.get_image(self.DEFAULT_ADDR), timeout, cancel)
+
+    def to_bmp(self, img) -> bytes:
+        """Encode a Frame or raw bytes to BMP in memory (no PSImgData2BMP file round trip)."""
+        return encode_bmp(img)
+
+    @property
+    def archive(self):
+        """Raw frame archive under ARCHIVE_DIR, opened on first use."""
+        if self._archive is None:
+            from finger_device.archive import FrameArchive
+            self._archive = FrameArchive(self.ARCHIVE_DIR)
+        return self._archive
+
+    def archive_fingerprint(self, img, user: str = None, quality: float = float("nan")) -> int:
+        """Append a fingerprint image (Frame or bytes) to the raw archive; returns its frame id."""
+        reader = getattr(self.backend, "device_index", 0)
+        with span("device.archive"):
+            return self.archive.append(img, reader=reader, user=user, quality=quality)
+
+    def save_fingerprint(self, img, user: str = None, quality: float = float("nan")) -> str:
+        """Archive a fingerprint image and also write it to OUTPUT_DIR as a BMP; returns the path.
+
+        Kept for callers that want a file; archive_fingerprint() skips the BMP.
+        """
+        return self.export_bmp(self.archive_fingerprint(img, user, quality))
+
+    def export_bmp(self, frame_id: int) -> str:
+        """Write one archived frame to OUTPUT_DIR as a BMP file and return its path."""
+        out_path = os.path.join(self.OUTPUT_DIR, self.archive.BMP_NAME.format(frame_id))
+        with open(out_path, "wb") as f:
+            f.write(self.to_bmp(self.archive.frame(frame_id)))
         return out_path
 
     def send_images_to_server(self, img_bytes: bytes, server_url: str):
         """Send fingerprint image to a server via HTTP POST."""
+        import requests  # only this legacy helper needs it; keeps device import light
+
         try:
             files = {"file": ("fingerprint.bmp", img_bytes, "application/octet-stream")}
             response = requests.post(server_url, files=files)
@@ -165,9 +185,3 @@ class Device:
             return response.json()
         except Exception as e:
             raise RuntimeError(f"Failed to send to server: {e}")
-
-
-# Example usage
-
-
-device = Device()
\ No newline at end of file
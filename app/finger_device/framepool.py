@@ -0,0 +1,96 @@
+import threading
+from collections import deque
+from ctypes import c_ubyte
+
+IMAGE_X, IMAGE_Y = 256, 288
+IMAGE_BYTES = IMAGE_X * IMAGE_Y
+
+
+class FramePoolExhausted(RuntimeError):
+    """Raised when no frame buffer was released within the wait."""
+
+
+class Frame:
+    """A captured image living in a pooled ctypes buffer.
+
+    The pixels are only valid until release(); take a copy with tobytes()
+    if they must outlive the frame. Use it as a context manager to release
+    automatically.
+    """
+
+    __slots__ = ("pool", "buffer", "length", "width", "height", "_released")
+
+    def __init__(self, pool, buffer, width: int = IMAGE_X, height: int = IMAGE_Y):
+        self.pool = pool
+        self.buffer = buffer
+        self.length = len(buffer)
+        self.width = width
+        self.height = height
+        self._released = False
+
+    @property
+    def view(self) -> memoryview:
+        """Zero-copy read-only view of the frame bytes."""
+        return memoryview(self.buffer).cast("B")[:self.length].toreadonly()
+
+    def array(self):
+        """Zero-copy (height, width) uint8 NumPy view of the frame."""
+        import numpy as np
+        arr = np.frombuffer(self.buffer, dtype=np.uint8, count=self.length)
+        if self.length == self.width * self.height:
+            arr = arr.reshape(self.height, self.width)
+        return arr
+
+    def tobytes(self) -> bytes:
+        return bytes(self.view)
+
+    def release(self):
+        """Give the buffer back to the pool (idempotent)."""
+        if not self._released:
+            self._released = True
+            if self.pool is not None:
+                self.pool._put(self.buffer)
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FramePool:
+    """Fixed ring of preallocated ctypes frame buffers.
+
+    Buffers are allocated once and recycled, so steady-state capture does no
+    per-frame allocation. acquire() blocks while every buffer is in use,
+    which also bounds how many frames can be in flight.
+    """
+
+    def __init__(self, size: int = 8, frame_bytes: int = IMAGE_BYTES,
+                 width: int = IMAGE_X, height: int = IMAGE_Y):
+        self.size = size
+        self.frame_bytes = frame_bytes
+        self.width, self.height = width, height
+        self._free = deque((c_ubyte * frame_bytes)() for _ in range(size))
+        self._cond = threading.Condition()
+
+    @property
+    def available(self) -> int:
+        with self._cond:
+            return len(self._free)
+
+    def acquire(self, timeout: float = None) -> Frame:
+        """Take a free buffer, waiting up to `timeout` seconds for one."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout):
+                raise FramePoolExhausted(f"No free frame buffer within {timeout}s (pool size {self.size})")
+            buf = self._free.popleft()
+        return Frame(self, buf, self.width, self.height)
+
+    def _put(self, buf):
+        with self._cond:
+            self._free.append(buf)
+            self._cond.notify()
@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from finger_device.backend import count_readers, make_backend
+from finger_device.device import Device
+from finger_device.polling import CancelToken, CaptureCancelled
+from metrics import LatencyHistogram
+
+
+class ReaderFrame:
+    """A captured Frame tagged with the reader it came from."""
+
+    __slots__ = ("reader", "frame", "captured_at")
+
+    def __init__(self, reader: int, frame, captured_at: float):
+        self.reader = reader
+        self.frame = frame
+        self.captured_at = captured_at
+
+    def release(self):
+        self.frame.release()
+
+
+class ReaderStats:
+    """Per-reader capture counters and latency."""
+
+    def __init__(self, reader: int):
+        self.reader = reader
+        self.captures = 0
+        self.errors = 0
+        self.dropped = 0
+        self.started = None
+        self.failed = None      # error that stopped the reader's capture thread
+        self.capture_hist = LatencyHistogram(f"reader{reader}_capture")
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            "reader": self.reader,
+            "captures": self.captures,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "per_second": self.captures / elapsed if elapsed else 0.0,
+            "capture": self.capture_hist.summary(),
+        }
+
+
+class DeviceManager:
+    """Opens every attached reader and captures from all of them at once.
+
+    Each reader gets its own Device (handle, poller and frame pool) and,
+    once start() is called, its own capture thread, because a handle must
+    only be used from one thread. Frames from all readers are multiplexed
+    into one queue as ReaderFrame objects, so a slow finger on one reader
+    never holds up the others.
+
+    Args:
+        devices: already opened Devices, keyed by reader id; discovered
+            through the backend (FINGERPRINT_BACKEND) when omitted.
+        queue_size: frames buffered before a reader drops its capture.
+
+    A reader that keeps failing (comm errors, a handle that will not
+    reopen) is retried after a delay that starts at its poller's latency
+    budget and doubles up to ERROR_BACKOFF_MAX. After MAX_CONSECUTIVE_ERRORS
+    failures in a row its thread stops and stats.failed says why. A capture
+    timeout only means nobody touched the sensor and is retried at once.
+    """
+
+    ERROR_BACKOFF_MAX = 5.0
+    MAX_CONSECUTIVE_ERRORS = 10
+
+    def __init__(self, devices: dict = None, queue_size: int = 16):
+        self.devices = devices if devices is not None else self.open_all()
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stats = {reader: ReaderStats(reader) for reader in self.devices}
+        self._cancel = CancelToken()
+        self._threads = []
+
+    @staticmethod
+    def open_all(kind: str = None) -> dict:
+        """Open every reader the backend reports, in parallel; skip the ones that fail."""
+        count, dll = count_readers(kind)
+        if count == 1:
+            return {0: Device(make_backend(kind, 0, dll))}
+        with ThreadPoolExecutor(max_workers=count, thread_name_prefix="open") as pool:
+            futures = {i: pool.submit(lambda i=i: Device(make_backend(kind, i, dll))) for i in range(count)}
+        devices = {}
+        for i, future in futures.items():
+            if future.exception() is None:
+                devices[i] = future.result()
+            else:
+                print(f"Reader {i} failed to open: {future.exception()}")
+        if not devices:
+            raise RuntimeError("No fingerprint reader could be opened.")
+        return devices
+
+    def __len__(self):
+        return len(self.devices)
+
+    def readers(self) -> list:
+        return sorted(self.devices)
+
+    # ===== Continuous capture =====
+    def start(self, lift_timeout: float = 5.0):
+        """Start one capture thread per reader feeding self.frames."""
+        self._cancel = CancelToken()
+        for reader, dev in self.devices.items():
+            t = threading.Thread(target=self._capture_loop, args=(reader, dev, lift_timeout),
+                                 name=f"reader{reader}", daemon=True)
+            self.stats[reader].started = time.monotonic()
+            t.start()
+            self._threads.append(t)
+
+    def _capture_loop(self, reader: int, dev: Device, lift_timeout: float):
+        stats = self.stats[reader]
+        failures = 0
+        while not self._cancel.cancelled:
+            t0 = time.monotonic()
+            try:
+                frame = dev.capture_frame(cancel=self._cancel)
+            except CaptureCancelled:
+                return
+            except TimeoutError:
+                stats.errors += 1
+                failures = 0
+                continue
+            except RuntimeError as e:
+                stats.errors += 1
+                failures += 1
+                if failures >= self.MAX_CONSECUTIVE_ERRORS:
+                    stats.failed = str(e)
+                    print(f"Reader {reader} stopped after {failures} errors in a row: {e}")
+                    return
+                delay = min(dev.poller.latency_budget * 2 ** (failures - 1), self.ERROR_BACKOFF_MAX)
+                if self._cancel.sleep(delay):
+                    return
+                continue
+            failures = 0
+            stats.capture_hist.record(time.monotonic() - t0)
+            try:
+                self.frames.put_nowait(ReaderFrame(reader, frame, time.monotonic()))
+                stats.captures += 1
+            except queue.Full:
+                frame.release()  # the consumer is behind; never stall the sensor
+                stats.dropped += 1
+            try:
+                dev.wait_for_lift(self._cancel, lift_timeout)
+            except CaptureCancelled:
+                return
+
+    def get(self, timeout: float = None) -> ReaderFrame:
+        """Next frame from any reader; raises queue.Empty on timeout."""
+        return self.frames.get(timeout=timeout)
+
+    def stop(self):
+        self._cancel.cancel()
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+        while True:
+            try:
+                self.frames.get_nowait().release()
+            except queue.Empty:
+                break
+
+    def close(self):
+        self.stop()
+        for dev in self.devices.values():
+            dev.close()
+
+    def summary(self) -> list:
+        return [self.stats[reader].summary() for reader in self.readers()]
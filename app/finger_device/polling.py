@@ -0,0 +1,126 @@
+import time
+import threading
+from metrics import LatencyHistogram
+
+PS_OK, PS_NO_FINGER = 0x00, 0x02
+
+
+class CaptureCancelled(RuntimeError):
+    """Raised when a capture is cancelled through its CancelToken."""
+
+
+class CancelToken:
+    """Cancellation flag shared between the caller and a capture loop.
+
+    Sleeping on the token instead of time.sleep means cancel() wakes the
+    capture loop immediately.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def sleep(self, seconds: float) -> bool:
+        """Sleep up to `seconds`; return True if cancelled meanwhile."""
+        return self._event.wait(seconds)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CaptureCancelled("Capture cancelled.")
+
+
+class AdaptivePoller:
+    """Finger-detection poll schedule for PSGetImage.
+
+    Polls every `fast_interval` for `fast_window` seconds after the prompt
+    (the finger usually lands right away), then backs off exponentially by
+    `backoff` up to `latency_budget`, the worst extra delay we accept between
+    the finger landing and us noticing it. `max_polls_per_second` caps the
+    USB traffic (CPU budget) during the fast phase.
+
+    Histograms:
+        wait: prompt to finger detected.
+        detect_to_capture: finger detected to frame bytes available.
+        slack: poll interval in force at detection (upper bound of dead latency).
+    """
+
+    def __init__(self, fast_interval: float = 0.01, fast_window: float = 1.5,
+                 latency_budget: float = 0.15, backoff: float = 1.5,
+                 max_polls_per_second: float = 100.0):
+        self.fast_interval = max(fast_interval, 1.0 / max_polls_per_second if max_polls_per_second else 0.0)
+        self.fast_window = fast_window
+        self.latency_budget = max(latency_budget, self.fast_interval)
+        self.backoff = backoff
+        self.wait_hist = LatencyHistogram("wait")
+        self.detect_hist = LatencyHistogram("detect_to_capture")
+        self.slack_hist = LatencyHistogram("slack")
+        self.polls = 0
+
+    def intervals(self):
+        """Yield successive sleep intervals for one prompt."""
+        elapsed = 0.0
+        interval = self.fast_interval
+        while elapsed < self.fast_window:
+            yield interval
+            elapsed += interval
+        while True:
+            interval = min(interval * self.backoff, self.latency_budget)
+            yield interval
+
+    def wait_for_finger(self, get_image, timeout: float, cancel: CancelToken = None, err_text=None) -> float:
+        """Poll get_image() until a finger is detected; return the detect time.
+
+        Raises TimeoutError after `timeout` seconds, CaptureCancelled when the
+        token is cancelled, and RuntimeError on any other sensor status.
+        """
+        cancel = cancel or CancelToken()
+        t0 = time.monotonic()
+        schedule = self.intervals()
+        interval = 0.0
+        while True:
+            cancel.raise_if_cancelled()
+            rc = get_image()
+            self.polls += 1
+            if rc == PS_OK:
+                detected = time.monotonic()
+                self.wait_hist.record(detected - t0)
+                self.slack_hist.record(interval)
+                return detected
+            if rc != PS_NO_FINGER:
+                text = err_text(rc) if err_text else f"Error 0x{rc:02X}"
+                raise RuntimeError(f"PSGetImage failed: {text}")
+            remaining = timeout - (time.monotonic() - t0)
+            if remaining <= 0:
+                raise TimeoutError("No finger detected within timeout.")
+            interval = next(schedule)
+            if cancel.sleep(min(interval, remaining)):
+                raise CaptureCancelled("Capture cancelled.")
+
+    def wait_for_lift(self, get_image, timeout: float, cancel: CancelToken = None) -> bool:
+        """Poll until the sensor reports no finger; False if it is still there at timeout."""
+        cancel = cancel or CancelToken()
+        t0 = time.monotonic()
+        while get_image() != PS_NO_FINGER:
+            if time.monotonic() - t0 > timeout:
+                return False
+            if cancel.sleep(self.fast_interval * 5):
+                raise CaptureCancelled("Capture cancelled.")
+        return True
+
+    def record_capture(self, detected: float):
+        """Record the detect-to-capture delay for a frame finished now."""
+        self.detect_hist.record(time.monotonic() - detected)
+
+    def stats(self) -> dict:
+        return {
+            "polls": self.polls,
+            "wait": self.wait_hist.summary(),
+            "detect_to_capture": self.detect_hist.summary(),
+            "slack": self.slack_hist.summary(),
+        }
@@ -3,17 +3,26 @@ import time
 import ctypes
 from ctypes import byref, c_int, c_uint, c_ubyte, c_char_p, c_void_p
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from finger_device.polling import AdaptivePoller, CancelToken
+from finger_device.backend import DllBackend
+from finger_device.archive import FrameArchive
 
 # ===== User config =====
 DLL_NAME = "SynoAPIEx.dll"         # Put next to this script or add folder to PATH
 DEFAULT_ADDR = 0xFFFFFFFF          # Default module address
 TIMEOUT_SECONDS = 30               # Wait up to 30s for a finger
+LIFT_TIMEOUT_SECONDS = 10          # Wait up to 10s for the finger to lift between captures
+HEALTH_CHECK_INTERVAL = 5.0        # Ping the sensor before a capture after this much idle time
 
 # ===== Folder for BMP =====
 OUTPUT_DIR = "fingerprint/normal"
 os.makedirs(OUTPUT_DIR, exist_ok=True)  # make folder if not exist
+ARCHIVE_DIR = "fingerprint/archive"     # raw captures; export BMPs with python -m finger_device.archive export
+SAVE_BMP = False                        # also write a BMP per capture through the DLL, as before
 
 number_of_images = 10
+poller = AdaptivePoller()               # tight polling after the prompt, backoff when idle
 # ===== Load DLL safely =====
 def load_vendor_dll(name: str) -> ctypes.CDLL:
     try:
@@ -72,32 +81,7 @@ def close_device(h: HANDLE):
         dll.PSCloseDeviceEx(h)
 
 # ===== Open helpers =====
-def try_PSAutoOpen() -> tuple[HANDLE, int]:
-    h = HANDLE()
-    dtype = c_int(-1)
-    rc = dll.PSAutoOpen(byref(h), byref(dtype), DEFAULT_ADDR, 0, 1)
-    if rc == PS_OK and h:
-        return h, dtype.value
-    raise RuntimeError(f"PSAutoOpen failed: {err_text(rc)}")
-
-def try_USB_explicit() -> HANDLE:
-    for nPackageSize in (2, 3, 1, 0, 4):
-        h = HANDLE()
-        rc = dll.PSOpenDeviceEx(byref(h), DEVICE_USB, 1, 1, nPackageSize, 0)
-        if rc == PS_OK and h:
-            print(f"[USB] Open OK with nPackageSize={nPackageSize}")
-            return h
-    raise RuntimeError("USB open attempts failed.")
-
-def try_COM_scan() -> HANDLE:
-    for com in range(1, 31):
-        for ibaud in (6, 12):
-            h = HANDLE()
-            rc = dll.PSOpenDeviceEx(byref(h), DEVICE_COM, com, ibaud, 2, 0)
-            if rc == PS_OK and h:
-                print(f"[COM] Open OK on COM{com} @ {ibaud*9600} bps")
-                return h
-    raise RuntimeError("COM open attempts failed.")
+backend = DllBackend(dll)               # cached transport first, parallel COM probe as fallback
 
 def open_device_resilient() -> tuple[HANDLE, str]:
     usb_n = c_int(0)
@@ -107,66 +91,91 @@ def open_device_resilient() -> tuple[HANDLE, str]:
     if dll.PSGetUDiskNum(byref(udisks)) == PS_OK:
         print(f"DLL reports UDISK devices: {udisks.value}")
 
-    try:
-        h, dtype = try_PSAutoOpen()
+    t0 = time.perf_counter()
+    h = backend.open()
+    profile = backend.profile or {}
+    kind = profile.get("type")
+    if kind == "usb":
+        mode = f"USB (nPackageSize={profile['package']})"
+    elif kind == "com":
+        mode = f"COM{profile['port']} @ {profile['baud'] * 9600} bps"
+    else:
+        dtype = profile.get("device_type")
         mode = "USB" if dtype == DEVICE_USB else ("COM" if dtype == DEVICE_COM else f"type={dtype}")
-        print(f"PSAutoOpen succeeded. Mode: {mode}")
-        return h, mode
-    except Exception as e:
-        print(str(e))
-
-    try:
-        h = try_USB_explicit()
-        return h, "USB"
-    except Exception as e:
-        print(str(e))
-
-    h = try_COM_scan()
-    return h, "COM"
+    print(f"Open took {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return h, mode
+
+def ensure_open(h: HANDLE, last_ok: float) -> HANDLE:
+    """Reuse the open handle between captures; after an idle spell, reopen if it stopped answering."""
+    if h and time.monotonic() - last_ok <= HEALTH_CHECK_INTERVAL:
+        return h
+    if h and dll.PSGetImage(h, DEFAULT_ADDR) in (PS_OK, PS_NO_FINGER):
+        return h
+    print("Device not answering, reopening …")
+    close_device(h)
+    backend.handle = None
+    return open_device_resilient()[0]
 
 # ===== Capture helpers =====
-def wait_for_finger_and_capture(h: HANDLE, addr: int, timeout_s: int) -> bytes:
-    t0 = time.time()
-    while True:
-        rc = dll.PSGetImage(h, addr)
-        if rc == PS_OK:
-            break
-        if rc == PS_NO_FINGER:
-            if time.time() - t0 > timeout_s:
-                raise TimeoutError("No finger detected within timeout.")
-            time.sleep(0.15)
-            continue
-        raise RuntimeError(f"PSGetImage failed: {err_text(rc)}")
+def wait_for_finger_and_capture(h: HANDLE, addr: int, timeout_s: int, cancel: CancelToken = None) -> bytes:
+    detected = poller.wait_for_finger(lambda: dll.PSGetImage(h, addr), timeout_s, cancel, err_text)
 
     img_buf = (c_ubyte * IMAGE_BYTES)()
     img_len = c_int(IMAGE_BYTES)
     rc = dll.PSUpImage(h, addr, img_buf, byref(img_len))
     if rc != PS_OK:
         raise RuntimeError(f"PSUpImage failed: {err_text(rc)}")
-    return bytes(bytearray(img_buf)[:img_len.value])
+    poller.record_capture(detected)
+    return bytes(memoryview(img_buf)[:img_len.value])
 
-def save_bmp_via_dll(img_bytes: bytes):
+def save_bmp_via_dll(img_bytes: bytes, index: int = 0):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_path = os.path.join(OUTPUT_DIR, f"fingerprint_{timestamp}.bmp")
+    out_path = os.path.join(OUTPUT_DIR, f"fingerprint_{timestamp}_{index:02d}.bmp")
     buf = (c_ubyte * len(img_bytes)).from_buffer_copy(img_bytes)
     rc = dll.PSImgData2BMP(buf, out_path.encode("utf-8"))
     if rc != PS_OK:
         raise RuntimeError(f"PSImgData2BMP failed: {err_text(rc)}")
     print(f"Saved BMP → {out_path}")
 
+def save_to_archive(archive: FrameArchive, img_bytes: bytes, index: int = 0):
+    frame_id = archive.append(img_bytes)
+    print(f"Archived capture {index:02d} → frame {frame_id} in {ARCHIVE_DIR}")
+    if SAVE_BMP:
+        save_bmp_via_dll(img_bytes, index)
+
 # ===== Main =====
 def main():
     print("Opening fingerprint device …")
     h = None
+    # Saving runs on a writer thread so the next capture starts right away
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-writer")
+    archive = FrameArchive(ARCHIVE_DIR)
+    saves = []
     try:
+        h, mode = open_device_resilient()
+        print(f"Opened in {mode} mode.")
+        last_ok = time.monotonic()
         for i in range(number_of_images):
-            h, mode = open_device_resilient()
-            print(f"Opened in {mode} mode. Place finger on the sensor …")
+            h = ensure_open(h, last_ok)
+            print("Place finger on the sensor …")
             img = wait_for_finger_and_capture(h, DEFAULT_ADDR, TIMEOUT_SECONDS)
             print(f"Captured {len(img)} bytes.")
-            save_bmp_via_dll(img)
-            print("Done.")
+            saves.append(writer.submit(save_to_archive, archive, img, i))
+            if i < number_of_images - 1:
+                # Each sample needs its own placement, not another frame of the same touch
+                print("Lift finger …")
+                if not poller.wait_for_lift(lambda: dll.PSGetImage(h, DEFAULT_ADDR), LIFT_TIMEOUT_SECONDS):
+                    raise RuntimeError(f"Finger not lifted within {LIFT_TIMEOUT_SECONDS}s.")
+            last_ok = time.monotonic()
+        for save in saves:
+            save.result()
+        print("Done.")
+        stats = poller.stats()
+        print(f"Polls: {stats['polls']}, wait p50: {stats['wait']['p50']*1000:.0f} ms, "
+              f"detect-to-capture p99: {stats['detect_to_capture']['p99']*1000:.0f} ms")
     finally:
+        writer.shutdown(wait=True)
+        archive.close()
         close_device(h)
 
 if __name__ == "__main__":
@@ -1,22 +1,59 @@
+import importlib
+import os
+import threading
+from contextlib import nullcontext
 import tkinter as tk
 from tkinter import ttk, messagebox
-from finger_device.device import Device
-from client.client import Client
-from PIL import Image, ImageTk
-import io
-import tempfile
-import os
+from gui.preview import PreviewPanel
+from gui.results import ResultsTable
+from gui.worker import Worker
+from metrics import MetricsExporter, StartupProfile, Trace
 
 class GUI:
-    def __init__(self):
-        self.root = tk.Tk()
+    # Heavy services (numpy, requests, the vendor DLL) are imported and
+    # built on first use or by _warm_up after the window is shown.
+    SERVICES = {
+        "client": ("client.client", "Client"),
+        "edge": ("client.edge", "EdgeVerifier"),
+        "quality_gate": ("imaging.quality", "QualityGate"),
+    }
+    # Spans shown in the status bar breakdown, in pipeline order
+    BREAKDOWN_LABELS = (
+        ("device.detect", "detect"),
+        ("device.transfer", "transfer"),
+        ("quality.score", "quality"),
+        ("edge.extract", "extract"),
+        ("preprocess", "preprocess"),
+        ("codec.encode", "encode"),
+        ("edge.match", "local match"),
+        ("client.match", "upload+match"),
+        ("server.match", "server"),
+    )
+    METRICS_PATH = os.environ.get("FINGERPRINT_METRICS", "fingerprint/metrics.prom")
+    PREVIEW_FPS = float(os.environ.get("FINGERPRINT_PREVIEW_FPS", "10"))
+    RESULT_TOP_K = 25                # closest server matches kept per scan
+
+    def __init__(self, profile: StartupProfile = None):
+        self.profile = profile or StartupProfile()
+        with self.profile.stage("tk root"):
+            self.root = tk.Tk()
         self.root.title("Fingerprint GUI")
         self.root.state("zoomed")  # Full screen
-        self.status = tk.StringVar(value="Ready")
+        self.status = tk.StringVar(value="Starting...")
+        self.breakdown = tk.StringVar(value="")
+        self.exporter = None
         self.max_fingerprints = 10
-        self.registered_images = []
-        self.client = Client()
-        
+        self.enrolled = 0            # captures added to the enrollment session
+        self.worker = Worker(self.root)
+        self.max_retakes = 2
+        self.capture_jobs = []
+        self.live_job = None         # live preview loop, yields its lane to any scan
+        self.devices = None          # DeviceManager, one Device per attached reader
+        self.device_error = None
+        self._services = {}
+        self._services_lock = threading.Lock()
+        self.on_started = None       # called once the device and services are up
+
         # Styles
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -26,16 +63,126 @@ class GUI:
         self.style.configure('TButton', background="#000000", foreground='white', font=('Arial', 11, 'bold'))
         self.style.map('TButton', background=[('active', "#6D6D71")])
 
-        # Initialize fingerprint device
-        try:
-            self.dev = Device()
+        with self.profile.stage("build widgets"):
+            self._build()
+        # Open the device once the first frame has been painted
+        self.root.after_idle(self._start_background_init)
+
+    # ================= Deferred Initialization =================
+    def _service(self, name: str):
+        service = self._services.get(name)
+        if service is None:
+            with self._services_lock:
+                service = self._services.get(name)
+                if service is None:
+                    module, attr = self.SERVICES[name]
+                    with self.profile.stage(name):
+                        service = getattr(importlib.import_module(module), attr)()
+                    self._services[name] = service
+        return service
+
+    @property
+    def client(self):
+        return self._service("client")
+
+    @property
+    def edge(self):
+        return self._service("edge")
+
+    @property
+    def quality_gate(self):
+        return self._service("quality_gate")
+
+    @property
+    def enrollment(self):
+        """Enrollment session that encodes and stages captures as they arrive."""
+        session = self._services.get("enrollment")
+        if session is None:
+            from client.enrollment import EnrollmentSession
+            client, edge = self.client, self.edge
+            with self._services_lock:
+                session = self._services.setdefault("enrollment", EnrollmentSession(client, edge))
+        return session
+
+    @property
+    def outbox(self):
+        """Durable queue that sends registrations (and deferred matches) in the background."""
+        outbox = self._services.get("outbox")
+        if outbox is None:
+            from client.outbox import Outbox
+            client = self.client
+            with self._services_lock:
+                outbox = self._services.get("outbox")
+                if outbox is None:
+                    outbox = Outbox(client, on_delivered=self._on_outbox_delivered,
+                                    on_failed=self._on_outbox_failed,
+                                    on_error=self._on_outbox_error)
+                    self._services["outbox"] = outbox.start()
+        return outbox
+
+    def _start_background_init(self):
+        self.profile.mark("first paint")
+        self.status.set("Opening device...")
+        # On the capture lane, so scans requested meanwhile queue behind the open
+        self.worker.submit(self._open_device_job, lane="capture", name="open device",
+                           on_done=self._on_device_opened, on_error=self._on_device_error)
+        self._warm_job = self.worker.submit(self._warm_up, name="warm up", on_done=self._check_started,
+                                            on_error=lambda e: self._check_started())
+
+    def _open_device_job(self, job):
+        with self.profile.stage("import device"):
+            from finger_device.manager import DeviceManager
+        with self.profile.stage("open device"):
+            # Set here, not in on_done, so captures queued behind this job see it
+            try:
+                self.devices = DeviceManager()
+            except Exception as e:
+                self.device_error = e
+                raise
+        # Reader 0 keeps the "capture" lane; every other reader gets its own
+        for reader in self.devices.readers():
+            if reader:
+                self.worker.add_lane(self._capture_lane(reader))
+        return self.devices.readers()
+
+    def _warm_up(self, job):
+        for name in self.SERVICES:
+            self._service(name)
+        self.enrollment
+        with self.profile.stage("outbox"):
+            self.outbox
+        with self.profile.stage("import numpy"):
+            importlib.import_module("numpy")  # preview downscaling
+        self.exporter = MetricsExporter(self.METRICS_PATH).start()
+
+    def _on_device_opened(self, readers: list):
+        self._start_live()
+        if len(readers) > 1:
+            self.reader_box.config(values=[str(r + 1) for r in readers], state="readonly")
+            self.status.set(f"{len(readers)} readers ready")
+        else:
             self.status.set("Device ready")
-        except Exception as e:
-            self.dev = None
-            self.status.set(f"Device error: {e}")
-            messagebox.showerror("Device Error", str(e))
-        
-        self._build()
+        self._check_started()
+
+    def _on_device_error(self, e: Exception):
+        self.device_error = e
+        self.status.set(f"Device error: {e}")
+        messagebox.showerror("Device Error", str(e))
+        self._check_started()
+
+    def _check_started(self, *_):
+        device_done = self.devices is not None or self.device_error is not None
+        if device_done and self._warm_job.done() and self.on_started:
+            self.profile.mark("ready")
+            callback, self.on_started = self.on_started, None
+            callback()
+
+    def _require_device(self) -> bool:
+        """False (with an error box) when the device failed to open; scans queue while it opens."""
+        if self.device_error is not None:
+            messagebox.showerror("Error", f"Device not available: {self.device_error}")
+            return False
+        return True
 
     def _build(self):
         # Main container with 2 halves
@@ -70,33 +217,65 @@ class GUI:
         self.btn_check_fp = ttk.Button(check_frame, text="Check Fingerprint", command=self.check_fingerprint)
         self.btn_check_fp.pack(pady=20, fill="x")
 
+        # One preview image, redrawn in place for every capture and the live feed
+        self.preview = PreviewPanel(check_frame, self.worker, fps=self.PREVIEW_FPS)
+        self.preview.label.pack(pady=4)
+        self.live_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(check_frame, text=f"Live preview ({self.PREVIEW_FPS:g} fps)",
+                        variable=self.live_var, command=self.toggle_live).pack(pady=4)
+
+        # Results of every scan this session, newest first
+        results_frame = ttk.LabelFrame(main_frame, text="Matches", padding=8)
+        results_frame.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=8, pady=8)
+        main_frame.rowconfigure(1, weight=1)
+        self.results = ResultsTable(results_frame)
+        self.results.pack()
+
         # ---------------- BOTTOM (Status + Exit) ----------------
         bottom_frame = ttk.Frame(self.root, padding=8)
         bottom_frame.pack(fill="x", side="bottom")
         ttk.Label(bottom_frame, text="Status:").pack(side="left")
         ttk.Label(bottom_frame, textvariable=self.status).pack(side="left")
+        ttk.Label(bottom_frame, textvariable=self.breakdown).pack(side="left", padx=16)
         ttk.Button(bottom_frame, text="Exit", command=self.on_exit).pack(side="right")
+        ttk.Button(bottom_frame, text="Cancel Scan", command=self.cancel_scan).pack(side="right", padx=8)
+        self.reader_var = tk.StringVar(value="1")
+        self.reader_box = ttk.Combobox(bottom_frame, textvariable=self.reader_var, values=["1"],
+                                       width=3, state="disabled")
+        self.reader_box.pack(side="right")
+        ttk.Label(bottom_frame, text="Reader:").pack(side="right", padx=(8, 4))
 
     # ================= Fingerprint Functions =================
+    # Captures run on one single-thread lane per reader ("capture" for the
+    # first), encoding and HTTP on the "io" lane; every widget update happens
+    # in on_* callbacks on the Tk thread.
     def add_fingerprint(self):
-        if not self.dev:
-            messagebox.showerror("Error", "Device not available")
+        if not self._require_device():
             return
-        if len(self.registered_images) >= self.max_fingerprints:
+        in_flight = sum(self._scans_pending(r) for r in self._readers())
+        if self.enrolled + in_flight >= self.max_fingerprints:
             messagebox.showwarning("Limit Reached", "You can only register 10 fingerprints.")
             return
-        try:
-            self.status.set("Place finger on sensor...")
-            img_bytes = self.dev.read_fingerprint()
-            self.registered_images.append(img_bytes)
-            self.fp_status.config(text=f"{len(self.registered_images)} / {self.max_fingerprints} fingerprints added")
-            self.status.set("Fingerprint captured")
-        except Exception as e:
-            self.status.set(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
+        self.status.set("Place finger on sensor...")
+        trace = Trace("gui.enroll_capture")
+        self._start_capture(self._capture_enrollment, trace=trace,
+                            on_done=lambda duplicate: self._on_fingerprint_added(duplicate, trace))
+
+    def _on_fingerprint_added(self, duplicate=None, trace: Trace = None):
+        if trace is not None:
+            self._show_breakdown(trace)
+        if duplicate is not None:
+            self.status.set(f"Not added: {duplicate}")
+            return
+        self.enrolled += 1
+        self._update_fp_status()
+        self.status.set("Fingerprint captured")
+
+    def _update_fp_status(self):
+        self.fp_status.config(text=f"{self.enrolled} / {self.max_fingerprints} fingerprints added")
 
     def register_user(self):
-        if not self.registered_images:
+        if not self.enrolled:
             messagebox.showwarning("No Data", "Please add at least 1 fingerprint.")
             return
         name = self.entry_name.get().strip()
@@ -104,94 +283,280 @@ class GUI:
         if not name or not email:
             messagebox.showwarning("Missing Data", "Name and Email are required.")
             return
-        temp_files = []
+        self.btn_register_user.state(["disabled"])
+        self.worker.submit(
+            self._register_job, email, name,
+            name="register",
+            on_progress=self.status.set,
+            on_done=self._on_registered,
+            on_error=self._on_registration_error,
+        )
+
+    def _register_job(self, job, email: str, name: str):
+        # Captures were encoded (and staged, if the server supports it) as they
+        # arrived; this only waits for the last one and commits the rest to
+        # the outbox, which sends it in the background.
+        job.progress("Saving registration...")
+        return self.enrollment.queue(self.outbox, email, name)
+
+    def _on_registered(self, result):
+        _, submitted = result
+        self.btn_register_user.state(["!disabled"])
+        pending = self.outbox.pending()
+        self.status.set(f"Registration saved ✅ ({pending} waiting to be sent)")
+        messagebox.showinfo("Success", "Registration saved. It is sent to the server in the background.")
+        # Keep captures taken while the registration was being saved
+        self.enrolled -= submitted
+        self._update_fp_status()
+
+    def _on_outbox_delivered(self, item, body):
+        # Runs on the outbox flusher thread
+        if item.kind == "register":
+            user = (body or {}).get("user")
+            if not user:
+                self._on_outbox_failed(item, (body or {}).get("message", "Unknown error"))
+                return
+            from client.edge import unpack_template
+            m = item.meta
+            self.edge.enroll_templates({"name": m["name"], "email": m["email"], **user},
+                                       [unpack_template(t) for t in item.parts.get("template", [])])
+            self.worker.call_soon(self.status.set, f"{m['email']} registered on the server ✅")
+        else:
+            self.worker.call_soon(self._on_deferred_match, body)
+
+    def _on_outbox_failed(self, item, error: str):
+        what = item.meta["email"] if item.kind == "register" else "a queued scan"
+        self.worker.call_soon(self._on_error, RuntimeError(f"Server rejected {what}: {error}"))
+
+    def _on_outbox_error(self, e: Exception):
+        # The flusher retries every second, so report in the status line, not a dialog
+        self.worker.call_soon(self.status.set, f"Outbox error: {e}")
+
+    def _on_deferred_match(self, response):
+        if response:
+            self.results.add(response, label="(queued)")
+        best = (response or {}).get("best_match")
+        if best:
+            self.status.set(f"Queued scan matched: {best['user']['name']} ({best['distance']:.2f})")
+        else:
+            self.status.set("Queued scan: no match found ❌")
+
+    def _on_registration_error(self, e: Exception):
+        self.btn_register_user.state(["!disabled"])
+        self._on_error(e)
+
+    def check_fingerprint(self):
+        if not self._require_device():
+            return
+        if self._scans_pending(self._selected_reader()):
+            self.status.set("A scan is already in progress...")
+            return
+        self.status.set("Place finger for verification...")
+        trace = Trace("gui.verify")
+        self._start_capture(self._capture_checked, trace=trace,
+                            on_done=lambda frame: self._on_verify_captured(frame, trace))
+
+    def _on_verify_captured(self, frame, trace: Trace = None):
+        # The preview was already drawn from the capture lane
+        self.status.set("Verifying fingerprint...")
+        # Upload runs on the io lane, so the next scan can start right away
+        self.worker.submit(
+            self._verify_job, frame, trace,
+            name="verify",
+            on_done=lambda response: self._show_matches(response, trace),
+            on_error=self._on_error,
+        )
+
+    def _verify_job(self, job, frame, trace: Trace = None):
+        with trace.activate() if trace is not None else nullcontext():
+            return self._verify(frame)
+
+    def _verify(self, frame):
         try:
-            self.status.set("Preparing images...")
-            for i, img_bytes in enumerate(self.registered_images):
-                width, height = 256, 256
-                img = Image.frombytes("L", (width, height), img_bytes)
-                tmp = tempfile.NamedTemporaryFile(suffix=".bmp", delete=False)
-                img.save(tmp.name, format="BMP")
-                tmp.flush()
-                temp_files.append(tmp)
-            files = [
-                ('files', (f'fingerprint_{i+1}.bmp', open(tmp.name, 'rb'), 'image/bmp'))
-                for i, tmp in enumerate(temp_files)
-            ]
-            self.status.set("Sending data to server...")
-            response = self.client.register_user(email, name, [f[1][1].read() for f in files])
-            for _, file_tuple in files:
-                file_tuple[1].close()
-            if response and response.get("user"):
-                self.status.set("User registered successfully ✅")
-                messagebox.showinfo("Success", "User registered successfully.")
-                self.registered_images.clear()
-                self.fp_status.config(text="0 / 10 fingerprints added")
-            else:
-                self.status.set("Registration failed ❌")
-                messagebox.showerror("Error", response.get("message", "Unknown error"))
-        except Exception as e:
-            self.status.set(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
+            template = self.edge.extract(frame)
+            codec, payload, geometry = self.client.encode_image(frame, frame.width, frame.height)
         finally:
-            for tmp in temp_files:
-                try:
-                    tmp.close()
-                    os.unlink(tmp.name)
-                except Exception:
-                    pass
+            frame.release()
+        unreachable = []
 
-    def check_fingerprint(self):
-        if not self.dev:
-            messagebox.showerror("Error", "Device not available")
+        def ask_server(candidates):
+            from requests.exceptions import RequestException
+            try:
+                return self.client.check_fingerprint(payload, codec, candidates=candidates,
+                                                     top_k=self.RESULT_TOP_K, **geometry)
+            except RequestException:
+                unreachable.append(True)
+                raise
+
+        # Answered locally when the edge matcher is confident, else by the server
+        response = self.edge.verify(template, ask_server)
+        if unreachable:
+            # Keep the scan; the server's answer follows when it is back
+            response = response or {"matching": [], "best_match": None}
+            response["deferred"] = self.outbox.put_verification(payload, codec, **geometry)
+        return response
+
+    def _show_matches(self, response, trace: Trace = None):
+        if trace is not None:
+            self._show_breakdown(trace)
+        if response is None:
+            self.status.set("Verification failed ❌")
+            return
+        if response.get("deferred") and not response.get("matching"):
+            self.status.set("Server unreachable, scan queued; the result will follow")
             return
+        self.results.add(response)
+        best = response.get("best_match")
+        if best:
+            source = " [local]" if response.get("source") == "edge" else ""
+            self.status.set(
+                f"Best match: {best['user']['name']} ({best['distance']:.2f}){source}"
+            )
+        else:
+            self.status.set("No match found ❌")
+
+    # ================= Background Helpers =================
+    def _capture_checked(self, job, reader: int = 0):
+        """Capture until a frame passes the quality gate (runs on the reader's lane).
+
+        Poor frames are retaken locally instead of costing a server round trip.
+        """
+        if self.devices is None:
+            raise RuntimeError(f"Device not available: {self.device_error}")
+        dev = self.devices.devices[reader]
+        for attempt in range(self.max_retakes + 1):
+            frame = dev.capture_frame(cancel=job.cancel_token)
+            self.preview.offer(frame, force=True)
+            report = self.quality_gate.score(frame)
+            if report.ok:
+                return frame
+            frame.release()
+            if attempt < self.max_retakes:
+                job.progress(f"Poor capture ({', '.join(report.reasons)}), lift and place finger again...")
+                dev.wait_for_lift(job.cancel_token)
+        raise RuntimeError(f"Capture rejected: {', '.join(report.reasons)}")
+
+    def _capture_enrollment(self, job, reader: int = 0):
+        """Add one capture to the session; returns the DuplicateCapture if it was dropped."""
+        from client.enrollment import DuplicateCapture
+        # The pooled frame goes straight to the session, which releases it once encoded
         try:
-            self.status.set("Place finger for verification...")
-            img_bytes = self.dev.read_fingerprint()
-            width, height = 256, 288
-            img = Image.frombytes("L", (width, height), img_bytes)
-            img_tk = ImageTk.PhotoImage(img.resize((150, 170)))
-            top_img = tk.Toplevel(self.root)
-            top_img.title("Scanned Fingerprint")
-            tk.Label(top_img, image=img_tk).pack()
-            top_img.image = img_tk
-            with tempfile.NamedTemporaryFile(suffix=".bmp", delete=False) as tmp:
-                img.save(tmp.name, format="BMP")
-                bmp_path = tmp.name
-            with open(bmp_path, "rb") as f:
-                response = self.client.check_fingerprint(f.read())
-            print(response)
-            table_win = tk.Toplevel(self.root)
-            table_win.title("Fingerprint Matches")
-            table_win.geometry("500x300")
-            cols = ("Name", "Email", "Distance", "Match" , "Matching Time")
-            tree = ttk.Treeview(table_win, columns=cols, show="headings")
-            for col in cols:
-                tree.heading(col, text=col)
-                tree.column(col, width=100, anchor="center")
-            tree.pack(fill="both", expand=True)
-            for match in response.get("matching", []):
-                user = match.get("user", {})
-                name = user.get("name", "N/A")
-                email = user.get("email", "N/A")
-                dist = round(float(match.get("distance", 0)), 2)
-                is_match = "✅" if dist < 50 else "❌"
-                matching_time = match.get("matching_time", "N/A")
-                tree.insert("", "end", values=(name, email, dist, is_match , matching_time))
-            best = response.get("best_match")
-            if best:
-                self.status.set(
-                    f"Best match: {best['user']['name']} ({best['distance']:.2f})"
-                )
-            else:
-                self.status.set("No match found ❌")
-        except Exception as e:
-            self.status.set(f"Error: {e}")
-            messagebox.showerror("Error", str(e))
+            self.enrollment.add(self._capture_checked(job, reader))
+        except DuplicateCapture as e:
+            return e
+        return None
+
+    def toggle_live(self):
+        if self.live_var.get():
+            self._start_live()
+        else:
+            self._stop_live()
+
+    def _start_live(self):
+        """Run the live feed on the selected reader's lane while no scan needs it."""
+        if not self.live_var.get() or self.devices is None:
+            return
+        if self.live_job is not None and not self.live_job.done():
+            return
+        reader = self._selected_reader()
+        if self.worker.pending(self._capture_lane(reader)):
+            return
+        self.live_job = self.worker.submit(self._live_job, reader, lane=self._capture_lane(reader), name="live",
+                                           on_error=lambda e: self.status.set(f"Live preview stopped: {e}"))
+
+    def _live_job(self, job, reader: int):
+        dev = self.devices.devices[reader]
+        interval = 1.0 / self.PREVIEW_FPS if self.PREVIEW_FPS else 0.0
+        while not job.cancelled:
+            try:
+                frame = dev.capture_frame(cancel=job.cancel_token, timeout=1.0)
+            except TimeoutError:
+                continue
+            try:
+                self.preview.offer(frame)
+            finally:
+                frame.release()
+            if job.cancel_token.sleep(interval):
+                break
+
+    def _stop_live(self):
+        job, self.live_job = self.live_job, None
+        if job is not None:
+            job.cancel()
+
+    def _scans_pending(self, reader: int) -> int:
+        """Scans queued or running on a reader, not counting the live feed."""
+        lane = self._capture_lane(reader)
+        live = self.live_job is not None and not self.live_job.done() and self.live_job.lane == lane
+        return self.worker.pending(lane) - live
+
+    def _readers(self) -> list:
+        return self.devices.readers() if self.devices is not None else [0]
+
+    def _selected_reader(self) -> int:
+        return int(self.reader_var.get()) - 1
+
+    @staticmethod
+    def _capture_lane(reader: int) -> str:
+        return "capture" if reader == 0 else f"capture{reader}"
+
+    def _show_breakdown(self, trace: Trace):
+        """Put the last operation's per-stage times in the status bar."""
+        total = trace.finish()
+        spans = trace.breakdown()
+        parts = [f"{label} {spans[name] * 1000:.0f} ms" for name, label in self.BREAKDOWN_LABELS if name in spans]
+        self.breakdown.set(" · ".join(parts + [f"total {total * 1000:.0f} ms"]))
+
+    def _start_capture(self, fn, on_done, trace: Trace = None):
+        reader = self._selected_reader()
+        self._stop_live()  # the scan takes the sensor; the feed resumes when it is over
+        if trace is not None:
+            inner = fn
+
+            def fn(job, reader):
+                with trace.activate():
+                    return inner(job, reader)
+
+        on_progress = self.status.set
+        if len(self._readers()) > 1:
+            on_progress = lambda msg: self.status.set(f"Reader {reader + 1}: {msg}")
+        job = self.worker.submit(
+            fn, reader,
+            lane=self._capture_lane(reader),
+            name="capture",
+            on_progress=on_progress,
+            on_done=self._then_live(on_done),
+            on_error=self._then_live(self._on_error),
+            on_cancel=self._then_live(lambda: self.status.set("Scan cancelled")),
+        )
+        self.capture_jobs = [j for j in self.capture_jobs if not j.done()] + [job]
+
+    def _then_live(self, callback):
+        """Wrap a scan callback so the live feed resumes once the scan is over."""
+        def wrapped(*args):
+            try:
+                callback(*args)
+            finally:
+                self.root.after_idle(self._start_live)
+        return wrapped
+
+    def cancel_scan(self):
+        for job in self.capture_jobs:
+            job.cancel()
+        self.capture_jobs = []
+
+    def _on_error(self, e: Exception):
+        self.status.set(f"Error: {e}")
+        messagebox.showerror("Error", str(e))
 
     def on_exit(self):
-        if self.dev:
-            self.dev.close()
+        self.worker.shutdown()
+        if "outbox" in self._services:
+            self._services["outbox"].close()
+        if self.exporter is not None:
+            self.exporter.stop()
+        if self.devices:
+            self.devices.close()
         self.root.quit()
 
     def run(self):
@@ -0,0 +1,82 @@
+import threading
+import time
+import tkinter as tk
+
+
+def downscale(img, factor: int, width: int = 256, height: int = 288):
+    """Box-filter a frame (Frame, bytes or array) down by an integer factor with NumPy."""
+    import numpy as np
+    from imaging.encoder import as_gray_array
+    arr = as_gray_array(img, width, height)
+    if factor <= 1:
+        return arr
+    h, w = arr.shape[0] // factor, arr.shape[1] // factor
+    # Summing the factor**2 strided views is ~10x faster than reshape().sum()
+    # or mean(); uint16 holds the sums for factors up to 16
+    acc = np.zeros((h, w), dtype=np.uint16)
+    for dy in range(factor):
+        for dx in range(factor):
+            acc += arr[dy:h * factor:factor, dx:w * factor:factor]
+    acc //= factor * factor
+    return acc.astype(np.uint8)
+
+
+def to_pgm(arr) -> bytes:
+    """Binary PGM bytes, which Tk's PhotoImage decodes natively (no PIL round trip)."""
+    return b"P5 %d %d 255\n" % (arr.shape[1], arr.shape[0]) + arr.tobytes()
+
+
+class PreviewPanel:
+    """Embedded preview that redraws one PhotoImage in place.
+
+    offer() may be called from any thread while the frame is still alive: it
+    downscales the frame right away (so the caller can release it) and hands
+    the bytes to the Tk thread, at most `fps` times per second. If the Tk
+    thread falls behind, only the newest frame is drawn.
+
+    Args:
+        parent: Tk container to place the panel in.
+        worker: Worker whose call_soon delivers updates to the Tk thread.
+        factor: integer downscale factor (2 gives 128x144 for the 256x288 sensor).
+        fps: live feed rate limit.
+    """
+
+    def __init__(self, parent, worker, factor: int = 2, fps: float = 10.0, width: int = 256, height: int = 288):
+        self.worker = worker
+        self.factor = factor
+        self.fps = fps
+        self.photo = tk.PhotoImage(width=width // factor, height=height // factor)
+        self.label = tk.Label(parent, image=self.photo, background="#000000")
+        self._lock = threading.Lock()
+        self._latest = None          # PGM bytes waiting for the Tk thread
+        self._last_offer = 0.0
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def offer(self, frame, force: bool = False) -> bool:
+        """Queue a frame for display; False if the rate limit dropped it."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self.fps and now - self._last_offer < 1.0 / self.fps:
+                self.frames_dropped += 1
+                return False
+            self._last_offer = now
+        data = to_pgm(downscale(frame, self.factor))
+        with self._lock:
+            scheduled = self._latest is not None
+            self._latest = data
+        if not scheduled:
+            self.worker.call_soon(self._draw)
+        return True
+
+    def _draw(self):
+        with self._lock:
+            data, self._latest = self._latest, None
+        if data is not None:
+            self.photo.configure(data=data, format="PPM")
+            self.frames_shown += 1
+
+    def clear(self):
+        with self._lock:
+            self._latest = None
+        self.photo.blank()
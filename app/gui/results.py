@@ -0,0 +1,129 @@
+import time
+from collections import deque
+import tkinter as tk
+from tkinter import ttk
+
+
+class ResultsTable:
+    """Persistent verification log, newest scan first, shown one page at a time.
+
+    Each scan is one row showing its best match. The other candidates are
+    only inserted as child rows when the row is opened, and only the current
+    page of scans exists in the Treeview, so the widget stays the same size
+    however many scans (or candidates per scan) the shift produces. Older
+    scans are kept as plain data, up to `max_scans`.
+    """
+
+    COLUMNS = ("Time", "Name", "Email", "Distance", "Match", "Matching Time", "Source")
+    MATCH_DISTANCE = 50
+    MAX_SCANS = 500
+    PAGE_SIZE = 20
+
+    def __init__(self, parent, max_scans: int = None, page_size: int = None):
+        self.page_size = page_size or self.PAGE_SIZE
+        self.page = 0
+        self._scans = deque(maxlen=max_scans or self.MAX_SCANS)  # (stamp, source, best, others), newest first
+        self._rows = {}              # Treeview row id -> scan record, current page only
+        self._filled = set()         # rows whose candidates have been inserted
+        self._unseen = 0             # scans added while another page was shown
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=self.COLUMNS, show="tree headings", height=12)
+        self.tree.column("#0", width=24, stretch=False)
+        for col in self.COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=90, anchor="center")
+        self.scroll = ttk.Scrollbar(self.frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scroll.set)
+        self.tree.bind("<<TreeviewOpen>>", self._on_open)
+
+        nav = ttk.Frame(parent)
+        self.page_label = tk.StringVar(value="")
+        ttk.Button(nav, text="◀ Newer", command=lambda: self.show_page(self.page - 1)).pack(side="left")
+        ttk.Label(nav, textvariable=self.page_label).pack(side="left", padx=8)
+        ttk.Button(nav, text="Older ▶", command=lambda: self.show_page(self.page + 1)).pack(side="left")
+        self.nav = nav
+
+    def pack(self, **kw):
+        self.nav.pack(side="bottom", fill="x", pady=(4, 0))
+        self.frame.pack(fill="both", expand=True, **kw)
+        self.scroll.pack(side="right", fill="y")
+        self.tree.pack(fill="both", expand=True)
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-len(self._scans) // self.page_size))
+
+    def _values(self, stamp: str, match: dict, source: str) -> tuple:
+        user = match.get("user", {})
+        dist = round(float(match.get("distance", 0)), 2)
+        return (stamp, user.get("name", "N/A"), user.get("email", "N/A"), dist,
+                "✅" if dist < self.MATCH_DISTANCE else "❌", match.get("matching_time", "N/A"), source)
+
+    def add(self, response: dict, label: str = None):
+        """Record one scan's result; drawn at once if the first page is shown."""
+        stamp = time.strftime("%H:%M:%S") + (f" {label}" if label else "")
+        source = "local" if response.get("source") == "edge" else "server"
+        if response.get("deferred") and not response.get("matching"):
+            source = "queued"
+        best = response.get("best_match")
+        others = [m for m in response.get("matching", []) if m != best]
+        scan = (stamp, source, best, others)
+        self._scans.appendleft(scan)
+        if self.page == 0:
+            row = self._insert(scan, 0)
+            self.tree.see(row)
+            children = self.tree.get_children("")
+            for old in children[self.page_size:]:
+                self._rows.pop(old, None)
+                self._filled.discard(old)
+                self.tree.delete(old)
+        else:
+            self._unseen += 1
+        self._update_label()
+
+    def _insert(self, scan: tuple, index) -> str:
+        stamp, source, best, others = scan
+        if best:
+            values = self._values(stamp, best, source)
+        else:
+            values = (stamp, "No match", "", "", "❌", "", source)
+        row = self.tree.insert("", index, values=values)
+        if others:
+            self.tree.insert(row, "end", values=(f"{len(others)} more…",))  # filled in on open
+        self._rows[row] = scan
+        return row
+
+    def _on_open(self, event=None):
+        row = self.tree.focus()
+        scan = self._rows.get(row)
+        if scan is None or row in self._filled:
+            return
+        self._filled.add(row)
+        self.tree.delete(*self.tree.get_children(row))
+        stamp, source, _, others = scan
+        for match in others:
+            self.tree.insert(row, "end", values=self._values("", match, source))
+
+    def show_page(self, page: int):
+        page = min(max(page, 0), self.pages - 1)
+        self.page = page
+        if page == 0:
+            self._unseen = 0
+        self.tree.delete(*self.tree.get_children(""))
+        self._rows.clear()
+        self._filled.clear()
+        start = page * self.page_size
+        for i in range(start, min(start + self.page_size, len(self._scans))):
+            self._insert(self._scans[i], "end")
+        self._update_label()
+
+    def _update_label(self):
+        text = f"Page {self.page + 1} / {self.pages} · {len(self._scans)} scans"
+        if self._unseen:
+            text += f" · {self._unseen} new"
+        self.page_label.set(text)
+
+    def clear(self):
+        self._scans.clear()
+        self.show_page(0)
@@ -0,0 +1,126 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from finger_device.polling import CancelToken, CaptureCancelled
+
+
+class Job:
+    """Handle for one background task: its future, cancel token and progress hook."""
+
+    def __init__(self, worker, name: str, lane: str, on_progress=None):
+        self.worker = worker
+        self.name = name
+        self.lane = lane
+        self.cancel_token = CancelToken()
+        self.future = None
+        self._on_progress = on_progress
+
+    def progress(self, message):
+        """Report progress from the worker thread; delivered on the Tk thread."""
+        if self._on_progress is not None:
+            self.worker.call_soon(self._on_progress, message)
+
+    def cancel(self):
+        self.cancel_token.cancel()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token.cancelled
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+
+class Worker:
+    """Runs blocking capture and network work off the Tk main thread.
+
+    Two lanes: "capture" has a single thread because the sensor handle is not
+    thread-safe, "io" is a small pool for encoding and HTTP so an upload can
+    overlap the next capture. Callbacks are queued and executed on the Tk
+    thread by a periodic after() pump, never from worker threads directly.
+    """
+
+    def __init__(self, root, io_workers: int = 4, poll_ms: int = 15):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._lanes = {
+            "capture": ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture"),
+            "io": ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io"),
+        }
+        self._callbacks = queue.SimpleQueue()
+        self._jobs = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._after_id = self.root.after(self.poll_ms, self._pump)
+
+    def add_lane(self, lane: str, workers: int = 1):
+        """Add a lane, e.g. one single-thread capture lane per extra reader."""
+        with self._lock:
+            if lane not in self._lanes:
+                self._lanes[lane] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=lane)
+
+    def submit(self, fn, *args, lane: str = "io", name: str = None,
+               on_done=None, on_error=None, on_progress=None, on_cancel=None) -> Job:
+        """Run fn(job, *args) on a lane and route the outcome back to Tk.
+
+        on_done(result), on_error(exc) and on_cancel() run on the Tk thread.
+        """
+        job = Job(self, name or getattr(fn, "__name__", "job"), lane, on_progress)
+        with self._lock:
+            self._jobs.add(job)
+        job.future = self._lanes[lane].submit(fn, job, *args)
+        job.future.add_done_callback(lambda f: self._finished(job, f, on_done, on_error, on_cancel))
+        return job
+
+    def _finished(self, job, future, on_done, on_error, on_cancel):
+        with self._lock:
+            self._jobs.discard(job)
+        if future.cancelled():
+            if on_cancel:
+                self.call_soon(on_cancel)
+            return
+        exc = future.exception()
+        if exc is None:
+            if on_done:
+                self.call_soon(on_done, future.result())
+        elif isinstance(exc, CaptureCancelled) or job.cancelled:
+            if on_cancel:
+                self.call_soon(on_cancel)
+        elif on_error:
+            self.call_soon(on_error, exc)
+
+    def call_soon(self, fn, *args):
+        """Schedule fn(*args) on the Tk thread (safe from any thread)."""
+        self._callbacks.put((fn, args))
+
+    def _pump(self):
+        while True:
+            try:
+                fn, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn(*args)
+            except Exception as e:
+                print("Callback error:", e)
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_ms, self._pump)
+
+    def pending(self, lane: str = None) -> int:
+        """Number of unfinished jobs, optionally on one lane."""
+        with self._lock:
+            return sum(1 for j in self._jobs if lane is None or j.lane == lane)
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self):
+        self._closed = True
+        self.cancel_all()
+        for executor in self._lanes.values():
+            executor.shutdown(wait=False, cancel_futures=True)
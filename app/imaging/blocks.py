@@ -0,0 +1,42 @@
+import numpy as np
+
+
+# ===== Block helpers shared by quality, preprocessing and template extraction =====
+def box_mean(a: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over a (2r+1)^2 window via an integral image (edges clamped)."""
+    k = 2 * radius + 1
+    p = np.pad(a, radius + 1, mode="edge").astype(np.float64)
+    s = p.cumsum(0).cumsum(1)
+    total = s[k:, k:] - s[:-k, k:] - s[k:, :-k] + s[:-k, :-k]
+    return (total / (k * k))[:a.shape[0], :a.shape[1]].astype(np.float32)
+
+
+def block_view(a: np.ndarray, block: int) -> np.ndarray:
+    """(rows, cols, block, block) view of the full blocks of a 2-D array."""
+    h, w = (a.shape[0] // block) * block, (a.shape[1] // block) * block
+    return a[:h, :w].reshape(h // block, block, w // block, block).swapaxes(1, 2)
+
+
+def structure_tensor(a: np.ndarray, block: int) -> tuple:
+    """Per-block sums (gxx, gyy, gxy) of central-difference gradient products."""
+    gx = np.zeros_like(a)
+    gy = np.zeros_like(a)
+    gx[:, 1:-1] = a[:, 2:] - a[:, :-2]
+    gy[1:-1, :] = a[2:, :] - a[:-2, :]
+    gxx = block_view(gx * gx, block).sum(axis=(2, 3))
+    gyy = block_view(gy * gy, block).sum(axis=(2, 3))
+    gxy = block_view(gx * gy, block).sum(axis=(2, 3))
+    return gxx, gyy, gxy
+
+
+def block_orientation(a: np.ndarray, block: int, smooth: bool = False) -> np.ndarray:
+    """Block ridge orientation in [0, pi); `smooth` averages 3x3 blocks as doubled-angle vectors."""
+    gxx, gyy, gxy = structure_tensor(a, block)
+    c, s = gxx - gyy, 2 * gxy
+    if smooth:
+        pc, ps = np.pad(c, 1, mode="edge"), np.pad(s, 1, mode="edge")
+        rows, cols = c.shape
+        c = sum(pc[dy:dy + rows, dx:dx + cols] for dy in (0, 1, 2) for dx in (0, 1, 2))
+        s = sum(ps[dy:dy + rows, dx:dx + cols] for dy in (0, 1, 2) for dx in (0, 1, 2))
+    # gradient direction + 90 degrees = ridge direction
+    return (0.5 * np.arctan2(s, c) + np.pi / 2) % np.pi
@@ -0,0 +1,152 @@
+import threading
+import time
+import zlib
+import numpy as np
+from imaging.encoder import ImageEncoder, as_gray_array, IMAGE_X, IMAGE_Y
+from metrics import LatencyHistogram, record_span
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+_local = threading.local()
+
+
+def _encoder(width: int, height: int) -> ImageEncoder:
+    """Per-thread ImageEncoder, since encoders reuse their buffers."""
+    cache = getattr(_local, "encoders", None)
+    if cache is None:
+        cache = _local.encoders = {}
+    enc = cache.get((width, height))
+    if enc is None:
+        enc = cache[(width, height)] = ImageEncoder(width, height)
+    return enc
+
+
+class CodecMetrics:
+    """Bytes-on-wire and encode time for one codec."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.encode_time = LatencyHistogram(f"encode_{name}")
+        self.frames = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, raw: int, wire: int, seconds: float):
+        self.encode_time.record(seconds)
+        with self._lock:
+            self.frames += 1
+            self.raw_bytes += raw
+            self.wire_bytes += wire
+
+    def summary(self) -> dict:
+        return {
+            "codec": self.name,
+            "frames": self.frames,
+            "mean_bytes": self.wire_bytes / self.frames if self.frames else 0,
+            "ratio": self.raw_bytes / self.wire_bytes if self.wire_bytes else 0.0,
+            "encode_p50": self.encode_time.percentile(50),
+            "encode_p99": self.encode_time.percentile(99),
+        }
+
+
+class Codec:
+    """One upload encoding: how to turn a gray frame into a file part."""
+
+    name = "bmp"
+    mime = "image/bmp"
+    ext = "bmp"
+    # Raw codecs need the frame geometry sent alongside the payload
+    needs_geometry = False
+
+    def __init__(self):
+        self.metrics = CodecMetrics(self.name)
+
+    def _encode(self, arr: np.ndarray) -> bytes:
+        return _encoder(arr.shape[1], arr.shape[0]).encode_bmp(arr)
+
+    def encode(self, img, width: int = IMAGE_X, height: int = IMAGE_Y) -> bytes:
+        t0 = time.perf_counter()
+        arr = as_gray_array(img, width, height)
+        payload = self._encode(arr)
+        seconds = time.perf_counter() - t0
+        self.metrics.record(arr.size, len(payload), seconds)
+        record_span("codec.encode", seconds)
+        return payload
+
+    def filename(self, i: int = None) -> str:
+        return f"fingerprint.{self.ext}" if i is None else f"fingerprint_{i + 1}.{self.ext}"
+
+
+class PngCodec(Codec):
+    name = "png"
+    mime = "image/png"
+    ext = "png"
+
+    def _encode(self, arr):
+        return _encoder(arr.shape[1], arr.shape[0]).encode_png(arr)
+
+
+class LossyPngCodec(PngCodec):
+    """PNG of a gray-level-quantized frame.
+
+    quality 100 keeps all 256 levels; lower values keep fewer levels, which
+    compresses much better while the server still receives a plain PNG.
+    """
+
+    name = "png-lossy"
+
+    def __init__(self, quality: int = 50):
+        super().__init__()
+        self.quality = max(1, min(100, quality))
+        levels = 2 + round(self.quality / 100 * 254)
+        step = 256.0 / levels
+        # value -> centre of its quantization bin, as one lookup table
+        self._lut = np.minimum((np.floor(np.arange(256) / step) + 0.5) * step, 255).astype(np.uint8)
+
+    def _encode(self, arr):
+        return super()._encode(self._lut[arr])
+
+
+class Gray8ZlibCodec(Codec):
+    """Raw 8-bit gray rows, Up-filtered and zlib-compressed."""
+
+    name = "gray8+zlib"
+    mime = "application/x-gray8+zlib"
+    ext = "gray.z"
+    needs_geometry = True
+
+    def __init__(self, level: int = 6):
+        super().__init__()
+        self.level = level
+
+    def _filtered(self, arr):
+        out = np.empty_like(arr)
+        out[0] = arr[0]
+        np.subtract(arr[1:], arr[:-1], out=out[1:], dtype=np.uint8, casting="unsafe")
+        return out.tobytes()
+
+    def _encode(self, arr):
+        return zlib.compress(self._filtered(arr), self.level)
+
+
+class Gray8Lz4Codec(Gray8ZlibCodec):
+    """Same filtering as gray8+zlib but LZ4 framed: faster, slightly larger."""
+
+    name = "gray8+lz4"
+    mime = "application/x-gray8+lz4"
+    ext = "gray.lz4"
+
+    def _encode(self, arr):
+        return lz4_frame.compress(self._filtered(arr))
+
+
+def available_codecs(lossy_quality: int = 50) -> dict:
+    """Codecs usable in this process, keyed by name."""
+    codecs = [Codec(), PngCodec(), LossyPngCodec(lossy_quality), Gray8ZlibCodec()]
+    if lz4_frame is not None:
+        codecs.append(Gray8Lz4Codec())
+    return {c.name: c for c in codecs}
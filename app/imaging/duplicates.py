@@ -0,0 +1,116 @@
+import time
+import numpy as np
+from imaging.encoder import as_gray_array, IMAGE_X, IMAGE_Y
+from metrics import record_span
+
+
+class DuplicateCheck:
+    """Outcome of comparing one capture with the ones kept so far."""
+
+    __slots__ = ("score", "index", "shift", "duplicate", "seconds", "descriptor")
+
+    def __init__(self, score: float, index: int, shift: tuple, duplicate: bool, seconds: float, descriptor):
+        self.score = score              # best band-limited phase correlation peak, 1.0 = same image
+        self.index = index              # kept capture it is closest to, -1 if none
+        self.shift = shift              # (dx, dy) to that capture, frame pixels
+        self.duplicate = duplicate
+        self.seconds = seconds
+        self.descriptor = descriptor
+
+    def __repr__(self):
+        return (f"DuplicateCheck(score={self.score:.2f}, index={self.index}, shift={self.shift}, "
+                f"duplicate={self.duplicate})")
+
+
+class DuplicateDetector:
+    """Near-duplicate test for enrollment captures by band-limited phase-only correlation.
+
+    Each capture is reduced to a descriptor once: averaged down by `scale`,
+    Hann-windowed, Fourier transformed, whitened to unit magnitude and
+    restricted to the ridge frequency band. Comparing a new capture with
+    all kept ones is then one batched product and inverse FFT. The height
+    of the correlation peak is 1 for the very same image and around 0.5
+    for the same placement seen through fresh sensor noise, whatever the
+    translation; it falls quickly with rotation, distortion or a different
+    part of the finger (about 0.2), which is the diversity enrollment needs.
+
+    Args:
+        threshold: peak height from which a capture counts as a duplicate.
+        max_shift: only peaks within this translation (frame pixels) count,
+            so a finger slid across the sensor is not a duplicate.
+        scale: downsampling factor before the FFT.
+        band: highest frequency kept, as a fraction of the Nyquist limit.
+    """
+
+    def __init__(self, threshold: float = 0.4, max_shift: int = 24, scale: int = 2, band: float = 0.6,
+                 width: int = IMAGE_X, height: int = IMAGE_Y):
+        self.threshold = threshold
+        self.max_shift = max_shift
+        self.scale = scale
+        self.width = width
+        self.height = height
+        h, w = height // scale, width // scale
+        self._shape = (h, w)
+        self._window = np.outer(np.hanning(h), np.hanning(w)).astype(np.float32)
+        fy = np.fft.fftfreq(h)[:, None] * 2
+        fx = np.fft.rfftfreq(w)[None, :] * 2
+        radius = np.hypot(fx, fy)
+        # Drop the lowest frequencies too: they carry the finger outline and lighting, not ridges
+        self._band = ((radius <= band) & (radius >= 0.05)).astype(np.float32)
+        # Peak of a descriptor correlated with itself, to scale scores to [0, 1]
+        self._unit = float(np.fft.irfft2(self._band, s=self._shape)[0, 0])
+        reach = max_shift // scale
+        near_y = (np.arange(h) <= reach) | (np.arange(h) >= h - reach)
+        near_x = (np.arange(w) <= reach) | (np.arange(w) >= w - reach)
+        self._near = np.outer(near_y, near_x)
+        self._kept = np.empty((0, h, w // 2 + 1), dtype=np.complex64)
+
+    def __len__(self):
+        return len(self._kept)
+
+    def descriptor(self, img) -> np.ndarray:
+        """Whitened, band-limited spectrum of one frame."""
+        s = self.scale
+        h, w = self._shape
+        a = as_gray_array(img, self.width, self.height)[:h * s, :w * s].astype(np.float32)
+        small = a.reshape(h, s, w, s).mean(axis=(1, 3))
+        small -= small.mean()
+        spectrum = np.fft.rfft2(small * self._window)
+        spectrum /= np.maximum(np.abs(spectrum), 1e-6)
+        return (spectrum * self._band).astype(np.complex64)
+
+    def check(self, img) -> DuplicateCheck:
+        """Compare a frame with every kept capture at once (the frame is not kept)."""
+        t0 = time.perf_counter()
+        desc = self.descriptor(img)
+        score, index, shift = 0.0, -1, (0, 0)
+        kept = self._kept   # keep/forget_first/clear swap the array, never write into it
+        if len(kept):
+            corr = np.fft.irfft2(kept.conj() * desc, s=self._shape) / self._unit
+            corr = np.where(self._near, corr, 0.0)
+            flat = corr.reshape(len(corr), -1)
+            peaks = flat.argmax(axis=1)
+            values = flat[np.arange(len(flat)), peaks]
+            index = int(values.argmax())
+            score = float(values[index])
+            dy, dx = np.unravel_index(peaks[index], self._shape)
+            h, w = self._shape
+            shift = (int((dx if dx <= w // 2 else dx - w) * self.scale),
+                     int((dy if dy <= h // 2 else dy - h) * self.scale))
+        seconds = time.perf_counter() - t0
+        record_span("enroll.duplicate_check", seconds)
+        return DuplicateCheck(score, index, shift, score >= self.threshold, seconds, desc)
+
+    def keep(self, check: DuplicateCheck):
+        """Add a checked capture to the set later captures are compared with.
+
+        keep, forget_first and clear are not synchronised; callers serialise them.
+        """
+        self._kept = np.concatenate([self._kept, check.descriptor[None]])
+
+    def forget_first(self, n: int):
+        """Drop the `n` oldest kept captures (e.g. once they were registered)."""
+        self._kept = self._kept[n:]
+
+    def clear(self):
+        self._kept = self._kept[:0]
@@ -0,0 +1,155 @@
+import struct
+import threading
+import zlib
+import numpy as np
+
+IMAGE_X, IMAGE_Y = 256, 288
+
+# 256-entry grayscale palette (B, G, R, reserved)
+_GRAY_PALETTE = np.repeat(np.arange(256, dtype=np.uint8), 4).reshape(256, 4)
+_GRAY_PALETTE[:, 3] = 0
+_GRAY_PALETTE = _GRAY_PALETTE.tobytes()
+
+
+def as_gray_array(img, width: int = IMAGE_X, height: int = IMAGE_Y) -> np.ndarray:
+    """Return a (height, width) uint8 view of a Frame, bytes, memoryview or array."""
+    if hasattr(img, "array") and callable(img.array):
+        arr = img.array()
+    elif isinstance(img, np.ndarray):
+        arr = img
+    else:
+        arr = np.frombuffer(img, dtype=np.uint8)
+    if arr.ndim == 1:
+        if arr.size != width * height:
+            raise ValueError(f"Expected {width * height} pixels, got {arr.size}")
+        arr = arr.reshape(height, width)
+    if arr.dtype != np.uint8:
+        arr = arr.astype(np.uint8)
+    return arr
+
+
+def bmp_header(width: int, height: int) -> bytes:
+    """File header, info header and gray palette of an 8-bit bottom-up BMP."""
+    stride = (width + 3) & ~3
+    offset = 14 + 40 + len(_GRAY_PALETTE)
+    size = offset + stride * height
+    return (
+        struct.pack("<2sIHHI", b"BM", size, 0, 0, offset)
+        + struct.pack("<IiiHHIIiiII", 40, width, height, 1, 8, 0, stride * height, 2835, 2835, 256, 0)
+        + _GRAY_PALETTE
+    )
+
+
+def decode_bmp(blob: bytes) -> np.ndarray:
+    """(height, width) uint8 view of an 8-bit BMP (sensor or encode_bmp output), top row first."""
+    if blob[:2] != b"BM":
+        raise ValueError("Not a BMP file")
+    offset = struct.unpack_from("<I", blob, 10)[0]
+    width, height, _, bpp = struct.unpack_from("<iiHH", blob, 18)
+    if bpp != 8:
+        raise ValueError(f"Only 8-bit BMP files are supported, got {bpp}-bit")
+    stride = (width + 3) & ~3
+    rows = np.frombuffer(blob, dtype=np.uint8, count=stride * abs(height), offset=offset)
+    arr = rows.reshape(abs(height), stride)[:, :width]
+    return arr[::-1] if height > 0 else arr
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+class ImageEncoder:
+    """In-memory 8-bit grayscale BMP/PNG encoder.
+
+    The BMP path flips and pads rows with array operations into a reusable
+    bytearray, so encoding a frame costs one vectorized copy and no disk I/O.
+    One encoder is not thread-safe; give each worker its own.
+    """
+
+    def __init__(self, width: int = IMAGE_X, height: int = IMAGE_Y):
+        self.width, self.height = width, height
+        self.stride = (width + 3) & ~3
+        self.header = bmp_header(width, height)
+        self.bmp_size = len(self.header) + self.stride * height
+        self._buf = bytearray(self.bmp_size)
+        self._buf[:len(self.header)] = self.header
+        self._png_rows = np.zeros((height, width + 1), dtype=np.uint8)
+
+    # ===== BMP =====
+    def encode_bmp_into(self, img, out: bytearray = None) -> memoryview:
+        """Encode into `out` (or the encoder's own buffer) and return a view of it.
+
+        The view is overwritten by the next call that reuses the same buffer.
+        """
+        if out is None:
+            out = self._buf
+        elif len(out) < self.bmp_size:
+            raise ValueError(f"Output buffer needs {self.bmp_size} bytes, got {len(out)}")
+        else:
+            out[:len(self.header)] = self.header
+        arr = as_gray_array(img, self.width, self.height)
+        pixels = np.frombuffer(out, dtype=np.uint8, count=self.stride * self.height,
+                               offset=len(self.header)).reshape(self.height, self.stride)
+        pixels[:, :self.width] = arr[::-1]
+        return memoryview(out)[:self.bmp_size]
+
+    def encode_bmp(self, img) -> bytes:
+        """Encode one frame to BMP bytes."""
+        return bytes(self.encode_bmp_into(img))
+
+    # ===== PNG =====
+    def encode_png(self, img, level: int = 6, up_filter: bool = True) -> bytes:
+        """Encode one frame to an 8-bit grayscale PNG.
+
+        The "Up" filter (difference with the row above) is applied with one
+        array subtraction and usually compresses ridge images better.
+        """
+        arr = as_gray_array(img, self.width, self.height)
+        rows = self._png_rows
+        if up_filter:
+            rows[:, 0] = 2
+            rows[0, 1:] = arr[0]
+            np.subtract(arr[1:], arr[:-1], out=rows[1:, 1:], dtype=np.uint8, casting="unsafe")
+        else:
+            rows[:, 0] = 0
+            rows[:, 1:] = arr
+        ihdr = struct.pack(">IIBBBBB", self.width, self.height, 8, 0, 0, 0, 0)
+        return b"".join((
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", ihdr),
+            _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)),
+            _png_chunk(b"IEND", b""),
+        ))
+
+    # ===== Batch =====
+    def encode_batch(self, images, fmt: str = "bmp") -> list:
+        """Encode a whole enrollment set in one call.
+
+        BMP frames are flipped together into one contiguous buffer with a
+        single array assignment, then sliced per image.
+        """
+        images = list(images)
+        if not images:
+            return []
+        if fmt == "png":
+            return [self.encode_png(img) for img in images]
+        if fmt != "bmp":
+            raise ValueError(f"Unsupported format: {fmt}")
+        n = len(images)
+        stack = np.stack([as_gray_array(img, self.width, self.height) for img in images])
+        out = np.zeros((n, self.bmp_size), dtype=np.uint8)
+        out[:, :len(self.header)] = np.frombuffer(self.header, dtype=np.uint8)
+        pixels = out[:, len(self.header):].reshape(n, self.height, self.stride)
+        pixels[:, :, :self.width] = stack[:, ::-1]
+        return [row.tobytes() for row in out]
+
+
+_local = threading.local()
+
+
+def encode_bmp(img) -> bytes:
+    """Encode one 256x288 frame to BMP with a per-thread shared encoder."""
+    enc = getattr(_local, "encoder", None)
+    if enc is None:
+        enc = _local.encoder = ImageEncoder()
+    return enc.encode_bmp(img)
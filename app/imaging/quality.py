@@ -0,0 +1,97 @@
+import time
+import numpy as np
+from imaging.blocks import block_view, structure_tensor
+from imaging.encoder import as_gray_array, IMAGE_X, IMAGE_Y
+from metrics import record_span
+
+
+class QualityReport:
+    """Capture quality measures for one frame, all in [0, 1]."""
+
+    __slots__ = ("coverage", "contrast", "coherence", "wetness", "dryness", "ok", "reasons", "seconds")
+
+    def __init__(self, coverage, contrast, coherence, wetness, dryness):
+        self.coverage = coverage
+        self.contrast = contrast
+        self.coherence = coherence
+        self.wetness = wetness
+        self.dryness = dryness
+        self.ok = True
+        self.reasons = []
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return (f"QualityReport(coverage={self.coverage:.2f}, contrast={self.contrast:.2f}, "
+                f"coherence={self.coherence:.2f}, wetness={self.wetness:.2f}, "
+                f"dryness={self.dryness:.2f}, ok={self.ok})")
+
+
+class QualityGate:
+    """Vectorized capture-quality scorer and accept/reject gate.
+
+    The frame is cut into `block` x `block` tiles and every measure is
+    computed for all tiles at once with reshapes, so a 256x288 frame scores
+    in a couple of milliseconds:
+
+    - coverage: share of tiles whose gray-level spread says "finger here"
+    - contrast: mean ridge/valley spread of the foreground tiles
+    - coherence: mean gradient orientation coherence of the foreground
+      tiles (1 = clean parallel ridges, 0 = smudge or noise)
+    - wetness: share of foreground pixels that are saturated dark
+    - dryness: share of foreground pixels that are washed-out light
+    """
+
+    def __init__(self, block: int = 16, min_coverage: float = 0.3, min_contrast: float = 0.12,
+                 min_coherence: float = 0.3, max_wetness: float = 0.5, max_dryness: float = 0.5,
+                 foreground_std: float = 12.0, dark_level: int = 40, light_level: int = 215):
+        self.block = block
+        self.min_coverage = min_coverage
+        self.min_contrast = min_contrast
+        self.min_coherence = min_coherence
+        self.max_wetness = max_wetness
+        self.max_dryness = max_dryness
+        self.foreground_std = foreground_std
+        self.dark_level = dark_level
+        self.light_level = light_level
+
+    def score(self, img, width: int = IMAGE_X, height: int = IMAGE_Y) -> QualityReport:
+        t0 = time.perf_counter()
+        a = as_gray_array(img, width, height).astype(np.float32)
+        tiles = block_view(a, self.block)
+        std = tiles.std(axis=(2, 3))
+        fg = std > self.foreground_std
+        coverage = float(fg.mean())
+
+        if not fg.any():
+            report = QualityReport(coverage, 0.0, 0.0, 0.0, 0.0)
+        else:
+            contrast = float(std[fg].mean() / 128.0)
+
+            gxx, gyy, gxy = structure_tensor(a, self.block)
+            energy = gxx + gyy
+            coh = np.sqrt((gxx - gyy) ** 2 + 4 * gxy ** 2) / np.maximum(energy, 1e-6)
+            coherence = float(coh[fg].mean())
+
+            fg_pixels = tiles[fg]
+            n = fg_pixels.size
+            wetness = float((fg_pixels < self.dark_level).sum() / n)
+            dryness = float((fg_pixels > self.light_level).sum() / n)
+            report = QualityReport(coverage, contrast, coherence, wetness, dryness)
+
+        if report.coverage < self.min_coverage:
+            report.reasons.append("finger not fully on the sensor")
+        if report.contrast < self.min_contrast:
+            report.reasons.append("low contrast")
+        if report.coherence < self.min_coherence:
+            report.reasons.append("smudged ridges")
+        if report.wetness > self.max_wetness:
+            report.reasons.append("finger too wet")
+        if report.dryness > self.max_dryness:
+            report.reasons.append("finger too dry")
+        report.ok = not report.reasons
+        report.seconds = time.perf_counter() - t0
+        record_span("quality.score", report.seconds)
+        return report
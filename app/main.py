@@ -1,8 +1,39 @@
 # main.py
-from gui.gui import GUI
+import time
+_T0 = time.perf_counter()
 
-def main():
-    GUI().run()
+import argparse
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fingerprint GUI")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import/init time per startup stage, then exit")
+    parser.add_argument("--startup-budget", type=float, default=None, metavar="SECONDS",
+                        help="with --profile-startup, exit 1 if the first paint is later than this")
+    args = parser.parse_args(argv)
+
+    from metrics import StartupProfile
+    profile = StartupProfile(origin=_T0)
+    with profile.stage("import gui"):
+        from gui.gui import GUI
+    app = GUI(profile=profile)
+
+    exit_code = 0
+    if args.profile_startup:
+        def report():
+            nonlocal exit_code
+            print(profile.report())
+            first_paint = profile.elapsed("first paint")
+            if args.startup_budget is not None and first_paint > args.startup_budget:
+                print(f"First paint {first_paint * 1000:.0f} ms is over the "
+                      f"{args.startup_budget * 1000:.0f} ms budget", file=sys.stderr)
+                exit_code = 1
+            app.on_exit()
+        app.on_started = report
+    app.run()
+    return exit_code
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
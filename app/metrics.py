@@ -0,0 +1,295 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """Thread-safe log-bucketed latency histogram (values in seconds).
+
+    Buckets grow geometrically from `min_value` to `max_value`, so memory is
+    fixed and percentiles are accurate to about one bucket width (~10%).
+    """
+
+    def __init__(self, name: str, min_value: float = 0.0001, max_value: float = 120.0, growth: float = 1.1):
+        self.name = name
+        self.min_value = min_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        n = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 1
+        self.bounds = [min_value * growth ** i for i in range(n)]
+        self.counts = [0] * (n + 1)  # last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        i = int(math.ceil(math.log(value / self.min_value) / self._log_growth))
+        return min(i, len(self.counts) - 1)
+
+    def record(self, value: float):
+        i = self._bucket(value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """Return the upper bound of the bucket holding the p-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, int(math.ceil(self.count * p / 100.0)))
+            seen = 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= rank:
+                    upper = self.bounds[i] if i < len(self.bounds) else self.max
+                    return min(upper, self.max)
+            return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    def summary(self) -> dict:
+        """Snapshot suitable for printing or JSON export."""
+        return {
+            "name": self.name,
+            "count": self.count,
+            "mean": self.mean(),
+            "min": self.min or 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max or 0.0,
+        }
+
+
+class StartupProfile:
+    """Wall-clock timings of named startup stages.
+
+    Times are relative to `origin` (a time.perf_counter() value, ideally
+    taken first thing in main.py), so `end` of a stage is how long after
+    launch it finished. Stages may run on any thread.
+    """
+
+    def __init__(self, origin: float = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.stages = []            # (name, start, seconds, thread)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def record(self, name: str, start: float, seconds: float):
+        with self._lock:
+            self.stages.append((name, start - self.origin, seconds, threading.current_thread().name))
+
+    def mark(self, name: str):
+        """Record an instant, e.g. the first paint."""
+        self.record(name, time.perf_counter(), 0.0)
+
+    def elapsed(self, name: str) -> float:
+        """Seconds from origin to the end of a stage (None if not recorded)."""
+        with self._lock:
+            for stage, start, seconds, _ in self.stages:
+                if stage == name:
+                    return start + seconds
+        return None
+
+    def report(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+        lines = [f"{'stage':<24} {'start':>9} {'took':>9} {'end':>9}  thread"]
+        for name, start, seconds, thread in stages:
+            lines.append(f"{name:<24} {start * 1000:7.0f}ms {seconds * 1000:7.0f}ms "
+                         f"{(start + seconds) * 1000:7.0f}ms  {thread}")
+        return "\n".join(lines)
+
+
+# ===== Spans and export =====
+class MetricsRegistry:
+    """Process-wide named histograms and counters, exportable as Prometheus text or JSON lines."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        hist = self._histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(name, LatencyHistogram(name))
+        return hist
+
+    def register(self, hist: LatencyHistogram) -> LatencyHistogram:
+        """Export a histogram that lives elsewhere (e.g. the poller's)."""
+        with self._lock:
+            self._histograms[hist.name] = hist
+        return hist
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hists = list(self._histograms.values())
+            counters = dict(self._counters)
+        return {"histograms": [h.summary() for h in hists if h.count], "counters": counters}
+
+    def prometheus_text(self, prefix: str = "fingerprint_") -> str:
+        snap = self.snapshot()
+        lines = []
+        for s in snap["histograms"]:
+            name = prefix + _metric_name(s["name"]) + "_seconds"
+            lines.append(f"# TYPE {name} summary")
+            for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'{name}{{quantile="{q}"}} {s[key]:.6f}')
+            lines.append(f"{name}_sum {s['mean'] * s['count']:.6f}")
+            lines.append(f"{name}_count {s['count']}")
+        for key, value in sorted(snap["counters"].items()):
+            name = prefix + _metric_name(key) + "_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus text file atomically (node_exporter textfile collector)."""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def append_jsonl(self, path: str):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": time.time(), **self.snapshot()}) + "\n")
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name).lower()
+
+
+REGISTRY = MetricsRegistry()
+_active = threading.local()
+
+
+class Trace:
+    """Breakdown of one operation (e.g. a verification) across threads.
+
+    Spans recorded on a thread while the trace is active there (see
+    activate) are added to it, so a capture on the capture lane and the
+    upload on the io lane end up in the same breakdown.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.total = None
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def activate(self):
+        previous = getattr(_active, "trace", None)
+        _active.trace = self
+        try:
+            yield self
+        finally:
+            _active.trace = previous
+
+    def finish(self) -> float:
+        """Record the end-to-end time (once) and return it."""
+        if self.total is None:
+            self.total = time.perf_counter() - self.start
+            REGISTRY.histogram(self.name).record(self.total)
+        return self.total
+
+    def breakdown(self) -> dict:
+        with self._lock:
+            return dict(self.spans)
+
+
+def record_span(name: str, seconds: float):
+    """Record a measured duration in the registry and the thread's active trace."""
+    REGISTRY.histogram(name).record(seconds)
+    trace = getattr(_active, "trace", None)
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block with the monotonic clock; see record_span."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - t0)
+
+
+class MetricsExporter:
+    """Writes REGISTRY to `path` every `interval` seconds on a daemon thread.
+
+    A path ending in .jsonl gets one JSON line appended per interval; any
+    other path is rewritten as a Prometheus text file.
+    """
+
+    def __init__(self, path: str, interval: float = 15.0, registry: MetricsRegistry = None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or REGISTRY
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.path.endswith(".jsonl"):
+            self.registry.append_jsonl(self.path)
+        else:
+            self.registry.write_prometheus(self.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print("Metrics export failed:", e)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.export()
+        except OSError:
+            pass
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other from the app/ root (e.g. "from client.client import Client")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+"""FrameArchive: append, read back, concurrent readers, crash recovery."""
+import os
+import threading
+import numpy as np
+from finger_device.archive import INDEX_DTYPE, FrameArchive
+from finger_device.framepool import IMAGE_BYTES, IMAGE_X, IMAGE_Y
+
+
+def gray(value: int) -> np.ndarray:
+    return np.full((IMAGE_Y, IMAGE_X), value % 256, dtype=np.uint8)
+
+
+def test_readers_see_complete_frames_while_the_writer_appends(tmp_path):
+    archive = FrameArchive(str(tmp_path / "archive"), segment_frames=64)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                ids, _ = archive.index()
+                for frame_id in ids[-4:]:
+                    assert archive.frame(frame_id)[0, 0] == frame_id % 256
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    try:
+        for i in range(1000):
+            assert archive.append(gray(i)) == i
+    finally:
+        done.set()
+        for t in readers:
+            t.join()
+        archive.close()
+    assert errors == []
+    with FrameArchive(str(tmp_path / "archive"), readonly=True) as reopened:
+        assert len(reopened) == 1000
+        assert reopened.frame(999)[5, 5] == 999 % 256
+
+
+def test_torn_tail_is_dropped_on_open(tmp_path):
+    path = str(tmp_path / "archive")
+    with FrameArchive(path, segment_frames=8) as archive:
+        for i in range(3):
+            archive.append(gray(i), user="a@example.com")
+    seg = os.path.join(path, "seg_000000")
+    with open(seg + ".frames", "ab") as f:
+        f.write(bytes(1000))              # crash in the middle of a frame
+    with open(seg + ".index", "ab") as f:
+        f.write(bytes(INDEX_DTYPE.itemsize * 2))   # records with no complete frame
+
+    with FrameArchive(path, readonly=True) as readonly:
+        assert len(readonly) == 3         # read-only opens ignore the tail, not repair it
+    assert os.path.getsize(seg + ".frames") == 3 * IMAGE_BYTES + 1000
+
+    with FrameArchive(path) as archive:
+        assert len(archive) == 3
+        assert os.path.getsize(seg + ".frames") == 3 * IMAGE_BYTES
+        assert os.path.getsize(seg + ".index") == 3 * INDEX_DTYPE.itemsize
+        assert archive.append(gray(3)) == 3
+        assert archive.frame(3)[0, 0] == 3
+        assert archive.record(2)["user"] == "a@example.com"
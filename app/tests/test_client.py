@@ -0,0 +1,150 @@
+"""Client transport: keep-alive, timeouts, bounded retry and hedging, against the stub API."""
+import socket
+import time
+import pytest
+import requests
+from bench.stub_server import StubConfig, StubServer
+from client.client import Client
+
+IMAGE = b"BM" + bytes(64)
+
+
+def closed_port_url() -> str:
+    """URL of a local port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def stub():
+    """Factory for stub servers that are stopped after the test."""
+    servers = []
+
+    def start(**config):
+        server = StubServer(StubConfig(**config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def build(*args, **kwargs):
+        kwargs.setdefault("backoff", 0.0)
+        client = Client(*args, **kwargs)
+        clients.append(client)
+        return client
+
+    yield build
+    for client in clients:
+        client.close()
+
+
+def test_requests_reuse_one_keep_alive_connection(stub, make_client):
+    server = stub()
+    client = make_client(server.url)
+    for _ in range(5):
+        assert client.check_fingerprint(IMAGE)["matching"]
+    assert server.config.connections == 1
+
+
+def test_match_is_retried_after_503(stub, make_client):
+    server = stub(fail_first=2)
+    client = make_client(server.url, retries=2)
+    assert client.check_fingerprint(IMAGE) is not None
+    assert server.config.requests == 3
+
+
+def test_retries_are_bounded(stub, make_client):
+    server = stub(fail_first=10)
+    client = make_client(server.url, retries=2)
+    assert client.check_fingerprint(IMAGE) is None
+    assert server.config.requests == 3
+
+
+def test_registration_without_key_is_not_retried(stub, make_client):
+    server = stub(fail_first=1)
+    client = make_client(server.url, retries=2)
+    assert client.register_user("a@example.com", "A", [IMAGE]) is None
+    assert server.config.requests == 1
+
+
+def test_registration_with_key_is_retried_under_the_same_key(stub, make_client):
+    server = stub(fail_first=1)
+    client = make_client(server.url, retries=2)
+    response = client.post_registration("a@example.com", "A", [IMAGE], idempotency_key="k1")
+    assert response.status_code == 200
+    assert server.config.idempotency_keys == {"k1": 2}
+
+
+def test_stalled_server_times_out(stub, make_client):
+    server = stub(latency=2.0)
+    client = make_client(server.url, retries=1, timeouts={"match": (1.0, 0.2)})
+    t0 = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.check_fingerprint(IMAGE)
+    assert time.monotonic() - t0 < 1.5
+    assert server.config.requests == 2
+
+
+def test_hedge_answers_for_a_slow_primary(stub, make_client):
+    primary, hedge = stub(latency=1.0), stub(latency=0.01)
+    client = make_client(primary.url, hedge_url=hedge.url, hedge_after=0.1)
+    t0 = time.monotonic()
+    assert client.check_fingerprint(IMAGE)["matching"]
+    assert time.monotonic() - t0 < 0.6
+    assert hedge.config.requests == 1
+
+
+def test_no_hedge_when_the_primary_is_fast(stub, make_client):
+    primary, hedge = stub(latency=0.01), stub(latency=0.01)
+    client = make_client(primary.url, hedge_url=hedge.url, hedge_after=0.5)
+    for _ in range(3):
+        assert client.check_fingerprint(IMAGE)["matching"]
+    assert hedge.config.requests == 0
+
+
+def test_hedge_answers_when_the_primary_fails(stub, make_client):
+    primary, hedge = stub(fail_first=10), stub()
+    client = make_client(primary.url, hedge_url=hedge.url, hedge_after=0.5, retries=0)
+    assert client.check_fingerprint(IMAGE)["matching"]
+    assert hedge.config.requests == 1
+
+
+def test_losing_hedged_responses_are_closed(stub, make_client, monkeypatch):
+    closed = []
+    close = requests.Response.close
+    monkeypatch.setattr(requests.Response, "close", lambda self: (closed.append(self.url), close(self)))
+    primary, hedge = stub(latency=0.4), stub(latency=0.01)
+    client = make_client(primary.url, hedge_url=hedge.url, hedge_after=0.05)
+    assert client.check_fingerprint(IMAGE)["matching"]
+    time.sleep(0.6)     # the primary answers after the hedge won
+    assert any(url.startswith(primary.url) for url in closed)
+
+
+def test_refused_registration_is_retried(make_client, monkeypatch):
+    client = make_client(closed_port_url(), retries=2)
+    calls = []
+    post = client.session.post
+    monkeypatch.setattr(client.session, "post", lambda *a, **kw: calls.append(a) or post(*a, **kw))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post_registration("a@example.com", "A", [IMAGE])
+    assert len(calls) == 3
+
+
+def test_fallback_capabilities_expire_soon(stub, make_client):
+    server = stub(codecs=["png", "bmp"])
+    client = make_client(closed_port_url())
+    assert client.capabilities() == Client.FALLBACK_CAPABILITIES
+    client.base_url = server.url
+    assert client.capabilities() == Client.FALLBACK_CAPABILITIES    # still cached
+    client._capabilities_until = 0.0                                 # FALLBACK_TTL elapsed
+    assert client.capabilities()["image_codecs"] == ["png", "bmp"]
+    client.base_url = closed_port_url()
+    assert client.capabilities()["image_codecs"] == ["png", "bmp"]  # held for CAPABILITIES_TTL
@@ -0,0 +1,161 @@
+"""Device capture path against SimulatedBackend (no sensor needed)."""
+import os
+import threading
+import time
+from ctypes import c_int, c_ubyte
+import pytest
+from bench.fake_synoapi import FakeSynoAPI
+from finger_device.backend import PS_OK, DllBackend, SimulatedBackend
+from finger_device.device import Device
+from finger_device.manager import DeviceManager
+from finger_device.polling import CancelToken, CaptureCancelled
+
+FRAME_BYTES = Device.IMAGE_BYTES
+
+
+def make_frames(n: int) -> list:
+    return [bytes([i * 40 + 1]) * FRAME_BYTES for i in range(n)]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Device creates its output folders relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_read_fingerprint_replays_frames_in_order():
+    frames = make_frames(3)
+    dev = Device(SimulatedBackend(frames=frames, finger_delay=0.0))
+    try:
+        got = [dev.read_fingerprint(timeout=2) for _ in range(4)]
+    finally:
+        dev.close()
+    assert got == frames + frames[:1]
+    assert dev.backend.captures == 4
+
+
+def test_read_fingerprint_waits_for_the_finger():
+    dev = Device(SimulatedBackend(finger_delay=0.2))
+    try:
+        t0 = time.monotonic()
+        img = dev.read_fingerprint(timeout=2)
+        elapsed = time.monotonic() - t0
+    finally:
+        dev.close()
+    assert len(img) == FRAME_BYTES
+    assert 0.2 <= elapsed < 1.5
+    assert dev.backend.get_image_calls > 1
+
+
+def test_read_fingerprint_times_out_without_a_finger():
+    dev = Device(SimulatedBackend(finger_delay=5.0))
+    try:
+        with pytest.raises(TimeoutError):
+            dev.read_fingerprint(timeout=0.2)
+    finally:
+        dev.close()
+
+
+def test_cancel_stops_the_wait():
+    dev = Device(SimulatedBackend(finger_delay=5.0))
+    cancel = CancelToken()
+    threading.Timer(0.1, cancel.cancel).start()
+    try:
+        t0 = time.monotonic()
+        with pytest.raises(CaptureCancelled):
+            dev.read_fingerprint(cancel, timeout=5)
+        assert time.monotonic() - t0 < 1.0
+    finally:
+        dev.close()
+
+
+def test_comm_error_is_raised_while_the_device_answers_pings():
+    dev = Device(SimulatedBackend(finger_delay=0.0, error_rate=1.0, seed=1))
+    try:
+        with pytest.raises(RuntimeError, match="PSGetImage failed"):
+            dev.read_fingerprint(timeout=1)
+    finally:
+        dev.close()
+
+
+def test_lost_handle_is_reopened_once():
+    backend = SimulatedBackend(frames=make_frames(1), finger_delay=0.0)
+    dev = Device(backend)
+    try:
+        backend.close()         # e.g. the USB cable was replugged
+        assert dev.read_fingerprint(timeout=1) == make_frames(1)[0]
+        assert backend.ping()
+    finally:
+        dev.close()
+
+
+def test_capture_frame_returns_pooled_buffers():
+    dev = Device(SimulatedBackend(frames=make_frames(2), finger_delay=0.0))
+    try:
+        free = dev.frames.available
+        with dev.capture_frame(timeout=1) as frame:
+            assert dev.frames.available == free - 1
+            assert frame.tobytes() == make_frames(2)[0]
+        assert dev.frames.available == free
+    finally:
+        dev.close()
+
+
+def test_dll_ping_leaves_the_finger_on_the_sensor():
+    fake = FakeSynoAPI(frames=make_frames(1))
+    backend = DllBackend(dll=fake, profile_path=None)
+    backend.open()
+    try:
+        assert backend.ping()
+        assert fake.PSGetImage.calls == 0
+        assert backend.get_image(backend.DEFAULT_ADDR) == PS_OK
+        assert backend.ping()
+        assert backend.up_image(backend.DEFAULT_ADDR, (c_ubyte * FRAME_BYTES)(), c_int(FRAME_BYTES)) == PS_OK
+    finally:
+        backend.close()
+    assert not backend.ping()
+
+
+def test_dll_ping_without_par_table_keeps_the_grabbed_finger():
+    fake = FakeSynoAPI(frames=make_frames(1))
+    del fake.PSReadParTable
+    dev = Device(DllBackend(dll=fake, profile_path=None))
+    try:
+        assert dev.backend.ping()                   # finger already on the sensor: grabbed
+        assert dev.read_fingerprint(timeout=1) == make_frames(1)[0]
+        assert fake.PSGetImage.calls == 1
+    finally:
+        dev.close()
+
+
+def test_failing_reader_backs_off_and_stops():
+    dev = Device(SimulatedBackend(finger_delay=0.0, error_rate=1.0, seed=1))
+    manager = DeviceManager({0: dev})
+    manager.MAX_CONSECUTIVE_ERRORS = 3
+    try:
+        t0 = time.monotonic()
+        manager.start()
+        manager._threads[0].join(timeout=5)
+        elapsed = time.monotonic() - t0
+        stats = manager.stats[0]
+        assert not manager._threads[0].is_alive()
+        assert stats.errors == 3 and "PSGetImage failed" in stats.failed
+        budget = dev.poller.latency_budget
+        assert budget * 3 <= elapsed < budget * 3 + 1.0   # slept budget, then 2x budget
+    finally:
+        manager.close()
+
+
+def test_save_fingerprint_archives_and_writes_a_bmp():
+    frames = make_frames(2)
+    dev = Device(SimulatedBackend(frames=frames, finger_delay=0.0))
+    try:
+        paths = [dev.save_fingerprint(frame) for frame in frames]
+        assert dev.archive_fingerprint(frames[0]) == 2
+        assert [os.path.basename(p) for p in paths] == ["fingerprint_00000000.bmp", "fingerprint_00000001.bmp"]
+        assert dev.archive.frame(1).tobytes() == frames[1]
+        assert dev.archive.export_bmp("out", ids=[1]) == 1
+        with open(paths[1], "rb") as a, open(os.path.join("out", "fingerprint_00000001.bmp"), "rb") as b:
+            assert a.read() == b.read()
+    finally:
+        dev.close()
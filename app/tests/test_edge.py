@@ -0,0 +1,70 @@
+"""Local matching on the edge gallery."""
+import os
+import threading
+import pytest
+from bench.synthetic import SyntheticIdentity
+from client.edge import EdgeVerifier, LocalGallery
+from client.lsh_index import CandidateIndex, describe
+
+
+@pytest.fixture(scope="module")
+def fingers():
+    return [SyntheticIdentity(200 + i) for i in range(3)]
+
+
+def make_edge(fingers, **kwargs) -> EdgeVerifier:
+    edge = EdgeVerifier(LocalGallery(path=None), index=CandidateIndex(), **kwargs)
+    for i, finger in enumerate(fingers):
+        edge.enroll({"name": f"F{i}", "email": f"f{i}@example.com"},
+                    [finger.impression(i * 10 + k) for k in range(3)])
+    return edge
+
+
+def test_genuine_user_ranks_first(fingers):
+    edge = make_edge(fingers)
+    matches = edge.match_local(edge.extract(fingers[1].impression(999)))
+    assert matches[0]["user"]["email"] == "f1@example.com"
+    assert len(matches) == 3
+
+
+def test_shortlist_ranks_only_shortlisted_users(fingers):
+    edge = make_edge(fingers)
+    probe = edge.extract(fingers[0].impression(999))
+    matches = edge.match_local(probe, candidates=["f0@example.com", "f2@example.com"])
+    assert {m["user"]["email"] for m in matches} == {"f0@example.com", "f2@example.com"}
+    assert edge.match_local(probe, candidates=["nobody@example.com"]) == []
+
+
+def test_single_candidate_goes_to_the_server(fingers):
+    edge = make_edge(fingers, prefilter_min_users=0, shortlist_k=1)
+    asked = []
+    answer = {"matching": [], "best_match": None}
+    response = edge.verify(edge.extract(fingers[2].impression(999)),
+                           lambda candidates: asked.append(candidates) or answer)
+    assert len(asked) == 1 and len(asked[0]) == 1
+    assert response["best_match"] is None
+
+
+def test_index_shortlists_by_exact_scan_below_the_lsh_threshold(fingers):
+    edge = make_edge(fingers)
+    desc = describe(edge.extract(fingers[1].impression(999)))
+    assert edge.index.query(desc, 2) == edge.index.linear_query(desc, 2)
+    assert edge.index.query(desc, 2)[0][0] == "f1@example.com"
+    assert edge.index.last_scanned == 3
+
+
+def test_gallery_survives_concurrent_saves(fingers, tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    gallery = LocalGallery(path=path)
+    edge = EdgeVerifier(gallery, index=CandidateIndex())
+    templates = [edge.extract(finger.impression(0)) for finger in fingers]
+    threads = [threading.Thread(target=lambda i=i: (gallery.add({"email": f"f{i}@example.com"}, [templates[i]]),
+                                                    gallery.save()))
+               for i in range(len(fingers))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    gallery.save()
+    assert len(LocalGallery(path=path)) == len(fingers)
+    assert os.listdir(tmp_path) == ["gallery.npz"]
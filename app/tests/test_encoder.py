@@ -0,0 +1,46 @@
+"""In-memory BMP codec: encode_bmp and decode_bmp round trip."""
+import numpy as np
+import pytest
+from imaging.encoder import IMAGE_X, IMAGE_Y, ImageEncoder, decode_bmp, encode_bmp
+
+
+def frame(seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (IMAGE_Y, IMAGE_X), dtype=np.uint8)
+
+
+def test_bmp_round_trip():
+    img = frame()
+    blob = encode_bmp(img.tobytes())
+    assert blob[:2] == b"BM" and len(blob) == ImageEncoder().bmp_size
+    assert np.array_equal(decode_bmp(blob), img)
+
+
+def test_padded_rows_round_trip():
+    img = frame(1)[:10, :13]             # 13 px rows are padded to 16 bytes
+    blob = ImageEncoder(13, 10).encode_bmp(img)
+    assert np.array_equal(decode_bmp(blob), img)
+
+
+def test_batch_matches_single_encodes():
+    enc = ImageEncoder()
+    imgs = [frame(i) for i in range(3)]
+    assert enc.encode_batch(imgs) == [enc.encode_bmp(img) for img in imgs]
+
+
+def test_decode_rejects_other_files():
+    with pytest.raises(ValueError):
+        decode_bmp(b"\x89PNG\r\n\x1a\n" + bytes(64))
+    blob = bytearray(encode_bmp(frame().tobytes()))
+    blob[28] = 24                        # bits per pixel
+    with pytest.raises(ValueError, match="8-bit"):
+        decode_bmp(bytes(blob))
+
+
+def test_png_round_trip():
+    Image = pytest.importorskip("PIL.Image")
+    import io
+    img = frame(2)
+    for up_filter in (True, False):
+        png = ImageEncoder().encode_png(img, up_filter=up_filter)
+        with Image.open(io.BytesIO(png)) as decoded:
+            assert np.array_equal(np.asarray(decoded), img)
@@ -0,0 +1,50 @@
+"""EnrollmentSession.add gives pooled frames back on every error path."""
+import numpy as np
+import pytest
+from client.enrollment import DuplicateCapture, EnrollmentSession
+from finger_device.framepool import FramePool
+from imaging.duplicates import DuplicateDetector
+
+
+def filled(pool: FramePool, seed: int):
+    frame = pool.acquire(timeout=1)
+    frame.array()[:] = np.random.default_rng(seed).integers(0, 256, (frame.height, frame.width))
+    return frame
+
+
+def test_duplicate_frame_is_released():
+    pool = FramePool(size=2)
+    session = EnrollmentSession(client=None)
+    try:
+        first = filled(pool, 0)
+        session.duplicates.keep(session.duplicates.check(first))
+        first.release()
+        with pytest.raises(DuplicateCapture):
+            session.add(filled(pool, 0))
+    finally:
+        session.close()
+    assert pool.available == 2
+
+
+def test_frame_is_released_when_the_check_fails():
+    class BrokenDetector(DuplicateDetector):
+        def check(self, img):
+            raise ValueError("bad frame")
+
+    pool = FramePool(size=2)
+    session = EnrollmentSession(client=None, duplicates=BrokenDetector())
+    try:
+        with pytest.raises(ValueError):
+            session.add(filled(pool, 1))
+    finally:
+        session.close()
+    assert pool.available == 2
+
+
+def test_frame_is_released_when_the_session_is_closed():
+    pool = FramePool(size=2)
+    session = EnrollmentSession(client=None, duplicates=False)
+    session.close()
+    with pytest.raises(RuntimeError):
+        session.add(filled(pool, 2))
+    assert pool.available == 2
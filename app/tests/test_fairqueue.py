@@ -0,0 +1,50 @@
+"""FairQueue: per-client turns, bounded depths, and rejection of floods."""
+import asyncio
+import pytest
+from daemon import FairQueue, Rejected
+
+
+def drain(queue: FairQueue) -> list:
+    async def run():
+        return [await queue.get() for _ in range(len(queue))]
+    return asyncio.run(run())
+
+
+def test_clients_take_turns():
+    queue = FairQueue(per_client=8, total=64)
+    for i in range(4):
+        queue.put("bulk", f"bulk{i}")
+    queue.put("kiosk", "kiosk0")
+    order = drain(queue)
+    assert order.index("kiosk0") <= 1     # not behind the whole bulk backlog
+    assert [x for x in order if x.startswith("bulk")] == [f"bulk{i}" for i in range(4)]
+
+
+def test_late_client_waits_for_one_request_of_each_other_client():
+    async def run():
+        queue = FairQueue(per_client=8, total=64)
+        for i in range(3):
+            queue.put("a", f"a{i}")
+            queue.put("b", f"b{i}")
+        served = [await queue.get(), await queue.get()]
+        queue.put("c", "c0")
+        served += [await queue.get() for _ in range(len(queue))]
+        return served
+    served = asyncio.run(run())
+    assert served.index("c0") <= 4
+
+
+def test_limits_reject_with_the_right_status():
+    queue = FairQueue(per_client=2, total=3)
+    queue.put("a", 1)
+    queue.put("a", 2)
+    with pytest.raises(Rejected) as per_client:
+        queue.put("a", 3)
+    assert per_client.value.status == 429
+    queue.put("b", 1)
+    with pytest.raises(Rejected) as total:
+        queue.put("c", 1)
+    assert total.value.status == 503
+    assert queue.depths() == {"a": 2, "b": 1}
+    drain(queue)
+    assert queue.depths() == {}
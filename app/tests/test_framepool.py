@@ -0,0 +1,45 @@
+"""FramePool: buffers are recycled, never lost, and acquire() waits a bounded time."""
+import threading
+import time
+import pytest
+from finger_device.framepool import FramePool, FramePoolExhausted
+
+
+def test_released_buffers_are_reused():
+    pool = FramePool(size=2, frame_bytes=16)
+    first = pool.acquire()
+    buffer = first.buffer
+    first.release()
+    first.release()                       # idempotent: the buffer is returned once
+    assert pool.available == 2
+    frames = [pool.acquire(), pool.acquire()]
+    assert pool.available == 0
+    assert any(frame.buffer is buffer for frame in frames)
+
+
+def test_context_manager_releases():
+    pool = FramePool(size=1, frame_bytes=16)
+    with pool.acquire() as frame:
+        frame.buffer[0] = 7
+        assert pool.available == 0
+    assert pool.available == 1
+
+
+def test_exhausted_pool_times_out():
+    pool = FramePool(size=1, frame_bytes=16)
+    held = pool.acquire()
+    t0 = time.monotonic()
+    with pytest.raises(FramePoolExhausted):
+        pool.acquire(timeout=0.1)
+    assert 0.1 <= time.monotonic() - t0 < 1.0
+    held.release()
+    assert pool.acquire(timeout=0).buffer is held.buffer
+
+
+def test_acquire_wakes_when_a_frame_is_released():
+    pool = FramePool(size=1, frame_bytes=16)
+    held = pool.acquire()
+    threading.Timer(0.1, held.release).start()
+    t0 = time.monotonic()
+    pool.acquire(timeout=2)
+    assert time.monotonic() - t0 < 1.0
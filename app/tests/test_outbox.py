@@ -0,0 +1,114 @@
+"""Outbox durability: replay after a restart and exactly one registration per item."""
+import socket
+import pytest
+from bench.stub_server import StubConfig, StubServer
+from client.client import Client
+from client.outbox import Outbox
+
+IMAGE = b"BM" + bytes(64)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = "rejected"
+
+
+def closed_port_url() -> str:
+    """URL of a local port nothing listens on, i.e. a server that is down."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def server():
+    stub = StubServer(StubConfig(latency=0.0)).start()
+    yield stub
+    stub.stop()
+
+
+def open_outbox(path, url: str, delivered: list = None) -> Outbox:
+    """Outbox with no backoff, so a retried item is due on the next flush_once()."""
+    delivered = delivered if delivered is not None else []
+    client = Client(url, retries=0, backoff=0.0)
+    return Outbox(client, path=str(path), backoff=0.0,
+                  on_delivered=lambda item, body: delivered.append((item.key, body)))
+
+
+def close_outbox(outbox: Outbox):
+    outbox.close()
+    outbox.client.close()
+
+
+def test_items_queued_while_down_are_sent_after_a_restart(tmp_path, server):
+    path = tmp_path / "outbox.db"
+    outbox = open_outbox(path, closed_port_url())
+    key = outbox.put_registration("a@example.com", "A", [IMAGE, IMAGE])
+    assert outbox.flush_once() == 0         # connection refused: kept for later
+    assert outbox.pending() == 1
+    close_outbox(outbox)
+
+    delivered = []
+    outbox = open_outbox(path, server.url, delivered)
+    try:
+        assert outbox.pending() == 1
+        assert outbox.flush_once() == 1
+        assert outbox.pending() == 0
+    finally:
+        close_outbox(outbox)
+    assert [k for k, _ in delivered] == [key]
+    assert delivered[0][1]["user"]["images"] == 2
+    assert server.config.idempotency_keys == {key: 1}
+
+
+def test_retry_reuses_the_key_and_delivers_once(tmp_path, server):
+    server.config.fail_first = 2
+    delivered = []
+    outbox = open_outbox(tmp_path / "outbox.db", server.url, delivered)
+    try:
+        key = outbox.put_registration("a@example.com", "A", [IMAGE])
+        assert outbox.flush_once() == 0     # 503, retried at once with backoff=0
+        assert outbox.flush_once() == 0     # 503
+        assert outbox.flush_once() == 1
+        assert outbox.flush_once() == 0     # nothing left to resend
+    finally:
+        close_outbox(outbox)
+    assert server.config.idempotency_keys == {key: 3}
+    assert server.config.requests == 3
+    assert [k for k, _ in delivered] == [key]
+
+
+
+def test_rejected_items_can_be_retried_purged_and_are_capped(tmp_path, server):
+    failed = []
+    outbox = open_outbox(tmp_path / "outbox.db", server.url)
+    outbox.on_failed = lambda item, error: failed.append(item.key)
+    outbox.max_failed = 2
+    outbox.client.post_registration = lambda *a, **kw: FakeResponse(400)
+    try:
+        keys = [outbox.put_registration(f"{i}@example.com", "A", [IMAGE]) for i in range(3)]
+        assert outbox.flush_once() == 0
+        assert failed == keys
+        assert [key for key, *_ in outbox.failed()] == keys[1:]     # oldest dropped
+        assert outbox.retry_failed([keys[1]]) == 1
+        assert outbox.pending() == 1
+        assert outbox.purge_failed() == 1
+        assert outbox.failed() == []
+    finally:
+        close_outbox(outbox)
+
+
+def test_callback_errors_go_to_on_error(tmp_path, server):
+    errors = []
+    outbox = open_outbox(tmp_path / "outbox.db", server.url)
+    outbox.on_delivered = lambda item, body: 1 / 0
+    outbox.on_error = errors.append
+    try:
+        outbox.put_registration("a@example.com", "A", [IMAGE])
+        outbox.put_registration("b@example.com", "B", [IMAGE])
+        assert outbox.flush_once() == 2          # the first callback error does not stop the batch
+        assert outbox.pending() == 0
+    finally:
+        close_outbox(outbox)
+    assert [type(e) for e in errors] == [ZeroDivisionError] * 2